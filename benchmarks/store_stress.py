@@ -0,0 +1,95 @@
+"""
+Store Stress Benchmark
+Hammers a storage backend from many threads and checks no writes were lost or read stale
+
+Usage:
+    python benchmarks/store_stress.py [--threads 32] [--users 8] [--ops 2000] [--sqlite PATH]
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from diet_planner.data_store import UserManager
+from diet_planner.storage import MemoryBackend, SQLiteBackend
+
+
+def _has_entry(log, entry_id):
+    # Our own entries are among the newest, so scan from the end
+    return any(entry["id"] == entry_id for entry in reversed(log))
+
+
+def worker(manager, usernames, thread_no, ops, barrier, kept, stale):
+    """Append, delete and count against a rotating set of users"""
+    barrier.wait()
+    for op in range(ops):
+        username = usernames[(thread_no + op) % len(usernames)]
+        entry_id = f"{thread_no}-{op}"
+        manager.add_log_entry(username, 'diet_log', {"id": entry_id, "name": "Apple", "calories": 95})
+        water = manager.increment_counter(username, 'water_log', 'today')
+        # Every other entry is deleted again, so half of them must survive
+        if op % 2:
+            manager.delete_log_entry(username, 'diet_log', entry_id)
+        else:
+            kept[thread_no] += 1
+        # Readers run alongside the writers and must see every write this
+        # thread has finished: its kept entry and at least its water count
+        record = manager.get_user_data(username)
+        if record['water_log'].get('today', 0) < water or (not op % 2 and not _has_entry(record['diet_log'], entry_id)):
+            stale[thread_no] += 1
+
+
+def run(backend, threads, users, ops):
+    manager = UserManager(backend)
+    usernames = [f"user{i}" for i in range(users)]
+    for username in usernames:
+        manager.create_user(username, "secret")
+
+    barrier = threading.Barrier(threads + 1)
+    kept = [0] * threads
+    stale = [0] * threads
+    pool = [
+        threading.Thread(target=worker, args=(manager, usernames, n, ops, barrier, kept, stale))
+        for n in range(threads)
+    ]
+    for thread in pool:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    logged = sum(len(manager.get_user_data(u)['diet_log']) for u in usernames)
+    water = sum(manager.get_counter(u, 'water_log', 'today') for u in usernames)
+    # Each op does append + increment + read, and half also delete
+    total_ops = threads * ops * 3 + threads * (ops // 2)
+    print(f"{type(backend).__name__}: {threads} threads x {ops} ops on {users} users")
+    print(f"  {elapsed:.2f}s, {total_ops / elapsed:,.0f} store ops/s")
+    print(f"  diet_log entries: {logged} (expected {sum(kept)})")
+    print(f"  water count: {water} (expected {threads * ops})")
+    print(f"  stale reads: {sum(stale)} (expected 0)")
+    return logged == sum(kept) and water == threads * ops and not any(stale)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[1])
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--ops", type=int, default=2000)
+    parser.add_argument("--sqlite", metavar="PATH", help="also run against a SQLite file")
+    args = parser.parse_args()
+
+    ok = run(MemoryBackend(), args.threads, args.users, args.ops)
+    if args.sqlite:
+        ok = run(SQLiteBackend(args.sqlite), args.threads, args.users, args.ops // 10) and ok
+    print("OK" if ok else "LOST OR STALE WRITES")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
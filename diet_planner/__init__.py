@@ -1,10 +1,41 @@
+import os
+
 from flask import Flask
 
 def create_app():
     app = Flask(__name__)
     
-    # Secret key for session management (required for some potential future features)
-    app.config['SECRET_KEY'] = 'dev_key_for_diet_planner'
+    # Secret key for the signed session cookie that carries the logged-in user.
+    # Every worker process must share it, so set SECRET_KEY in production.
+    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev_key_for_diet_planner')
+    
+    # BMR formula for every profile (mifflin, harris_benedict, katch_mcardle)
+    app.config['BMR_FORMULA'] = os.environ.get('DIET_PLANNER_BMR_FORMULA', 'mifflin')
+    from diet_planner.energy import energy_calculator
+    energy_calculator.configure(formula=app.config['BMR_FORMULA'])
+
+    # Path to a SQLite database for user data; unset keeps the in-memory store
+    app.config['DATABASE'] = os.environ.get('DIET_PLANNER_DB')
+    if app.config['DATABASE']:
+        from diet_planner.data_store import user_manager
+        from diet_planner.storage import SQLiteBackend
+        from diet_planner.plan_store import migrate_profiles
+        user_manager.use_backend(SQLiteBackend(app.config['DATABASE']))
+        # Older profiles embedded full food dicts in their plans
+        migrate_profiles(user_manager)
+
+    # Extra foods (NDJSON/CSV/JSON, e.g. written by `python -m diet_planner.importer
+    # --output`) and optionally the alternatives graph prebuilt alongside them
+    app.config['FOODS_FILE'] = os.environ.get('DIET_PLANNER_FOODS')
+    app.config['FOODS_GRAPH'] = os.environ.get('DIET_PLANNER_FOODS_GRAPH')
+    if app.config['FOODS_FILE']:
+        from diet_planner.importer import import_foods
+        report = import_foods(app.config['FOODS_FILE'])
+        app.logger.info("Loaded foods from %s: %s", app.config['FOODS_FILE'], report)
+        if app.config['FOODS_GRAPH']:
+            from diet_planner.alternatives import alternatives_graph
+            if not alternatives_graph.load(app.config['FOODS_GRAPH']):
+                app.logger.warning("%s does not match the catalog; it will be rebuilt", app.config['FOODS_GRAPH'])
 
     from diet_planner.main.routes import main
     from diet_planner.features.routes import features
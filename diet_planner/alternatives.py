@@ -0,0 +1,304 @@
+"""
+Alternatives Graph
+Precomputed nearest-alternative lists per food, for constant-time meal suggestions
+"""
+
+from array import array
+from bisect import bisect_left, insort
+import heapq
+import json
+import threading
+import zlib
+
+from diet_planner.food_catalog import CalorieIndex
+from diet_planner.food_data import food_catalog
+
+# Padding for lists shorter than their relation's size
+_EMPTY = -1
+
+# Nearest-by-calories relations: (candidate source, max calorie distance, size)
+#   alternatives: any food within +/-50 kcal
+#   healthier: healthy foods within +/-80 kcal
+#   similar: same category, any distance
+NEAREST_RELATIONS = {
+    "alternatives": ("all", 50, 16),
+    "healthier": ("healthy", 80, 8),
+    "similar": ("category", None, 8),
+}
+
+# Ranked relations: foods within +/-100 kcal passing a threshold, best first
+#   protein: p >= 20, most protein first
+#   low_carb: c <= 15, fewest carbs first
+RANKED_RELATIONS = {
+    "protein": ("p", 20, None, 100, 8),
+    "low_carb": ("c", None, 15, 100, 8),
+}
+
+# Rebuild from scratch instead of syncing when this share of rows is new
+REBUILD_FRACTION = 1 / 16
+
+
+class AlternativesGraph:
+    """
+    Typed k-nearest-alternatives graph over the catalog
+
+    For every food and relation, the ids of its best alternatives are kept
+    in a flat array('i') (size slots per food, padded with -1), so a
+    suggestion query is a slice plus optional filtering. Nearest relations
+    rank by calorie distance (ties by id) using CalorieIndex lookups; ranked
+    relations are built with one sweep over the calorie-sorted rows.
+
+    Rows appended to the catalog are linked in incrementally the next time
+    the graph is queried: their own lists are computed and they are inserted
+    into the lists of the existing foods they beat. Large appends trigger a
+    full rebuild. save()/load() keep a prebuilt graph next to an imported
+    catalog so it can be built offline.
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.sizes = {name: spec[-1] for name, spec in {**NEAREST_RELATIONS, **RANKED_RELATIONS}.items()}
+        self.lists = {name: array('i') for name in self.sizes}
+        self._rows = 0
+        self._sources = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._rows
+
+    # --- Candidate sources ---
+    def _indexes(self):
+        """CalorieIndex per nearest source: all rows, healthy rows, each category"""
+        catalog = self.catalog
+        by_category = {}
+        for food_id, code in enumerate(catalog.category_codes):
+            by_category.setdefault(code, []).append(food_id)
+        return {
+            "all": catalog.calorie_index,
+            "healthy": CalorieIndex(catalog, catalog.where(healthy=True)),
+            "category": {code: CalorieIndex(catalog, ids) for code, ids in by_category.items()},
+        }
+
+    def _add_to_sources(self, food_id):
+        """Keep the cached healthy/category indexes in step with an appended row"""
+        if self.catalog.healthy[food_id]:
+            self._sources["healthy"].add(food_id)
+        code = self.catalog.category_codes[food_id]
+        by_category = self._sources["category"]
+        if code in by_category:
+            by_category[code].add(food_id)
+        else:
+            by_category[code] = CalorieIndex(self.catalog, [food_id])
+
+    def _source(self, indexes, source, food_id):
+        index = indexes[source]
+        if source == "category":
+            index = index.get(self.catalog.category_codes[food_id])
+        return index
+
+    @staticmethod
+    def _member(values, low, high, food_id):
+        value = values[food_id]
+        return (low is None or value >= low) and (high is None or value <= high)
+
+    # --- Building ---
+    def build(self):
+        """Compute every list from scratch"""
+        with self._lock:
+            self._build()
+
+    def _build(self):
+        catalog = self.catalog
+        size = len(catalog)
+        calories = catalog.calories
+        indexes = self._sources = self._indexes()
+
+        for name, (source, window, k) in NEAREST_RELATIONS.items():
+            flat = array('i', [_EMPTY]) * (size * k)
+            for food_id in range(size):
+                index = self._source(indexes, source, food_id)
+                if index is None:
+                    continue
+                target = calories[food_id]
+                near = [
+                    other for other in index.nearest(target, k + 1)
+                    if other != food_id and (window is None or abs(calories[other] - target) <= window)
+                ][:k]
+                flat[food_id * k:food_id * k + len(near)] = array('i', near)
+            self.lists[name] = flat
+
+        order, keys = catalog.calorie_index.ids, catalog.calorie_index.keys
+        for name, (column, low, high, width, k) in RANKED_RELATIONS.items():
+            values = catalog.column(column)
+            sign = -1 if low is not None else 1
+            flat = array('i', [_EMPTY]) * (size * k)
+            window = []  # sorted (rank, id) of members within +/-width of the sweep position
+            start = stop = 0
+            for position, food_id in enumerate(order):
+                target = keys[position]
+                while stop < size and keys[stop] <= target + width:
+                    other = order[stop]
+                    if self._member(values, low, high, other):
+                        insort(window, (sign * values[other], other))
+                    stop += 1
+                while keys[start] < target - width:
+                    other = order[start]
+                    if self._member(values, low, high, other):
+                        del window[bisect_left(window, (sign * values[other], other))]
+                    start += 1
+                best = [other for _, other in window[:k + 1] if other != food_id][:k]
+                flat[food_id * k:food_id * k + len(best)] = array('i', best)
+            self.lists[name] = flat
+
+        self._rows = size
+
+    # --- Incremental sync ---
+    def sync(self):
+        """Link in catalog rows appended since the last build or sync"""
+        if self._rows == len(self.catalog):
+            return
+        with self._lock:
+            new_rows = len(self.catalog) - self._rows
+            if new_rows <= 0:
+                return
+            if self._rows == 0 or new_rows > max(64, self._rows * REBUILD_FRACTION):
+                self._build()
+                return
+            first = self._rows
+            for name, k in self.sizes.items():
+                self.lists[name].extend(array('i', [_EMPTY]) * (new_rows * k))
+            self._rows = len(self.catalog)
+            if self._sources is None:
+                # Loaded from a file: index every row once
+                self._sources = self._indexes()
+            else:
+                self._sources["all"] = self.catalog.calorie_index
+                for food_id in range(first, self._rows):
+                    self._add_to_sources(food_id)
+            for food_id in range(first, self._rows):
+                self._link(food_id, self._sources)
+
+    def _offer(self, name, owner, candidate, rank):
+        """Insert candidate into owner's list if it ranks among the best"""
+        k = self.sizes[name]
+        flat = self.lists[name]
+        start = owner * k
+        last = flat[start + k - 1]
+        if last != _EMPTY and rank(candidate) >= rank(last):
+            return
+        current = [other for other in flat[start:start + k] if other != _EMPTY]
+        if candidate in current:
+            return
+        ranks = [rank(other) for other in current]
+        position = bisect_left(ranks, rank(candidate))
+        if position >= k:
+            return
+        current.insert(position, candidate)
+        current = current[:k]
+        flat[start:start + len(current)] = array('i', current)
+
+    def _link(self, food_id, indexes):
+        """Compute a new row's lists and offer it to existing rows"""
+        catalog = self.catalog
+        calories = catalog.calories
+        target = calories[food_id]
+
+        for name, (source, window, k) in NEAREST_RELATIONS.items():
+            # The new row's own list
+            index = self._source(indexes, source, food_id)
+            near = [
+                other for other in index.nearest(target, k + 1)
+                if other != food_id and (window is None or abs(calories[other] - target) <= window)
+            ][:k] if index is not None else []
+            self.lists[name][food_id * k:food_id * k + len(near)] = array('i', near)
+
+            # Existing rows that may now have it among their nearest
+            if source == "healthy" and not catalog.healthy[food_id]:
+                continue
+            if source == "category":
+                owners = index.ids
+            else:
+                owners = catalog.calorie_index.range(target - window, target + window)
+            for owner in owners:
+                if owner != food_id:
+                    base = calories[owner]
+                    self._offer(name, owner, food_id, lambda other, base=base: (abs(calories[other] - base), other))
+
+        for name, (column, low, high, width, k) in RANKED_RELATIONS.items():
+            values = catalog.column(column)
+            sign = -1 if low is not None else 1
+            nearby = catalog.calorie_index.range(target - width, target + width)
+
+            def rank(other):
+                return (sign * values[other], other)
+
+            best = heapq.nsmallest(k, (
+                other for other in nearby
+                if other != food_id and self._member(values, low, high, other)
+            ), key=rank)
+            self.lists[name][food_id * k:food_id * k + len(best)] = array('i', best)
+
+            if self._member(values, low, high, food_id):
+                for owner in nearby:
+                    if owner != food_id:
+                        self._offer(name, owner, food_id, rank)
+
+    # --- Queries ---
+    def related(self, food_id, relation):
+        """
+        Precomputed alternatives of a food, best first
+
+        Args:
+            food_id: Catalog row id
+            relation: One of NEAREST_RELATIONS / RANKED_RELATIONS
+
+        Returns:
+            List of row ids (at most the relation's size)
+        """
+        self.sync()
+        k = self.sizes[relation]
+        return [other for other in self.lists[relation][food_id * k:(food_id + 1) * k] if other != _EMPTY]
+
+    # --- Persistence ---
+    def _fingerprint(self, rows):
+        catalog = self.catalog
+        checksum = 0
+        for column in (catalog.calories, catalog.p, catalog.c, catalog.f, catalog.category_codes, catalog.healthy):
+            checksum = zlib.crc32(column[:rows].tobytes(), checksum)
+        return checksum
+
+    def save(self, path):
+        """Write the graph to a file for load() at startup"""
+        self.sync()
+        with self._lock, open(path, "wb") as out:
+            header = {"rows": self._rows, "sizes": self.sizes, "fingerprint": self._fingerprint(self._rows)}
+            out.write(json.dumps(header).encode() + b"\n")
+            for name in sorted(self.sizes):
+                self.lists[name].tofile(out)
+
+    def load(self, path):
+        """
+        Read a graph written by save()
+
+        Returns:
+            False (leaving the graph untouched) if it was built for
+            different catalog contents
+        """
+        with open(path, "rb") as source:
+            header = json.loads(source.readline())
+            rows = header["rows"]
+            if header["sizes"] != self.sizes or rows > len(self.catalog) or header["fingerprint"] != self._fingerprint(rows):
+                return False
+            lists = {}
+            for name in sorted(self.sizes):
+                lists[name] = array('i')
+                lists[name].fromfile(source, rows * self.sizes[name])
+        with self._lock:
+            self.lists = lists
+            self._rows = rows
+            self._sources = None
+        return True
+
+
+# Global instance (built on first use)
+alternatives_graph = AlternativesGraph(food_catalog)
@@ -0,0 +1,235 @@
+"""
+Nutrition Analytics
+Daily time series per user with rolling averages, streaks and deficit/surplus trends
+"""
+
+from array import array
+from itertools import accumulate, chain, compress, groupby, repeat
+import datetime
+import math
+import operator
+
+from diet_planner.data_store import user_manager
+from diet_planner.energy import energy_calculator
+
+# Columns read from UserManager.get_history, one value per day
+SERIES_FIELDS = ("calories", "protein", "carbs", "fats", "burned", "water", "steps")
+
+# Daily goals used for streaks
+WATER_GOAL = 8          # glasses, as on the dashboard tracker
+STEP_GOAL = 10000
+TARGET_TOLERANCE = 0.10  # a day is on target within +/-10% of TDEE
+
+# Same rough estimate the dashboard uses: 0.04 kcal per step
+STEP_CALORIES = 0.04
+
+# Energy in one kg of body weight, for projecting weekly change
+KCAL_PER_KG = 7700
+
+MAX_DAYS = 366
+
+
+def prefix_sums(values):
+    """Running totals with a leading 0, so sum(values[i:j]) = s[j] - s[i]"""
+    return array('d', accumulate(values, initial=0.0))
+
+
+def rolling_sum(values, window):
+    """Trailing window sums; the first window-1 days use the days available"""
+    sums = prefix_sums(values)
+    size = len(values)
+    lead = min(window - 1, size)
+    lower = chain(repeat(0.0, lead), sums[:size - lead])
+    return array('d', map(operator.sub, sums[1:], lower))
+
+
+def rolling_mean(values, window, mask=None):
+    """
+    Trailing window means
+
+    Args:
+        values: Daily values
+        window: Window length in days
+        mask: Optional 0/1 per day; only marked days count toward the mean
+
+    Returns:
+        array of means (0 where a window has no counted days)
+    """
+    if mask is None:
+        counts = map(min, range(1, len(values) + 1), repeat(window))
+    else:
+        values = array('d', map(operator.mul, values, mask))
+        counts = rolling_sum(mask, window)
+    return array('d', map(_divide, rolling_sum(values, window), counts))
+
+
+def _divide(total, count):
+    return total / count if count else 0.0
+
+
+def streaks(mask):
+    """
+    Current and longest runs of consecutive marked days
+
+    The current streak ends on the last day, or on the day before if the
+    last day (usually today, still in progress) is not marked yet.
+    """
+    runs = [(hit, len(list(group))) for hit, group in groupby(mask)]
+    longest = max((length for hit, length in runs if hit), default=0)
+    current = 0
+    if runs:
+        if runs[-1][0]:
+            current = runs[-1][1]
+        elif runs[-1][1] == 1 and len(runs) > 1:
+            current = runs[-2][1]
+    return {"current": current, "longest": longest}
+
+
+def slope(values, mask):
+    """Least-squares slope of values over day index, using marked days only"""
+    xs = list(compress(range(len(values)), mask))
+    ys = list(compress(values, mask))
+    n = len(xs)
+    if n < 2:
+        return 0.0
+    mean_x = math.fsum(xs) / n
+    mean_y = math.fsum(ys) / n
+    dx = [x - mean_x for x in xs]
+    denominator = math.fsum(map(operator.mul, dx, dx))
+    numerator = math.fsum(map(operator.mul, dx, (y - mean_y for y in ys)))
+    return numerator / denominator if denominator else 0.0
+
+
+def _rounded(values, digits=1):
+    return list(map(round, values, repeat(digits)))
+
+
+class NutritionAnalytics:
+    """
+    History reports built from daily totals
+
+    Each report reads one row per day from UserManager.get_history (daily
+    totals and counters, never the raw logs) into array columns. Rollups
+    are prefix sums and element-wise map() over those columns, so a year
+    of history costs a few passes over 366 numbers per user.
+    """
+
+    def __init__(self, manager=None):
+        self.manager = manager if manager is not None else user_manager
+
+    def series(self, username, start, end):
+        """
+        Daily columns for a date range
+
+        Returns:
+            (dates, {field: array('d')}) with one entry per day
+        """
+        rows = self.manager.get_history(username, start, end)
+        dates = [row['date'] for row in rows]
+        columns = {
+            field: array('d', map(operator.itemgetter(field), rows))
+            for field in SERIES_FIELDS
+        }
+        return dates, columns
+
+    def report(self, username, days=30, window=7, end=None):
+        """
+        Trends, averages and streaks for the last `days` days
+
+        Args:
+            username: User to report on
+            days: Length of the period, ending on `end`
+            window: Rolling average window in days
+            end: Last ISO date of the period (default today)
+
+        Returns:
+            JSON-ready dict with series, rolling averages, averages over
+            logged days, TDEE adherence, streaks and the balance trend.
+            Adherence compares intake with the goal-adjusted tdee target;
+            the balance compares it with maintenance calories.
+        """
+        days = max(1, min(int(days), MAX_DAYS))
+        window = max(1, min(int(window), days))
+        last = datetime.date.fromisoformat(end) if end else datetime.date.today()
+        first = last - datetime.timedelta(days=days - 1)
+
+        dates, columns = self.series(username, first.isoformat(), last.isoformat())
+        profile = (self.manager.get_user_data(username, with_logs=False) or {}).get('profile', {})
+        tdee = profile.get('tdee', 0)
+        maintenance = energy_calculator.maintenance(profile)
+
+        calories = columns["calories"]
+        logged = array('b', map(operator.gt, calories, repeat(0)))
+        logged_days = sum(logged)
+
+        burned = array('d', map(operator.add, columns["burned"],
+                                map(operator.mul, columns["steps"], repeat(STEP_CALORIES))))
+        # Net energy: intake minus maintenance. Logged exercise and steps are
+        # what the activity multiplier already estimates, so they are
+        # reported but not subtracted a second time.
+        balance = array('d', map(operator.sub, calories, repeat(maintenance)))
+
+        if tdee:
+            tolerance = tdee * TARGET_TOLERANCE
+            gap = map(abs, map(operator.sub, calories, repeat(tdee)))
+            on_target = array('b', map(operator.and_, logged, map(operator.le, gap, repeat(tolerance))))
+        else:
+            on_target = array('b', repeat(0, len(calories)))
+
+        def logged_average(values):
+            return round(math.fsum(compress(values, logged)) / logged_days, 1) if logged_days else 0
+
+        average_balance = logged_average(balance)
+        trend = slope(balance, logged)
+        if abs(average_balance) <= maintenance * TARGET_TOLERANCE / 2:
+            direction = "maintenance"
+        else:
+            direction = "deficit" if average_balance < 0 else "surplus"
+
+        return {
+            "start": first.isoformat(),
+            "end": last.isoformat(),
+            "window": window,
+            "tdee": tdee,
+            "maintenance": round(maintenance),
+            "series": {
+                "dates": dates,
+                **{field: _rounded(values) for field, values in columns.items()},
+                "balance": [round(b) if hit else None for b, hit in zip(balance, logged)],
+            },
+            "rolling": {
+                "calories": _rounded(rolling_mean(calories, window, logged)),
+                "protein": _rounded(rolling_mean(columns["protein"], window, logged)),
+                "balance": _rounded(rolling_mean(balance, window, logged)),
+                "steps": _rounded(rolling_mean(columns["steps"], window)),
+                "water": _rounded(rolling_mean(columns["water"], window)),
+            },
+            "averages": {
+                **{field: logged_average(columns[field]) for field in ("calories", "protein", "carbs", "fats")},
+                "burned": round(math.fsum(burned) / days, 1),
+                "water": round(math.fsum(columns["water"]) / days, 1),
+                "steps": round(math.fsum(columns["steps"]) / days),
+            },
+            "adherence": {
+                "days_logged": logged_days,
+                "days_on_target": sum(on_target),
+                "rate": round(sum(on_target) / logged_days, 3) if logged_days else 0,
+                "tolerance": TARGET_TOLERANCE,
+            },
+            "streaks": {
+                "logging": streaks(logged),
+                "on_target": streaks(on_target),
+                "water": streaks(map(operator.ge, columns["water"], repeat(WATER_GOAL))),
+                "steps": streaks(map(operator.ge, columns["steps"], repeat(STEP_GOAL))),
+            },
+            "trend": {
+                "direction": direction,
+                "average_balance": average_balance,
+                "balance_slope": round(trend, 2),
+                "weekly_weight_change_kg": round(average_balance * 7 / KCAL_PER_KG, 2),
+            },
+        }
+
+
+# Global instance
+nutrition_analytics = NutritionAnalytics()
@@ -0,0 +1,35 @@
+from functools import wraps
+
+from flask import g, jsonify, redirect, session, url_for
+
+from diet_planner.data_store import user_manager
+
+
+def _resolve_user():
+    """Load the signed-session username into g.username; False if not logged in"""
+    username = session.get('username')
+    if not username or not user_manager.user_exists(username):
+        session.pop('username', None)
+        return False
+    g.username = username
+    return True
+
+
+def login_required(view):
+    """Redirect to the login page unless the request carries a logged-in session"""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if not _resolve_user():
+            return redirect(url_for('auth.login'))
+        return view(*args, **kwargs)
+    return wrapped
+
+
+def api_login_required(view):
+    """Like login_required, but answers JSON endpoints with a 401"""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if not _resolve_user():
+            return jsonify({"error": "Not authenticated"}), 401
+        return view(*args, **kwargs)
+    return wrapped
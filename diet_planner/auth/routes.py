@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session
 from diet_planner.data_store import user_manager
 
 auth = Blueprint('auth', __name__, template_folder='templates')
@@ -9,6 +9,8 @@ def login():
         username = request.form.get('username')
         password = request.form.get('password')
         if user_manager.verify_user(username, password):
+            session.clear()
+            session['username'] = username
             return redirect(url_for('main.index'))
         else:
             flash('Invalid username or password', 'error')
@@ -21,7 +23,8 @@ def register():
         password = request.form.get('password')
         if user_manager.create_user(username, password):
             # Auto login after register
-            user_manager.verify_user(username, password)
+            session.clear()
+            session['username'] = username
             return redirect(url_for('main.index'))
         else:
             flash('Username already exists', 'error')
@@ -29,5 +32,5 @@ def register():
 
 @auth.route('/logout')
 def logout():
-    user_manager.logout()
+    session.clear()
     return redirect(url_for('auth.login'))
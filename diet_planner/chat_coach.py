@@ -0,0 +1,512 @@
+"""
+Chat Coach
+Rule-based intent matching for the diet coach chat, answered from the food catalog
+"""
+
+from collections import deque
+import heapq
+import re
+import threading
+
+from diet_planner.alternatives import alternatives_graph
+from diet_planner.food_data import food_catalog
+from diet_planner.food_search import food_search_index
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Longest food name (in words) tried when spotting foods in a message
+MAX_FOOD_WORDS = 5
+RESULT_LIMIT = 5
+
+FALLBACK = "I'm not sure about that. Try asking about 'protein' or 'tips'."
+
+# Replies that need no catalog lookup
+REPLIES = {
+    "greeting": "Hello! I'm your AI Diet Coach. How can I help you today?",
+    "thanks": "You're welcome! Keep crushing your goals! 💪",
+}
+
+# Phrases that select an action; the catalog decides what it returns
+INTENT_PHRASES = {
+    "greeting": ("hello", "hi", "hey", "namaste", "good morning", "good evening"),
+    "thanks": ("thank", "thanks", "thank you", "thx"),
+    "compare": ("compare", "vs", "versus", "better than", "difference between"),
+    "alternatives": ("alternative", "alternatives", "instead of", "substitute", "substitutes",
+                     "swap", "replace", "replacement", "similar to"),
+    "food_info": ("calories in", "calories of", "how many calories", "nutrition", "macros",
+                  "how much protein", "how much fat", "how many carbs", "is it healthy", "info"),
+    "find_foods": ("foods", "food", "suggest", "recommend", "what to eat", "what can i eat", "what should i eat",
+                   "options", "ideas", "show me", "list", "meals", "items"),
+}
+
+# Phrase -> (column, direction) the answer is ranked by
+NUTRIENT_PHRASES = {
+    "protein": ("p", "high"),
+    "high protein": ("p", "high"),
+    "protein rich": ("p", "high"),
+    "rich in protein": ("p", "high"),
+    "low carb": ("c", "low"),
+    "low carbs": ("c", "low"),
+    "keto": ("c", "low"),
+    "high carb": ("c", "high"),
+    "low fat": ("f", "low"),
+    "high fat": ("f", "high"),
+    "low calorie": ("calories", "low"),
+    "low calories": ("calories", "low"),
+    "low cal": ("calories", "low"),
+    "light": ("calories", "low"),
+    "high calorie": ("calories", "high"),
+    "calorie dense": ("calories", "high"),
+    "bulking": ("calories", "high"),
+}
+
+# Bound applied when a nutrient phrase comes without an explicit number
+DEFAULT_BOUNDS = {
+    ("p", "high"): (15, None),
+    ("c", "low"): (None, 15),
+    ("c", "high"): (40, None),
+    ("f", "low"): (None, 5),
+    ("f", "high"): (15, None),
+    ("calories", "low"): (None, 150),
+    ("calories", "high"): (400, None),
+}
+
+HEALTHY_PHRASES = ("healthy", "healthier", "clean", "nutritious")
+
+# Category -> extra phrases users call it by (the category name itself is always added)
+CATEGORY_PHRASES = {
+    "Beverage": ("drink", "drinks"),
+    "Vegetable": ("veggie", "veggies", "veg"),
+    "Snack": ("snacking",),
+}
+
+# Topic -> (phrases, reply)
+TIPS = {
+    "weight_loss": (("weight loss", "lose weight", "losing weight", "fat loss", "cut", "cutting"),
+                    "To lose weight, aim for a calorie deficit of 300-500 kcal and increase protein intake."),
+    "weight_gain": (("weight gain", "gain weight", "put on weight", "bulk up"),
+                    "To gain weight, eat 300-500 kcal above your TDEE with plenty of protein, and lift weights."),
+    "muscle": (("build muscle", "muscle gain", "gain muscle", "muscle building"),
+               "For muscle gain, eat about 1.6-2.2 g protein per kg body weight and train each muscle twice a week."),
+    "water": (("water", "hydration", "hydrated", "dehydrated"),
+              "Staying hydrated is key! Aim for at least 8 glasses a day."),
+    "sleep": (("sleep", "sleeping", "rest day", "recovery"),
+              "Aim for 7-9 hours of sleep; poor sleep raises hunger hormones and slows recovery."),
+    "sugar": (("sugar", "sweets", "sweet tooth", "dessert", "cravings"),
+              "Keep added sugar under 25-36 g a day; fruit, yogurt or dark chocolate can tame a sweet tooth."),
+    "fiber": (("fiber", "fibre", "constipation", "digestion"),
+              "Aim for 25-35 g of fiber a day from vegetables, fruit, dal, oats and whole grains."),
+    "pre_workout": (("pre workout", "before workout", "before gym", "before exercise"),
+                    "Eat a light carb-rich snack 30-60 minutes before training, like a banana or toast."),
+    "post_workout": (("post workout", "after workout", "after gym", "after exercise"),
+                     "After training, have 20-40 g protein with some carbs within a couple of hours."),
+    "breakfast": (("skip breakfast", "skipping breakfast", "breakfast ideas"),
+                  "A protein-rich breakfast (eggs, paneer, Greek yogurt, besan chilla) keeps you full longer."),
+    "late_night": (("late night", "night snack", "midnight snack", "eating at night"),
+                   "If you're hungry late, pick something light and protein-rich like curd or a handful of nuts."),
+    "cheat_meal": (("cheat meal", "cheat day", "binge"),
+                   "One indulgent meal won't undo your progress; get back to your plan at the next meal."),
+    "plateau": (("plateau", "stuck", "not losing", "stopped losing"),
+                "Plateaus are normal. Recheck portions, add steps or a training day, and give it 2-3 weeks."),
+    "fasting": (("intermittent fasting", "fasting", "16 8"),
+                "Intermittent fasting works if it helps you eat less overall; protein and total calories still matter most."),
+    "meal_prep": (("meal prep", "meal planning", "prep meals"),
+                  "Cook a protein, a grain and two vegetables in bulk twice a week to make healthy eating easy."),
+    "portion": (("portion", "portions", "portion size", "overeating"),
+                "Use your hand as a guide: a palm of protein, a fist of carbs, two fists of vegetables, a thumb of fat."),
+    "calcium": (("calcium", "bones", "bone health"),
+                "Dairy, ragi, tofu, sesame and leafy greens are good calcium sources; aim for about 1000 mg a day."),
+    "iron": (("iron", "anemia", "anaemia"),
+             "Spinach, dal, rajma, jaggery and meat provide iron; pair plant sources with vitamin C for absorption."),
+    "vitamin_d": (("vitamin d", "sunlight"),
+                  "Get 15-20 minutes of sunlight most days; eggs, fish and fortified milk add vitamin D."),
+    "alcohol": (("alcohol", "beer", "wine", "drinking"),
+                "Alcohol has 7 kcal per gram and lowers inhibitions around food; keep it occasional."),
+    "caffeine": (("caffeine", "too much coffee", "energy drink"),
+                 "Up to about 400 mg caffeine (3-4 cups of coffee) a day is fine for most adults; avoid it late in the day."),
+    "tdee": (("tdee", "maintenance calories", "how many calories should i eat", "calorie target"),
+             "Your TDEE is your BMR times your activity level; the dashboard calculates it from your profile."),
+    "bmr": (("bmr", "metabolism", "basal metabolic rate"),
+            "BMR is the energy you burn at rest. Building muscle and staying active keeps it up."),
+    "macros_tip": (("macro split", "what are macros", "macronutrients"),
+                   "Macros are protein, carbs and fats. A balanced start is 30% protein, 40-50% carbs, 20-30% fat."),
+    "cardio": (("cardio", "running", "walking", "steps"),
+               "Aim for 150 minutes of moderate cardio a week; 8,000-10,000 steps a day is a great baseline."),
+    "strength": (("strength training", "weights", "lifting", "gym"),
+                 "Strength train 2-4 times a week, adding a little weight or a rep each week."),
+    "motivation": (("motivation", "motivated", "give up", "consistency"),
+                   "Small, consistent habits beat perfect plans. Track today's meals and celebrate small wins!"),
+    "stress": (("stress", "stressed", "emotional eating", "anxiety"),
+               "Stress can drive cravings; try a short walk, deep breathing or a call with a friend before reaching for snacks."),
+    "vegetarian_protein": (("vegetarian protein", "veg protein", "plant protein", "vegan protein"),
+                           "Good vegetarian proteins: paneer, tofu, dal, chana, rajma, Greek yogurt, soy chunks and sprouts."),
+    "tips": (("tip", "tips", "advice", "help"),
+             "Fill half your plate with vegetables, include protein at every meal, drink water and keep moving!"),
+}
+
+# Number with an optional comparison before it and a unit/nutrient around it,
+# e.g. ">20g protein", "under 200 kcal", "protein over 25 g", "at most 10g fat"
+_QUANTITY_RE = re.compile(
+    r"(?:(?P<before>protein|carbs?|carbohydrates?|fats?|calories)\s+(?:of\s+)?)?"
+    r"(?P<cmp>>=|<=|>|<|more than|less than|at least|at most|over|under|above|below|"
+    r"min(?:imum)?|max(?:imum)?|up to|upto|within)?\s*"
+    r"(?P<num>\d+(?:\.\d+)?)\s*"
+    r"(?P<unit>kcals?|calories|cals?|grams?|gms?|g)?\b"
+    r"(?:\s*(?:of\s+)?(?P<after>protein|carbs?|carbohydrates?|fats?))?"
+)
+
+_LOWER_BOUNDS = frozenset((">", ">=", "more than", "at least", "over", "above", "min", "minimum"))
+# Comparisons that exclude the number itself: ">20g" does not match 20g
+_STRICT_BOUNDS = frozenset((">", "<", "more than", "less than", "over", "under", "above", "below"))
+
+_NUTRIENT_COLUMNS = {
+    "protein": "p", "carb": "c", "carbs": "c", "carbohydrate": "c", "carbohydrates": "c",
+    "fat": "f", "fats": "f", "calories": "calories",
+}
+
+# Intents that are about a specific food
+_NEEDS_FOOD = frozenset(("food_info", "alternatives", "compare"))
+
+# Words skipped when searching for a food name the message did not spell exactly
+_FILLER_WORDS = frozenset((
+    "a", "an", "the", "in", "of", "to", "for", "is", "are", "it", "my", "me", "and", "or",
+    "with", "what", "which", "how", "much", "many", "does", "do", "there", "one", "some",
+    "cup", "cups", "piece", "pieces", "plate", "bowl", "serving", "g", "carbs", "fat",
+))
+
+
+def tokenize(message):
+    """Lowercase words and numbers of a message"""
+    return _TOKEN_RE.findall(message.lower())
+
+
+def _variants(phrase):
+    """A phrase and its plural/singular form on the last word"""
+    yield phrase
+    yield phrase[:-1] if phrase.endswith("s") else phrase + "s"
+
+
+class PhraseMatcher:
+    """
+    Word-level Aho-Corasick automaton
+
+    Phrases are tokenized into a trie with failure links, so one pass over
+    the message's words reports every phrase occurrence. The cost depends
+    on the message length and the number of matches, not on how many
+    phrases were added.
+    """
+
+    def __init__(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+
+    def add(self, phrase, payload):
+        """Register a phrase; returns False if it has no words"""
+        words = tokenize(phrase)
+        if not words:
+            return False
+        state = 0
+        for word in words:
+            following = self._goto[state].get(word)
+            if following is None:
+                following = len(self._goto)
+                self._goto[state][word] = following
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = following
+        if (len(words), payload) not in self._out[state]:
+            self._out[state].append((len(words), payload))
+        return True
+
+    def build(self):
+        """Compute failure links; call after the last add()"""
+        queue = deque(self._goto[0].values())
+        for state in queue:
+            self._fail[state] = 0
+        while queue:
+            state = queue.popleft()
+            for word, following in self._goto[state].items():
+                queue.append(following)
+                fallback = self._fail[state]
+                while fallback and word not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[following] = self._goto[fallback].get(word, 0)
+                self._out[following] = self._out[following] + self._out[self._fail[following]]
+        return self
+
+    def scan(self, words):
+        """Yield (start, end, payload) for every phrase found in a word list"""
+        state = 0
+        for end, word in enumerate(words, 1):
+            while state and word not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(word, 0)
+            for length, payload in self._out[state]:
+                yield end - length, end, payload
+
+
+def parse_quantities(message, nutrient=None):
+    """
+    Numeric limits in a message as {column: (low, high, strict_low, strict_high)}
+
+    Args:
+        message: Lowercased message text
+        nutrient: Column to use for bare gram amounts ("20g") when the
+            message names no nutrient next to the number
+
+    Returns:
+        Bounds merged per column in FoodCatalog.where() form; ">", "over",
+        "under" etc. are strict, ">=", "at least", "max" etc. inclusive.
+        Numbers with no unit or nutrient are ignored.
+    """
+    bounds = {}
+    for match in _QUANTITY_RE.finditer(message):
+        unit = match["unit"] or ""
+        named = match["after"] or match["before"]
+        if unit.startswith(("kcal", "cal")) or named == "calories":
+            column = "calories"
+        elif named:
+            column = _NUTRIENT_COLUMNS[named]
+        elif unit and nutrient and nutrient != "calories":
+            column = nutrient
+        else:
+            continue
+        value = float(match["num"])
+        low, high, strict_low, strict_high = bounds.get(column, (None, None, False, False))
+        comparison = match["cmp"]
+        strict = comparison in _STRICT_BOUNDS
+        # "20g protein" means at least 20g; "200 kcal" means at most 200
+        is_lower = comparison in _LOWER_BOUNDS if comparison else column != "calories"
+        # The tighter limit wins; on a tie, a strict one is tighter
+        if is_lower:
+            if low is None or value > low:
+                low, strict_low = value, strict
+            elif value == low:
+                strict_low = strict_low or strict
+        else:
+            if high is None or value < high:
+                high, strict_high = value, strict
+            elif value == high:
+                strict_high = strict_high or strict
+        bounds[column] = (low, high, strict_low, strict_high)
+    return bounds
+
+
+def _amount(value):
+    return int(value) if float(value).is_integer() else round(value, 1)
+
+
+def _describe(food):
+    return f"{food['name']} ({_amount(food['calories'])} kcal, {_amount(food['p'])}g protein)"
+
+
+def _join(items):
+    return items[0] if len(items) == 1 else ", ".join(items[:-1]) + " and " + items[-1]
+
+
+class ChatCoach:
+    """
+    Intent engine behind /features/chat
+
+    Every phrase (intents, nutrient modifiers, categories, tips) lives in
+    one PhraseMatcher, numbers and units come from one precompiled regex,
+    and foods are spotted by looking word windows up in the catalog's name
+    index. All three are single passes over the message, so reply time
+    stays flat as intents and tips are added. The matcher is rebuilt when
+    the catalog version changes, since category names come from it.
+    """
+
+    def __init__(self, catalog, tips=None):
+        self.catalog = catalog
+        self.tips = dict(TIPS if tips is None else tips)
+        self._matcher = None
+        self._version = None
+        self._lock = threading.Lock()
+
+    def add_tip(self, topic, phrases, reply):
+        """Register a canned answer for a set of phrases"""
+        with self._lock:
+            self.tips[topic] = (tuple(phrases), reply)
+            self._matcher = None
+
+    def _build_matcher(self):
+        matcher = PhraseMatcher()
+        for intent, phrases in INTENT_PHRASES.items():
+            for phrase in phrases:
+                matcher.add(phrase, ("intent", intent))
+        for phrase, nutrient in NUTRIENT_PHRASES.items():
+            matcher.add(phrase, ("nutrient", nutrient))
+        for phrase in HEALTHY_PHRASES:
+            matcher.add(phrase, ("healthy", True))
+        taken = set(NUTRIENT_PHRASES)
+        for category in self.catalog.categories:
+            for phrase in (category.lower(), *CATEGORY_PHRASES.get(category, ())):
+                for variant in _variants(phrase):
+                    if variant not in taken:
+                        matcher.add(variant, ("category", category))
+        for topic, (phrases, _) in self.tips.items():
+            for phrase in phrases:
+                matcher.add(phrase, ("tip", topic))
+        return matcher.build()
+
+    def matcher(self):
+        """Phrase automaton for the current catalog version"""
+        with self._lock:
+            if self._matcher is None or self._version != self.catalog.version:
+                self._matcher = self._build_matcher()
+                self._version = self.catalog.version
+            return self._matcher
+
+    def _find_foods(self, words, covered):
+        """Catalog row ids named in the message, trying the longest word windows first"""
+        foods = []
+        start = 0
+        while start < len(words):
+            for size in range(min(MAX_FOOD_WORDS, len(words) - start), 0, -1):
+                if size == 1 and start in covered:
+                    continue
+                name = " ".join(words[start:start + size])
+                food_id = self.catalog.find_name(name)
+                if food_id is None and name.endswith("s"):
+                    food_id = self.catalog.find_name(name[:-1])
+                if food_id is not None:
+                    if food_id not in foods:
+                        foods.append(food_id)
+                    start += size
+                    break
+            else:
+                start += 1
+        return foods
+
+    def _search_food(self, words, covered):
+        """Best fuzzy name match for the words no phrase claimed, or None"""
+        terms = [word for i, word in enumerate(words)
+                 if i not in covered and word not in _FILLER_WORDS and not word.isdigit()]
+        if not terms:
+            return None
+        food_ids = food_search_index.search_ids(" ".join(terms), limit=1)
+        return food_ids[0] if food_ids else None
+
+    def analyze(self, message):
+        """
+        Intents and entities found in a message
+
+        Returns:
+            dict with intents (set), tips ((length, -start, topic) per
+                match, so max() is the longest, earliest), nutrient
+            (column, direction) or None, healthy, categories, foods (row
+            ids) and bounds ({column: (low, high, strict_low, strict_high)})
+        """
+        text = message.lower()
+        words = tokenize(text)
+        found = {"intents": set(), "tips": [], "nutrient": None, "healthy": None,
+                 "categories": [], "foods": [], "bounds": {}}
+        covered = set()
+        for start, end, (kind, value) in self.matcher().scan(words):
+            if kind == "intent":
+                found["intents"].add(value)
+            elif kind == "tip":
+                found["tips"].append((end - start, -start, value))
+                continue
+            elif kind == "nutrient":
+                found["nutrient"] = found["nutrient"] or value
+            elif kind == "healthy":
+                found["healthy"] = True
+            elif kind == "category" and value not in found["categories"]:
+                found["categories"].append(value)
+            # Single words that matched an intent or filter are not food names
+            covered.update(range(start, end))
+        found["foods"] = self._find_foods(words, covered)
+        # Food questions (or messages nothing else matched) without an exact
+        # name fall back to the search index
+        if not found["foods"] and (found["intents"] & _NEEDS_FOOD or not covered):
+            food_id = self._search_food(words, covered)
+            if food_id is not None:
+                found["foods"].append(food_id)
+        nutrient = found["nutrient"][0] if found["nutrient"] else None
+        found["bounds"] = parse_quantities(text, nutrient)
+        return found
+
+    # --- Answers ---
+    def _food_info(self, food_id):
+        food = self.catalog.row(food_id)
+        note = ", healthy 🌿" if food["healthy"] else ""
+        return (f"{food['name']}: {_amount(food['calories'])} kcal, {_amount(food['p'])}g protein, "
+                f"{_amount(food['c'])}g carbs, {_amount(food['f'])}g fat ({food['category']}{note}).")
+
+    def _compare(self, first_id, second_id):
+        first, second = self.catalog.rows([first_id, second_id])
+        lighter = first if first["calories"] <= second["calories"] else second
+        stronger = first if first["p"] >= second["p"] else second
+        if lighter is stronger:
+            verdict = f"{lighter['name']} has fewer calories and more protein."
+        else:
+            verdict = f"{lighter['name']} has fewer calories; {stronger['name']} has more protein."
+        return f"{self._food_info(first_id)} {self._food_info(second_id)} {verdict}"
+
+    def _alternatives(self, food_id):
+        related = alternatives_graph.related(food_id, "alternatives")[:RESULT_LIMIT]
+        name = self.catalog.names[food_id]
+        if not related:
+            return f"I couldn't find close alternatives to {name}."
+        return f"Instead of {name}, try {_join([_describe(food) for food in self.catalog.rows(related)])}."
+
+    def _find_foods_reply(self, found):
+        nutrient = found["nutrient"]
+        bounds = dict(found["bounds"])
+        if nutrient and nutrient[0] not in bounds:
+            bounds[nutrient[0]] = DEFAULT_BOUNDS[nutrient]
+        food_ids = self.catalog.where(
+            categories=found["categories"] or None,
+            healthy=found["healthy"],
+            **bounds,
+        )
+
+        # Ranked by the nutrient asked about, else the first limit given, else protein
+        if nutrient:
+            column, direction = nutrient
+        elif found["bounds"]:
+            column, direction = next(iter(found["bounds"])), "low"
+        else:
+            column, direction = "p", "high"
+        values = self.catalog.column(column)
+        pick = heapq.nlargest if direction == "high" else heapq.nsmallest
+        best = pick(RESULT_LIMIT, food_ids, key=values.__getitem__)
+
+        if not best:
+            return "No foods match that. Try loosening the limits."
+        listed = _join([_describe(food) for food in self.catalog.rows(best)])
+        if found["bounds"] or found["categories"] or found["healthy"]:
+            return f"Try {listed}."
+        label = {"p": "protein", "c": "carb", "f": "fat", "calories": "calorie"}[column]
+        return f"{direction.title()} {label} foods include {listed}."
+
+    def reply(self, message):
+        """Answer a chat message"""
+        found = self.analyze(message)
+        intents, foods = found["intents"], found["foods"]
+
+        if "compare" in intents and len(foods) >= 2:
+            return self._compare(foods[0], foods[1])
+        if "alternatives" in intents and foods:
+            return self._alternatives(foods[0])
+        if foods and not found["bounds"] and ("food_info" in intents or found["nutrient"]):
+            return self._food_info(foods[0])
+        if (found["bounds"] or found["nutrient"] or found["healthy"] or found["categories"]
+                or "find_foods" in intents):
+            return self._find_foods_reply(found)
+        if found["tips"]:
+            # The most specific tip wins: "help me lose weight" is about weight loss
+            return self.tips[max(found["tips"])[2]][1]
+        if foods:
+            return self._food_info(foods[0])
+        for intent in ("greeting", "thanks"):
+            if intent in intents:
+                return REPLIES[intent]
+        return FALLBACK
+
+
+# Global instance
+chat_coach = ChatCoach(food_catalog)
@@ -3,23 +3,28 @@ Diet Plan Customization Routes
 Endpoints for users to customize their diet plans
 """
 
-from flask import Blueprint, render_template, request, redirect, url_for, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, jsonify, g
+from diet_planner.auth.decorators import login_required, api_login_required
+from diet_planner.analytics import nutrition_analytics
 from diet_planner.data_store import user_manager
-from diet_planner.diet_plan_customizer import DietPlanCustomizer
+from diet_planner.diet_plan_customizer import DietPlanCustomizer, filtered_food_cache
+from diet_planner.http_cache import cached_json, response_cache
 from diet_planner.meal_suggestions import meal_suggestions
+from diet_planner.plan_store import profile_view
+from diet_planner.sampling import seeded_rng
+from diet_planner.workout_data import program_cache
 
 customization = Blueprint('customization', __name__, url_prefix='/customize')
 
 @customization.route("/preferences", methods=["GET", "POST"])
+@login_required
 def preferences():
     """View and manage diet preferences"""
-    if not user_manager.current_user:
-        return redirect(url_for('auth.login'))
-    
     if request.method == "POST":
         # Update preferences
         macro_preset = request.form.get("macro_preset", "balanced")
         dietary_restrictions = request.form.getlist("dietary_restrictions")
+        food_allergies = request.form.getlist("food_allergies")
         preferred_cuisines = request.form.getlist("preferred_cuisines")
         exclude_foods = request.form.get("exclude_foods", "").split(",")
         exclude_foods = [f.strip() for f in exclude_foods if f.strip()]
@@ -45,15 +50,16 @@ def preferences():
             "macro_preset": macro_preset,
             "custom_macros": custom_macros,
             "dietary_restrictions": dietary_restrictions,
+            "food_allergies": food_allergies,
             "preferred_cuisines": preferred_cuisines or ["Indian", "Breakfast", "Protein"],
             "exclude_foods": exclude_foods
         }
         
-        user_manager.update_diet_preferences(user_manager.current_user, prefs)
+        user_manager.update_diet_preferences(g.username, prefs)
         return redirect(url_for("customization.preferences"))
     
     # GET - Show preferences
-    current_prefs = user_manager.get_diet_preferences()
+    current_prefs = user_manager.get_diet_preferences(g.username)
     
     macro_presets = {
         "balanced": "Balanced (50% Carbs, 30% Protein, 20% Fat)",
@@ -69,13 +75,11 @@ def preferences():
 
 
 @customization.route("/generate", methods=["GET", "POST"])
+@login_required
 def generate_custom_plan():
     """Generate a custom diet plan based on user preferences"""
-    if not user_manager.current_user:
-        return redirect(url_for('auth.login'))
-    
-    user_data = user_manager.get_user_data()
-    profile = user_data['profile']
+    user_data = user_manager.get_user_data(g.username, with_logs=False)
+    profile = dict(user_data['profile'])
     
     if not profile.get('tdee'):
         return redirect(url_for('main.index'))
@@ -84,38 +88,28 @@ def generate_custom_plan():
         # Allow user to override macro preset
         macro_preset = request.form.get("macro_preset")
         
-        customizer = DietPlanCustomizer()
-        prefs = user_manager.get_diet_preferences()
+        prefs = user_manager.get_diet_preferences(g.username)
         
         # Apply user preferences to customizer
+        customizer = DietPlanCustomizer.from_preferences(prefs)
+        customizer.user_preferences["custom_macros"] = None
         if macro_preset:
             customizer.set_macro_preset(macro_preset)
-        else:
-            customizer.user_preferences["macro_preset"] = prefs.get("macro_preset", "balanced")
-        
-        customizer.user_preferences["dietary_restrictions"] = prefs.get("dietary_restrictions", [])
-        customizer.user_preferences["cuisines"] = prefs.get("preferred_cuisines", [])
-        customizer.user_preferences["exclude_foods"] = prefs.get("exclude_foods", [])
         
         # Generate the plan
         tdee = profile.get('tdee', 2000)
-        meal_dist = prefs.get("meal_distribution", {
-            "breakfast": 0.25,
-            "lunch": 0.35,
-            "dinner": 0.35,
-            "snacks": 0.05
-        })
+        meal_dist = prefs.get("meal_distribution", DietPlanCustomizer.DEFAULT_MEAL_DISTRIBUTION)
         
-        custom_plan = customizer.generate_plan(tdee, meal_dist)
+        custom_plan = customizer.generate_plan(tdee, meal_dist, compact=True)
         
-        # Update profile with new plan
+        # Update profile with new plan; preferences already live in diet_preferences
         profile['diet_plan'] = custom_plan
-        profile['customizer_settings'] = customizer.get_preferences()
-        user_manager.update_profile(user_manager.current_user, profile)
+        profile.pop('customizer_settings', None)
+        user_manager.update_profile(g.username, profile)
         
         return redirect(url_for("main.index"))
     
-    current_prefs = user_manager.get_diet_preferences()
+    current_prefs = user_manager.get_diet_preferences(g.username)
     macro_presets = {
         "balanced": "Balanced (50% Carbs, 30% Protein, 20% Fat)",
         "high_protein": "High Protein (40% Carbs, 40% Protein, 20% Fat)",
@@ -131,13 +125,11 @@ def generate_custom_plan():
 
 
 @customization.route("/api/macros", methods=["GET", "POST"])
+@api_login_required
 def api_macros():
     """API endpoint for macro management"""
-    if not user_manager.current_user:
-        return jsonify({"error": "Not authenticated"}), 401
-    
     if request.method == "GET":
-        prefs = user_manager.get_diet_preferences()
+        prefs = user_manager.get_diet_preferences(g.username)
         return jsonify(prefs)
     
     if request.method == "POST":
@@ -150,7 +142,7 @@ def api_macros():
                 customizer = DietPlanCustomizer()
                 if customizer.set_custom_macros(data["carbs"], data["protein"], data["fats"]):
                     user_manager.update_diet_preferences(
-                        user_manager.current_user,
+                        g.username,
                         {"custom_macros": customizer.user_preferences["custom_macros"]}
                     )
                     return jsonify({"success": True, "message": "Macros updated"})
@@ -159,13 +151,11 @@ def api_macros():
 
 
 @customization.route("/api/restrictions", methods=["GET", "POST"])
+@api_login_required
 def api_restrictions():
     """API endpoint for dietary restrictions"""
-    if not user_manager.current_user:
-        return jsonify({"error": "Not authenticated"}), 401
-    
     if request.method == "GET":
-        prefs = user_manager.get_diet_preferences()
+        prefs = user_manager.get_diet_preferences(g.username)
         return jsonify({"restrictions": prefs.get("dietary_restrictions", [])})
     
     if request.method == "POST":
@@ -173,8 +163,8 @@ def api_restrictions():
         restriction = data.get("restriction")
         action = data.get("action", "add")  # add or remove
         
-        prefs = user_manager.get_diet_preferences()
-        restrictions = prefs.get("dietary_restrictions", [])
+        prefs = user_manager.get_diet_preferences(g.username)
+        restrictions = list(prefs.get("dietary_restrictions", []))
         
         if action == "add" and restriction not in restrictions:
             restrictions.append(restriction)
@@ -182,7 +172,7 @@ def api_restrictions():
             restrictions.remove(restriction)
         
         user_manager.update_diet_preferences(
-            user_manager.current_user,
+            g.username,
             {"dietary_restrictions": restrictions}
         )
         
@@ -190,24 +180,20 @@ def api_restrictions():
 
 
 @customization.route("/api/meal-alternatives/<meal_name>", methods=["GET"])
+@api_login_required
+@response_cache.cached(per_user=True)
 def api_meal_alternatives(meal_name):
     """Get alternative meals for a given meal"""
-    if not user_manager.current_user:
-        return jsonify({"error": "Not authenticated"}), 401
-    
     # Find the meal in the database
-    from diet_planner.food_data import food_database
-    current_meal = None
-    for food in food_database:
-        if food['name'].lower() == meal_name.lower():
-            current_meal = food
-            break
+    from diet_planner.food_data import food_catalog
+    current_meal = food_catalog.get_by_name(meal_name)
     
     if not current_meal:
         return jsonify({"error": "Meal not found"}), 404
     
     # Get alternatives
-    alternatives = meal_suggestions.get_alternative_meals(current_meal, limit=5)
+    rng = seeded_rng(g.username, "meal-alternatives")
+    alternatives = meal_suggestions.get_alternative_meals(current_meal, limit=5, rng=rng)
     healthier = meal_suggestions.get_healthier_alternatives(current_meal, limit=2)
     similar = meal_suggestions.get_similar_category_meals(current_meal, limit=3)
     
@@ -220,11 +206,10 @@ def api_meal_alternatives(meal_name):
 
 
 @customization.route("/api/search-meals", methods=["GET"])
+@api_login_required
+@response_cache.cached()
 def api_search_meals():
     """Search for meals by query"""
-    if not user_manager.current_user:
-        return jsonify({"error": "Not authenticated"}), 401
-    
     query = request.args.get("q", "")
     if not query or len(query) < 2:
         return jsonify({"error": "Query too short"}), 400
@@ -234,27 +219,26 @@ def api_search_meals():
 
 
 @customization.route("/api/meals-by-calories", methods=["GET"])
+@api_login_required
+@response_cache.cached(per_user=True)
 def api_meals_by_calories():
     """Get meals within calorie range"""
-    if not user_manager.current_user:
-        return jsonify({"error": "Not authenticated"}), 401
-    
     try:
         min_cal = int(request.args.get("min", 100))
         max_cal = int(request.args.get("max", 300))
     except:
         return jsonify({"error": "Invalid calorie values"}), 400
     
-    meals = meal_suggestions.get_meals_by_calories(min_cal, max_cal, limit=10)
+    rng = seeded_rng(g.username, "meals-by-calories")
+    meals = meal_suggestions.get_meals_by_calories(min_cal, max_cal, limit=10, rng=rng)
     return jsonify({"meals": meals})
 
 
 @customization.route("/api/high-protein-meals", methods=["GET"])
+@api_login_required
+@response_cache.cached()
 def api_high_protein_meals():
     """Get high protein meal options"""
-    if not user_manager.current_user:
-        return jsonify({"error": "Not authenticated"}), 401
-    
     try:
         min_protein = int(request.args.get("min", 20))
     except:
@@ -264,15 +248,68 @@ def api_high_protein_meals():
     return jsonify({"meals": meals})
 
 
+@customization.route("/api/week-plan", methods=["GET"])
+@api_login_required
+def api_week_plan():
+    """Multi-day plan from the user's preferences, with foods referenced by id"""
+    user_data = user_manager.get_user_data(g.username, with_logs=False)
+    tdee = user_data['profile'].get('tdee')
+    if not tdee:
+        return jsonify({"error": "Create a profile first"}), 400
+    try:
+        days = max(1, min(int(request.args.get("days", 7)), 14))
+        repeat_window = max(0, int(request.args.get("repeat_window", 2)))
+    except ValueError:
+        return jsonify({"error": "Invalid days or repeat_window"}), 400
+    
+    prefs = user_manager.get_diet_preferences(g.username)
+    customizer = DietPlanCustomizer.from_preferences(prefs)
+    plan = customizer.generate_week_plan(
+        tdee, days=days, meal_distribution=prefs.get("meal_distribution"), repeat_window=repeat_window
+    )
+    
+    # Each food used in the plan is listed once, keyed by id
+    from diet_planner.food_data import food_catalog
+    food_ids = {
+        food_id
+        for day in plan["days"] for meal in day["meals"].values() if meal
+        for food_id, _ in meal["items"]
+    }
+    plan["foods"] = {food_id: food_catalog.row(food_id) for food_id in sorted(food_ids)}
+    return cached_json(plan)
+
+
+@customization.route("/api/analytics", methods=["GET"])
+@api_login_required
+def api_analytics():
+    """Calorie, macro, water and step trends over recent days"""
+    try:
+        days = int(request.args.get("days", 30))
+        window = int(request.args.get("window", 7))
+    except ValueError:
+        return jsonify({"error": "Invalid days or window"}), 400
+    
+    return cached_json(nutrition_analytics.report(g.username, days=days, window=window))
+
+
+@customization.route("/api/cache-stats", methods=["GET"])
+@api_login_required
+def api_cache_stats():
+    """Hit rates and sizes of the response, filtered-food and workout program caches"""
+    return jsonify({
+        "responses": response_cache.stats(),
+        "filtered_foods": filtered_food_cache.stats(),
+        "workout_programs": program_cache.stats(),
+    })
+
+
 @customization.route("/suggestions", methods=["GET"])
+@login_required
 def suggestions():
     """View meal suggestions page"""
-    if not user_manager.current_user:
-        return redirect(url_for('auth.login'))
-    
-    user_data = user_manager.get_user_data()
-    profile = user_data.get('profile', {})
-    diet_plan = profile.get('diet_plan', {})
+    user_data = user_manager.get_user_data(g.username, with_logs=False)
+    profile = profile_view(user_data.get('profile', {}))
+    diet_plan = profile.get('diet_plan') or {}
     
     # Get suggestions for current plan
     suggestions_data = None
@@ -284,7 +321,8 @@ def suggestions():
                 meals.get('lunch', {}),
                 meals.get('dinner', {}),
                 meals.get('snacks', {}),
-                profile.get('tdee', 2000)
+                profile.get('tdee', 2000),
+                rng=seeded_rng(g.username, "suggestions")
             )
         except:
             suggestions_data = None
@@ -0,0 +1,138 @@
+"""
+Daily Totals
+Per-day running sums of food and exercise logs, kept in step with every log write
+"""
+
+import math
+
+# Summed per user and ISO date
+TOTAL_FIELDS = ("calories", "protein", "carbs", "fats", "burned")
+
+
+def _food_totals(entry):
+    macros = entry.get("macros") or {}
+    return {
+        "calories": entry.get("calories", 0),
+        "protein": macros.get("p", 0),
+        "carbs": macros.get("c", 0),
+        "fats": macros.get("f", 0),
+    }
+
+
+def _exercise_totals(entry):
+    return {"burned": entry.get("calories_burned", 0)}
+
+
+# Log name -> function giving an entry's contribution to its day
+_CONTRIBUTIONS = {
+    "diet_log": _food_totals,
+    "fitness_log": _exercise_totals,
+}
+
+
+def _food_summary(count, totals, entries):
+    return {
+        "name": f"Daily summary ({count} items)",
+        "calories": totals["calories"],
+        "meal_type": "summary",
+        "macros": {"p": totals["protein"], "c": totals["carbs"], "f": totals["fats"]},
+    }
+
+
+def _exercise_summary(count, totals, entries):
+    return {
+        "name": f"Daily summary ({count} sessions)",
+        "category": "summary",
+        "duration": sum(entry.get("duration", 0) for entry in entries),
+        "calories_burned": totals["burned"],
+    }
+
+
+# Log name -> function building the single row a compacted day is folded into
+_SUMMARIES = {
+    "diet_log": _food_summary,
+    "fitness_log": _exercise_summary,
+}
+
+
+def empty_totals():
+    """A day with nothing logged"""
+    return dict.fromkeys(TOTAL_FIELDS, 0)
+
+
+def entry_totals(log_name, entry):
+    """Amounts one log entry adds to its day's totals"""
+    contribution = _CONTRIBUTIONS.get(log_name)
+    return contribution(entry) if contribution else {}
+
+
+def combine(totals, deltas, sign=1):
+    """
+    New totals dict with deltas added (or subtracted with sign=-1)
+
+    Returns a fresh dict so a totals dict already handed to readers is
+    never changed underneath them.
+    """
+    combined = dict(totals) if totals else empty_totals()
+    for field, value in deltas.items():
+        combined[field] = combined.get(field, 0) + sign * value
+    return combined
+
+
+def sum_entries(log_name, entries):
+    """{day: totals} for a batch of entries from one log"""
+    days = {}
+    for entry in entries:
+        day = entry["date"]
+        days[day] = combine(days.get(day), entry_totals(log_name, entry))
+    return days
+
+
+def rebuild(record):
+    """Recompute {day: totals} from the raw logs of a user record"""
+    days = {}
+    for log_name in _CONTRIBUTIONS:
+        for day, totals in sum_entries(log_name, record.get(log_name, ())).items():
+            days[day] = combine(days.get(day), totals)
+    return days
+
+
+def summary_entry(log_name, day, entries):
+    """
+    One log entry standing in for all of a day's entries
+
+    Its contribution to the day's totals equals the sum of the entries it
+    replaces, so compaction leaves daily totals (and rebuild()) unchanged.
+    Earlier summaries may be among the entries; their counts carry over.
+    """
+    count = sum(entry.get("count", 1) for entry in entries)
+    totals = sum_entries(log_name, entries).get(day, empty_totals())
+    return {
+        "id": f"summary-{day}",
+        "date": day,
+        "summary": True,
+        "count": count,
+        **_SUMMARIES[log_name](count, totals, entries),
+    }
+
+
+def rounded(totals):
+    """Totals for display: float drift removed, whole numbers as ints"""
+    result = {}
+    for field in TOTAL_FIELDS:
+        value = round(float((totals or {}).get(field, 0)), 2)
+        result[field] = int(value) if value.is_integer() else value
+    return result
+
+
+def _same(a, b):
+    return all(math.isclose(a.get(f, 0), b.get(f, 0), abs_tol=1e-6) for f in TOTAL_FIELDS)
+
+
+def mismatched_days(stored, rebuilt):
+    """Sorted days where stored running totals disagree with a rebuild"""
+    empty = {}
+    return sorted(
+        day for day in set(stored) | set(rebuilt)
+        if not _same(stored.get(day, empty), rebuilt.get(day, empty))
+    )
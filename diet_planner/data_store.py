@@ -1,15 +1,21 @@
 import datetime
 
+from diet_planner import daily_totals
+from diet_planner.storage import MemoryBackend, today_key
+
 class UserManager:
-    def __init__(self):
-        # Structure: { username: { 'password': str, 'profile': dict, 'diet_log': [], 'fitness_log': [], 'water': 0, 'settings': {} } }
-        self.users = {}
-        self.current_user = None # Simple session tracking for single-process demo availability
+    def __init__(self, backend=None):
+        # Records live in a pluggable backend (in-memory dict by default, see storage.py)
+        # Structure: { username: { 'password': str, 'profile': dict, 'diet_log': [], 'fitness_log': [], 'water_log': {}, 'settings': {} } }
+        # Logged-in identity lives in the signed Flask session, see auth/decorators.py
+        self.backend = backend if backend is not None else MemoryBackend()
+
+    def use_backend(self, backend):
+        """Switch to a different storage backend"""
+        self.backend = backend
 
     def create_user(self, username, password):
-        if username in self.users:
-            return False
-        self.users[username] = {
+        return self.backend.create_user(username, {
             'password': password,
             'profile': {},
             'diet_log': [],
@@ -29,43 +35,158 @@ class UserManager:
                 'meal_distribution': {'breakfast': 0.25, 'lunch': 0.35, 'dinner': 0.35, 'snacks': 0.05}
             },
             'created_at': datetime.datetime.now()
-        }
-        return True
+        })
 
     def verify_user(self, username, password):
-        user = self.users.get(username)
-        if user and user['password'] == password:
-            self.current_user = username
-            return True
-        return False
+        user = self.backend.get_user(username, with_logs=False)
+        return bool(user and user['password'] == password)
 
-    def get_user_data(self, username=None):
-        target_user = username if username else self.current_user
-        return self.users.get(target_user)
+    def user_exists(self, username):
+        return self.backend.has_user(username)
 
-    def logout(self):
-        self.current_user = None
+    def get_user_data(self, username, with_logs=True):
+        # with_logs=False lets the backend skip loading the full history
+        return self.backend.get_user(username, with_logs)
 
     # --- Profile Helpers ---
     def update_profile(self, username, profile_data):
-        if username in self.users:
-            self.users[username]['profile'] = profile_data
-            return True
-        return False
+        return self.backend.set_field(username, 'profile', profile_data)
     
     def update_diet_preferences(self, username, preferences):
         """Update diet customization preferences for user"""
-        if username in self.users:
-            self.users[username]['diet_preferences'].update(preferences)
-            return True
-        return False
+        return self.backend.merge_field(username, 'diet_preferences', preferences)
     
-    def get_diet_preferences(self, username=None):
+    def get_diet_preferences(self, username):
         """Get diet preferences for user"""
-        target_user = username if username else self.current_user
-        if target_user in self.users:
-            return self.users[target_user]['diet_preferences']
+        user = self.backend.get_user(username, with_logs=False)
+        if user:
+            return user['diet_preferences']
         return None
 
+    # --- Log Helpers ---
+    def add_log_entry(self, username, log_name, entry):
+        """Append an entry to diet_log / fitness_log"""
+        self.backend.append_log(username, log_name, entry)
+
+    def update_log_entry(self, username, log_name, entry_id, changes):
+        """Update a log entry in place by id"""
+        return self.backend.update_log(username, log_name, entry_id, changes)
+
+    def update_log_entries(self, username, log_name, changes_by_id):
+        """Update many entries by id in one batch; returns the number updated"""
+        return self.backend.update_logs(username, log_name, changes_by_id)
+
+    def delete_log_entry(self, username, log_name, entry_id):
+        """Remove a log entry by id"""
+        return self.backend.delete_log(username, log_name, entry_id)
+
+    def clear_log(self, username, log_name):
+        """Remove every entry from a log"""
+        self.backend.clear_log(username, log_name)
+
+    def get_log_entry(self, username, log_name, entry_id):
+        """A single log entry by id, or None"""
+        return self.backend.get_log_entry(username, log_name, entry_id)
+
+    def get_log_range(self, username, log_name, start=None, end=None):
+        """Entries dated within [start, end] (ISO dates, inclusive)"""
+        return self.backend.get_log_range(username, log_name, start, end)
+
+    def get_day_log(self, username, log_name, day=None):
+        """Entries for a single day (default today)"""
+        day = day or today_key()
+        return self.backend.get_log_range(username, log_name, day, day)
+
+    def compact_logs(self, username=None, keep_days=90):
+        """
+        Fold old days into one summary entry per log and day
+
+        Args:
+            username: User to compact (default every user)
+            keep_days: Days of full detail to keep, counting back from today
+
+        Returns:
+            Number of log entries removed
+        """
+        before = (datetime.date.today() - datetime.timedelta(days=keep_days)).isoformat()
+        usernames = [username] if username else self.backend.usernames()
+        return sum(self.backend.compact_logs(name, before) for name in usernames)
+
+    def get_counter(self, username, counter_name, day):
+        """Read water_log / step_log for a day"""
+        return self.backend.get_counter(username, counter_name, day)
+
+    def set_counter(self, username, counter_name, day, value):
+        """Overwrite water_log / step_log for a day"""
+        self.backend.set_counter(username, counter_name, day, value)
+
+    def increment_counter(self, username, counter_name, day, amount=1):
+        """Add to water_log / step_log for a day and return the new value"""
+        return self.backend.increment_counter(username, counter_name, day, amount)
+
+    def get_counter_range(self, username, counter_name, start=None, end=None):
+        """{day: value} of water_log / step_log within [start, end]"""
+        return self.backend.get_counter_range(username, counter_name, start, end)
+
+    def get_history(self, username, start, end):
+        """
+        One row per day from start to end (inclusive) for reports
+
+        Built from daily totals and counters via range queries, so a
+        week or month is served without loading the user's full logs.
+
+        Returns:
+            List of {date, calories, protein, carbs, fats, burned, water, steps}
+        """
+        totals = self.backend.get_totals_range(username, start, end)
+        water = self.backend.get_counter_range(username, 'water_log', start, end)
+        steps = self.backend.get_counter_range(username, 'step_log', start, end)
+        first = datetime.date.fromisoformat(start)
+        count = (datetime.date.fromisoformat(end) - first).days + 1
+        days = [(first + datetime.timedelta(days=n)).isoformat() for n in range(max(count, 0))]
+        return [
+            {'date': day, **daily_totals.rounded(totals.get(day)), 'water': water.get(day, 0), 'steps': steps.get(day, 0)}
+            for day in days
+        ]
+
+    # --- Daily Totals ---
+    def get_daily_totals(self, username, day=None):
+        """
+        Running calorie, macro and burned totals for one day
+
+        Read from the aggregates the backend maintains on every log write,
+        so the cost does not grow with the length of the user's history.
+
+        Args:
+            username: User to read
+            day: ISO date (default today)
+        """
+        return daily_totals.rounded(self.backend.get_daily_totals(username, day or today_key()))
+
+    def check_daily_totals(self, username=None, repair=True):
+        """
+        Verify running totals against the raw logs
+
+        Args:
+            username: User to check (default every user)
+            repair: Replace mismatched totals with the rebuilt values
+
+        Returns:
+            {username: [days that disagreed]} for users with mismatches
+        """
+        usernames = [username] if username else self.backend.usernames()
+        mismatches = {}
+        for name in usernames:
+            record = self.backend.get_user(name)
+            if record is None:
+                continue
+            rebuilt = daily_totals.rebuild(record)
+            days = daily_totals.mismatched_days(self.backend.get_totals_range(name), rebuilt)
+            if days:
+                mismatches[name] = days
+                if repair:
+                    self.backend.replace_daily_totals(name, rebuilt)
+        return mismatches
+
 # Global Instance
 user_manager = UserManager()
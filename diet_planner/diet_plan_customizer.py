@@ -3,8 +3,17 @@ Advanced Diet Plan Customization Module
 Allows users to customize macros, meal preferences, and dietary restrictions
 """
 
-from diet_planner.food_data import food_database
+from diet_planner.food_catalog import CalorieIndex
+from diet_planner.food_data import food_catalog
+from diet_planner.food_tags import forbidden_mask
+from diet_planner.meal_composer import meal_composer
+from diet_planner.plan_store import custom_plan, hydrate_plan
+from collections import OrderedDict
+from itertools import islice
+import copy
+import hashlib
 import random
+import threading
 
 class DietPlanCustomizer:
     """Customizable diet plan generator"""
@@ -18,6 +27,13 @@ class DietPlanCustomizer:
         "high_carb": {"carbs": 0.60, "protein": 0.25, "fats": 0.15},
     }
     
+    DEFAULT_MEAL_DISTRIBUTION = {
+        "breakfast": 0.25,
+        "lunch": 0.35,
+        "dinner": 0.35,
+        "snacks": 0.05
+    }
+    
     def __init__(self):
         self.user_preferences = {
             "macro_preset": "balanced",
@@ -29,6 +45,18 @@ class DietPlanCustomizer:
             "meal_count": 4  # breakfast, lunch, dinner, snacks
         }
     
+    @classmethod
+    def from_preferences(cls, preferences):
+        """Build a customizer from a user's stored diet_preferences"""
+        customizer = cls()
+        customizer.user_preferences["macro_preset"] = preferences.get("macro_preset", "balanced")
+        customizer.user_preferences["custom_macros"] = preferences.get("custom_macros")
+        customizer.user_preferences["dietary_restrictions"] = list(preferences.get("dietary_restrictions", []))
+        customizer.user_preferences["food_allergies"] = list(preferences.get("food_allergies", []))
+        customizer.user_preferences["cuisines"] = list(preferences.get("preferred_cuisines", []))
+        customizer.user_preferences["exclude_foods"] = list(preferences.get("exclude_foods", []))
+        return customizer
+    
     def set_macro_preset(self, preset_name):
         """Set macro split using a preset"""
         if preset_name in self.MACRO_PRESETS:
@@ -79,101 +107,253 @@ class DietPlanCustomizer:
             self.user_preferences["exclude_foods"].append(food_name)
         return True
     
+    def _get_filtered_ids(self):
+        """Get catalog row ids of foods that match user preferences"""
+        prefs = self.user_preferences
+        # Cuisines, restrictions and allergies are one vectorized catalog query;
+        # restrictions/allergies reduce to a tag mask checked with a bitwise AND
+        forbidden = forbidden_mask(prefs["dietary_restrictions"], prefs["food_allergies"])
+        candidate_ids = food_catalog.where(categories=prefs["cuisines"], exclude_tags=forbidden)
+        
+        exclude_foods = set(prefs["exclude_foods"])
+        if not exclude_foods:
+            return candidate_ids
+        names = food_catalog.names
+        return [food_id for food_id in candidate_ids if names[food_id] not in exclude_foods]
+    
+    def _signature(self):
+        """Canonical hash of the preferences that decide the candidate foods"""
+        prefs = self.user_preferences
+        canonical = repr((
+            sorted(set(prefs["cuisines"])),
+            sorted(set(prefs["dietary_restrictions"])),
+            sorted(set(prefs["food_allergies"])),
+            sorted(set(prefs["exclude_foods"])),
+        ))
+        return hashlib.blake2b(canonical.encode(), digest_size=16).hexdigest()
+    
     def _get_filtered_foods(self):
         """Get foods that match user preferences"""
-        filtered = []
-        
-        for food in food_database:
-            # Check category/cuisine preference
-            if food.get('category') not in self.user_preferences["cuisines"]:
-                continue
-            
-            # Check exclusions
-            if food['name'] in self.user_preferences["exclude_foods"]:
-                continue
-            
-            # Check dietary restrictions
-            if self.user_preferences["dietary_restrictions"]:
-                if "vegetarian" in self.user_preferences["dietary_restrictions"]:
-                    if food.get('category') == "Protein" and "paneer" not in food['name'].lower() and "chicken" in food['name'].lower():
-                        continue
-                if "vegan" in self.user_preferences["dietary_restrictions"]:
-                    if food.get('category') in ["Protein", "Dairy"] and "plant" not in food['name'].lower():
-                        continue
-            
-            filtered.append(food)
-        
-        return filtered
+        return food_catalog.rows(self._get_filtered_ids())
     
-    def _find_best_food(self, calories_target, filtered_foods, exclude_list=None):
-        """Find food closest to calorie target"""
-        if exclude_list is None:
-            exclude_list = []
-        
-        candidates = [f for f in filtered_foods if f['name'] not in exclude_list]
-        if not candidates:
-            return None
-        
-        best = min(candidates, key=lambda x: abs(x['calories'] - calories_target))
-        return best
+    def _find_best_food(self, calories_target, calorie_index, exclude_ids=None):
+        """Find catalog row id closest to calorie target"""
+        best = calorie_index.nearest(calories_target, skip=exclude_ids)
+        return best[0] if best else None
     
-    def generate_plan(self, daily_calories, meal_distribution=None):
+    def generate_plan(self, daily_calories, meal_distribution=None, compact=False):
         """
         Generate customized diet plan
         
         Args:
             daily_calories: Target daily calories
             meal_distribution: Dict with meal percentages {breakfast: 0.25, ...}
+            compact: Return the stored form, with meals as catalog row id
+                references (see plan_store.py), instead of food dicts
         
         Returns:
             dict with meal plan and macro info
         """
         if meal_distribution is None:
-            meal_distribution = {
-                "breakfast": 0.25,
-                "lunch": 0.35,
-                "dinner": 0.35,
-                "snacks": 0.05
-            }
+            meal_distribution = self.DEFAULT_MEAL_DISTRIBUTION
         
-        # Get macro split
+        # Filtered foods, sorted by calories, shared by users with the same preferences
+        calorie_index = filtered_food_cache.get(self)
+        plan = self._build_plan(daily_calories, meal_distribution, calorie_index)
+        return plan if compact else hydrate_plan(plan)
+    
+    def _macro_split(self):
+        """Active macro split as fractions"""
         if self.user_preferences["custom_macros"]:
-            macros = self.user_preferences["custom_macros"]
-        else:
-            macros = self.MACRO_PRESETS[self.user_preferences["macro_preset"]]
-        
-        # Calculate macro targets
-        macro_targets = {
+            return self.user_preferences["custom_macros"]
+        return self.MACRO_PRESETS[self.user_preferences["macro_preset"]]
+    
+    @staticmethod
+    def _macro_targets(daily_calories, macros):
+        """Daily gram targets for a macro split"""
+        return {
             "carbs": int((daily_calories * macros["carbs"]) / 4),
             "protein": int((daily_calories * macros["protein"]) / 4),
             "fats": int((daily_calories * macros["fats"]) / 9)
         }
-        
-        # Get filtered foods
-        filtered_foods = self._get_filtered_foods()
+    
+    def _build_plan(self, daily_calories, meal_distribution, calorie_index):
+        """Compose a compact plan from an already filtered calorie index"""
+        macros = self._macro_split()
         
         # Generate meals
-        plan = {
-            "meals": {},
-            "total_calories": 0,
-            "macros": macro_targets,
-            "macro_split": {k: f"{int(v*100)}%" for k, v in macros.items()}
-        }
-        
-        used_foods = []
+        meals = {}
+        total_calories = 0
+        used_foods = set()
         
         for meal_name, meal_pct in meal_distribution.items():
             meal_calories = int(daily_calories * meal_pct)
-            food = self._find_best_food(meal_calories, filtered_foods, used_foods)
             
-            if food:
-                plan["meals"][meal_name] = food
-                plan["total_calories"] += food['calories']
-                used_foods.append(food['name'])
+            # Compose the meal from several foods to hit its share of the macros
+            meal_target = meal_composer.targets_from_split(meal_calories, macros)
+            solution = meal_composer.solve(meal_target, calorie_index, exclude=used_foods)
+            
+            if solution:
+                meal = {"items": [[food_id, servings] for food_id, servings in solution["items"]]}
+                used_foods.update(food_id for food_id, _ in solution["items"])
+                total_calories += solution["calories"]
             else:
-                plan["meals"][meal_name] = None
+                # Fall back to the single closest food
+                food_id = self._find_best_food(meal_calories, calorie_index, used_foods)
+                meal = {"food": food_id} if food_id is not None else None
+                if food_id is not None:
+                    used_foods.add(food_id)
+                    total_calories += food_catalog.row(food_id)["calories"]
+            
+            meals[meal_name] = meal
         
-        return plan
+        return custom_plan(
+            meals,
+            total_calories=total_calories,
+            macros=self._macro_targets(daily_calories, macros),
+            macro_split={k: f"{int(v*100)}%" for k, v in macros.items()}
+        )
+    
+    def generate_week_plan(self, daily_calories, days=7, meal_distribution=None, repeat_window=2):
+        """
+        Generate a multi-day plan with variety constraints
+        
+        A food used on one day is kept out of the next `repeat_window` days,
+        and each meal's main food rotates to a different category than the
+        day before (both relaxed, in that order, if the foods run out).
+        Candidate pools are built once per meal target and shared by every
+        day; a meal solved on an earlier day is reused as-is whenever it
+        still satisfies the constraints, so a week needs only a few solves.
+        
+        Args:
+            daily_calories: Target calories, one value for every day or a
+                list with one value per day
+            days: Number of days (ignored when daily_calories is a list)
+            meal_distribution: Dict with meal percentages {breakfast: 0.25, ...}
+            repeat_window: Days before a food may appear again
+        
+        Returns:
+            Compact plan: meals list [food_id, servings] pairs (catalog row
+            ids) rather than food dicts
+        """
+        if meal_distribution is None:
+            meal_distribution = self.DEFAULT_MEAL_DISTRIBUTION
+        if isinstance(daily_calories, (list, tuple)):
+            day_targets = list(daily_calories)
+        else:
+            day_targets = [daily_calories] * days
+        
+        calorie_index = filtered_food_cache.get(self)
+        macros = self._macro_split()
+        codes = food_catalog.category_codes
+        
+        pools = {}        # meal calories -> ranked candidate ids
+        solutions = {}    # meal calories -> meals solved so far
+        recent = []       # food ids of the last repeat_window days
+        last_category = {}  # meal name -> main food category code yesterday
+        stats = {"solved": 0, "reused": 0}
+        week = []
+        
+        for day, calories in enumerate(day_targets, 1):
+            blocked = set().union(*recent)
+            used_today = set()
+            day_plan = {
+                "day": day,
+                "calories": int(calories),
+                "macros": self._macro_targets(calories, macros),
+                "meals": {},
+                "totals": {"calories": 0, "protein": 0, "carbs": 0, "fats": 0},
+            }
+            
+            for meal_name, meal_pct in meal_distribution.items():
+                meal_calories = int(calories * meal_pct)
+                rotate_from = last_category.get(meal_name)
+                solution = self._reuse_meal(solutions.get(meal_calories, ()), blocked | used_today, rotate_from)
+                if solution is not None:
+                    stats["reused"] += 1
+                else:
+                    target = meal_composer.targets_from_split(meal_calories, macros)
+                    if meal_calories not in pools:
+                        pools[meal_calories] = meal_composer.candidates(
+                            target, calorie_index, size=meal_composer.pool_size * 4
+                        )
+                    solution = self._solve_week_meal(
+                        target, pools[meal_calories], calorie_index, blocked, used_today, rotate_from
+                    )
+                    if solution is not None:
+                        stats["solved"] += 1
+                        solutions.setdefault(meal_calories, []).append(solution)
+                
+                if solution is None:
+                    day_plan["meals"][meal_name] = None
+                    continue
+                
+                items = [[food_id, servings] for food_id, servings in solution["items"]]
+                day_plan["meals"][meal_name] = {"items": items, "calories": solution["calories"]}
+                for nutrient in day_plan["totals"]:
+                    day_plan["totals"][nutrient] += solution[nutrient]
+                used_today.update(food_id for food_id, _ in items)
+                last_category[meal_name] = codes[self._main_food(solution)]
+            
+            day_plan["totals"] = {k: round(v, 1) for k, v in day_plan["totals"].items()}
+            week.append(day_plan)
+            recent = (recent + [used_today])[-repeat_window:] if repeat_window > 0 else []
+        
+        return {
+            "days": week,
+            "macro_split": {k: f"{int(v*100)}%" for k, v in macros.items()},
+            "repeat_window": repeat_window,
+            "catalog_version": food_catalog.version,
+            "stats": stats,
+        }
+    
+    @staticmethod
+    def _main_food(solution):
+        """Row id contributing the most calories to a solved meal"""
+        return max(solution["items"], key=lambda item: food_catalog.calories[item[0]] * item[1])[0]
+    
+    def _reuse_meal(self, solved, blocked, rotate_from):
+        """An earlier solution for the same target that still fits today, or None"""
+        for solution in solved:
+            if any(food_id in blocked for food_id, _ in solution["items"]):
+                continue
+            if rotate_from is not None and food_catalog.category_codes[self._main_food(solution)] == rotate_from:
+                continue
+            return solution
+        return None
+    
+    def _solve_week_meal(self, target, pool, calorie_index, blocked, used_today, rotate_from):
+        """Solve one meal, relaxing rotation and then the repeat window if needed"""
+        codes = food_catalog.category_codes
+        attempts = (
+            (blocked | used_today, rotate_from),
+            (blocked | used_today, None),
+            (used_today, None),
+        )
+        for avoid, rotate in attempts:
+            candidates = [
+                food_id for food_id in pool
+                if food_id not in avoid and (rotate is None or codes[food_id] != rotate)
+            ]
+            if candidates:
+                solution = meal_composer.solve(target, pool=candidates)
+                if solution is not None:
+                    return solution
+        
+        # Shared pool exhausted: search the whole filtered index
+        solution = meal_composer.solve(target, calorie_index, exclude=used_today)
+        if solution is None:
+            food_id = self._find_best_food(target["calories"], calorie_index, used_today)
+            if food_id is not None:
+                food = food_catalog.row(food_id)
+                solution = {
+                    "items": [(food_id, 1.0)],
+                    "calories": food["calories"],
+                    "protein": food["p"],
+                    "carbs": food["c"],
+                    "fats": food["f"],
+                }
+        return solution
     
     def get_preferences(self):
         """Get current user preferences"""
@@ -187,5 +367,137 @@ class DietPlanCustomizer:
         return True
 
 
+class FilteredFoodCache:
+    """
+    Bounded LRU cache of filtered candidate views
+    
+    Maps a customizer's preference signature to a CalorieIndex over the
+    matching foods. The whole cache is dropped when the catalog version
+    changes, since any cached view may then be stale; a view whose build
+    raced a catalog change is returned but not cached.
+    """
+    
+    def __init__(self, catalog, maxsize=256):
+        self.catalog = catalog
+        self.maxsize = maxsize
+        self._views = OrderedDict()
+        self._version = catalog.version
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+    
+    def get(self, customizer):
+        """Calorie index of the foods matching the customizer's preferences"""
+        key = customizer._signature()
+        with self._lock:
+            if self._version != self.catalog.version:
+                self._views.clear()
+                self._version = self.catalog.version
+                self.invalidations += 1
+            view = self._views.get(key)
+            if view is not None:
+                self._views.move_to_end(key)
+                self.hits += 1
+                return view
+            self.misses += 1
+            version = self._version
+        
+        # Build outside the lock; a concurrent miss just builds the same view
+        view = CalorieIndex(self.catalog, customizer._get_filtered_ids())
+        with self._lock:
+            # Built from an older catalog: use it this once, but don't cache it
+            if self._version != version or self.catalog.version != version:
+                return view
+            self._views[key] = view
+            self._views.move_to_end(key)
+            while len(self._views) > self.maxsize:
+                self._views.popitem(last=False)
+                self.evictions += 1
+        return view
+    
+    def clear(self):
+        """Drop every cached view"""
+        with self._lock:
+            self._views.clear()
+    
+    def stats(self):
+        """Hit/miss/eviction counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._views),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+def generate_plans_batch(profiles, calorie_step=1, compact=False, chunk_size=1000, max_solved=4096):
+    """
+    Generate plans for a whole cohort of users
+    
+    The input is read in chunks of `chunk_size` profiles, and each chunk's
+    plans are yielded before the next chunk is read, so memory and the time
+    to the first plan do not grow with the cohort. Within a chunk, users are
+    grouped by the preference signature FilteredFoodCache uses, so each
+    group's filtered, calorie-sorted view is fetched once (and stays cached
+    for later chunks). Users with the same signature, calories, macro split
+    and meal distribution share one set of meal solves; the last
+    `max_solved` solves are kept across chunks.
+    
+    Args:
+        profiles: Iterable of dicts {user_id, tdee, preferences}, where
+            preferences has the stored diet_preferences shape
+        calorie_step: Round daily calories to this step so near-identical
+            targets share a solve (1 = exact)
+        compact: Yield stored-form plans (food id references) instead of
+            food dicts
+        chunk_size: Profiles read per chunk
+        max_solved: Solved plans kept for reuse by later chunks
+    
+    Yields:
+        (user_id, plan) pairs in input chunk order, grouped by signature
+        within each chunk
+    """
+    profiles = iter(profiles)
+    solved = OrderedDict()
+    while True:
+        chunk = list(islice(profiles, max(1, chunk_size)))
+        if not chunk:
+            return
+        
+        groups = {}
+        for profile in chunk:
+            customizer = DietPlanCustomizer.from_preferences(profile["preferences"])
+            groups.setdefault(customizer._signature(), []).append((profile, customizer))
+        
+        for signature, members in groups.items():
+            calorie_index = filtered_food_cache.get(members[0][1])
+            
+            for profile, customizer in members:
+                preferences = profile["preferences"]
+                calories = int(round(profile["tdee"] / calorie_step) * calorie_step)
+                distribution = preferences.get("meal_distribution") or DietPlanCustomizer.DEFAULT_MEAL_DISTRIBUTION
+                
+                key = (signature, calories, tuple(sorted(customizer._macro_split().items())),
+                       tuple(distribution.items()))
+                plan = solved.get(key)
+                if plan is None:
+                    plan = solved[key] = customizer._build_plan(calories, distribution, calorie_index)
+                    if len(solved) > max_solved:
+                        solved.popitem(last=False)
+                else:
+                    solved.move_to_end(key)
+                yield profile.get("user_id"), copy.deepcopy(plan) if compact else hydrate_plan(plan)
+
+
 # Global customizer instance (can be extended to per-user)
 plan_customizer = DietPlanCustomizer()
+
+# Shared cache of filtered food views
+filtered_food_cache = FilteredFoodCache(food_catalog)
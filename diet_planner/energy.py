@@ -0,0 +1,248 @@
+"""
+Energy Calculation
+BMR/TDEE formulas, macro targets and bulk recomputation of stored profiles
+"""
+
+from array import array
+from itertools import repeat
+import operator
+
+# Multiplier on BMR for each activity level
+ACTIVITY_MULTIPLIERS = {
+    "sedentary": 1.2,
+    "light": 1.375,
+    "moderate": 1.55,
+    "active": 1.725,
+    "very_active": 1.9
+}
+
+# Daily calorie adjustment for each goal
+GOAL_ADJUSTMENTS = {
+    "loss": -500,
+    "maintain": 0,
+    "gain": 500,
+}
+
+# Profile macro targets (Simple Split: 50% C, 30% P, 20% F)
+MACRO_SPLIT = {"carbs": 0.50, "protein": 0.30, "fats": 0.20}
+KCAL_PER_GRAM = {"carbs": 4, "protein": 4, "fats": 9}
+
+# Linear BMR formulas: gender -> (per kg, per cm, per year of age, constant).
+# "male" selects the male coefficients; any other value the female ones.
+FORMULAS = {
+    # Mifflin-St Jeor (1990)
+    "mifflin": {
+        "male": (10, 6.25, -5, 5),
+        "female": (10, 6.25, -5, -161),
+    },
+    # Harris-Benedict, revised by Roza and Shizgal (1984)
+    "harris_benedict": {
+        "male": (13.397, 4.799, -5.677, 88.362),
+        "female": (9.247, 3.098, -4.330, 447.593),
+    },
+}
+
+# Katch-McArdle: 370 + 21.6 * lean body mass (kg); needs body_fat (%)
+KATCH_MCARDLE = "katch_mcardle"
+KATCH_BASE = 370
+KATCH_PER_LEAN_KG = 21.6
+
+
+def register_formula(name, male, female):
+    """Add a linear BMR formula as (per kg, per cm, per year, constant) per gender"""
+    FORMULAS[name] = {"male": tuple(male), "female": tuple(female)}
+
+
+def has_metrics(profile):
+    """Whether a profile has the inputs every formula needs"""
+    return bool(profile) and all(profile.get(field) not in (None, "") for field in ("age", "height", "weight"))
+
+
+def _column(profiles, field, default=0.0):
+    return array('d', (float(p.get(field) or default) for p in profiles))
+
+
+def _add(*columns):
+    total = columns[0]
+    for column in columns[1:]:
+        total = map(operator.add, total, column)
+    return array('d', total)
+
+
+def _mul(left, right):
+    return map(operator.mul, left, right)
+
+
+class EnergyCalculator:
+    """
+    BMR, TDEE and macro targets for one or many profiles
+
+    Every profile is computed through the same columnar path: inputs are
+    gathered into array('d') columns, per-row coefficients are picked by
+    gender (and body fat for Katch-McArdle), and BMR, TDEE and macros are
+    element-wise map() passes over those columns. One profile is simply a
+    table of one row, so single and bulk results always agree.
+
+    The app computes every profile with the shared `energy_calculator`;
+    change its settings with configure() so new profiles and
+    recompute_profiles() always use the same formula.
+    """
+
+    def __init__(self, formula="mifflin", activity_multipliers=None, goal_adjustments=None, macro_split=None):
+        self.formula = "mifflin"
+        self.activity_multipliers = dict(ACTIVITY_MULTIPLIERS)
+        self.goal_adjustments = dict(GOAL_ADJUSTMENTS)
+        self.macro_split = dict(MACRO_SPLIT)
+        self.configure(formula, activity_multipliers, goal_adjustments, macro_split)
+
+    def configure(self, formula=None, activity_multipliers=None, goal_adjustments=None, macro_split=None):
+        """
+        Change the formula or tables; arguments left as None keep their value
+
+        Raises:
+            ValueError: If the formula is not registered
+        """
+        if formula is not None:
+            if formula != KATCH_MCARDLE and formula not in FORMULAS:
+                raise ValueError(f"Unknown BMR formula: {formula}")
+            self.formula = formula
+        if activity_multipliers is not None:
+            self.activity_multipliers = dict(activity_multipliers)
+        if goal_adjustments is not None:
+            self.goal_adjustments = dict(goal_adjustments)
+        if macro_split is not None:
+            self.macro_split = dict(macro_split)
+
+    def _coefficients(self, profiles):
+        """Per-row (kg, cm, year, constant) coefficient columns"""
+        rows = []
+        for profile in profiles:
+            gender = "male" if profile.get("gender") == "male" else "female"
+            body_fat = profile.get("body_fat")
+            if self.formula == KATCH_MCARDLE and body_fat not in (None, ""):
+                lean_share = 1 - float(body_fat) / 100
+                rows.append((KATCH_PER_LEAN_KG * lean_share, 0.0, 0.0, KATCH_BASE))
+            else:
+                # Katch-McArdle without a body fat reading falls back to Mifflin
+                formula = self.formula if self.formula in FORMULAS else "mifflin"
+                rows.append(FORMULAS[formula][gender])
+        return [array('d', column) for column in zip(*rows)] if rows else [array('d')] * 4
+
+    def bulk(self, profiles, rounded=True):
+        """
+        Energy values for many profiles in one pass
+
+        Args:
+            profiles: Profile dicts with age, gender, height, weight,
+                activity, goal and optionally body_fat
+            rounded: Truncate bmr and tdee to ints as profiles store them;
+                pass False to get the floats plans are generated from
+
+        Returns:
+            List of {"bmr", "tdee", "macros"} in input order
+        """
+        profiles = list(profiles)
+        per_kg, per_cm, per_year, constant = self._coefficients(profiles)
+        bmr = _add(
+            _mul(_column(profiles, "weight"), per_kg),
+            _mul(_column(profiles, "height"), per_cm),
+            _mul(_column(profiles, "age"), per_year),
+            constant,
+        )
+
+        multipliers = array('d', (self.activity_multipliers.get(p.get("activity"), 1.2) for p in profiles))
+        adjustments = array('d', (self.goal_adjustments.get(p.get("goal"), 0) for p in profiles))
+        tdee = _add(_mul(bmr, multipliers), adjustments)
+
+        macros = {
+            name: map(int, map(operator.truediv, map(operator.mul, tdee, repeat(share)), repeat(KCAL_PER_GRAM[name])))
+            for name, share in self.macro_split.items()
+        }
+        macro_rows = zip(*macros.values())
+        if rounded:
+            bmr, tdee = map(int, bmr), map(int, tdee)
+        return [
+            {"bmr": b, "tdee": t, "macros": dict(zip(macros, grams))}
+            for b, t, grams in zip(bmr, tdee, macro_rows)
+        ]
+
+    def compute(self, profile, rounded=True):
+        """Energy values for a single profile (see bulk)"""
+        return self.bulk([profile], rounded)[0]
+
+    def maintenance(self, profile):
+        """
+        Calories that hold a stored profile's weight
+
+        BMR times the activity multiplier, without the goal adjustment
+        that the stored tdee (the intake target) includes.
+        """
+        return (profile.get("bmr") or 0) * self.activity_multipliers.get(profile.get("activity"), 1.2)
+
+
+def _replan(manager, username, plan, tdee):
+    """A stored plan regenerated for a new calorie target, in the same layout"""
+    from diet_planner.diet_plan_customizer import DietPlanCustomizer
+    from diet_planner.plan_store import CUSTOM, compact_plan, daily_plan, is_compact
+
+    compact = plan if is_compact(plan) else compact_plan(plan)
+    if compact is None or compact["layout"] != CUSTOM:
+        return daily_plan(tdee)
+
+    prefs = manager.get_diet_preferences(username) or {}
+    customizer = DietPlanCustomizer.from_preferences(prefs)
+    # Keep the split the plan was generated with (stored as "50%" strings);
+    # the preset chosen on the customize page is not saved anywhere else
+    split = compact.get("macro_split")
+    if split:
+        customizer.user_preferences["custom_macros"] = {
+            name: int(str(share).rstrip("%")) / 100 for name, share in split.items()
+        }
+    distribution = prefs.get("meal_distribution") or DietPlanCustomizer.DEFAULT_MEAL_DISTRIBUTION
+    # The customize page plans from the stored (truncated) TDEE
+    return customizer.generate_plan(int(tdee), distribution, compact=True)
+
+
+def recompute_profiles(manager, usernames=None):
+    """
+    Recompute BMR, TDEE and macros for stored profiles
+
+    Run after energy_calculator.configure() changes the formula, multipliers
+    or macro split. Profiles are computed with that same shared calculator
+    the profile form uses, in one bulk pass; a profile whose TDEE changed
+    also gets its diet plan regenerated for the new target, since the
+    stored plan was sized for the old one.
+
+    Args:
+        manager: UserManager holding the profiles
+        usernames: Optional subset of users (default everyone)
+
+    Returns:
+        {"profiles": checked, "updated": changed, "replanned": plans rebuilt}
+    """
+    calculator = energy_calculator
+    if usernames is None:
+        usernames = manager.backend.usernames()
+
+    records = []
+    for username in usernames:
+        record = manager.get_user_data(username, with_logs=False)
+        profile = record.get("profile") if record else None
+        if has_metrics(profile):
+            records.append((username, profile))
+
+    updated = replanned = 0
+    for (username, profile), energy in zip(records, calculator.bulk((p for _, p in records), rounded=False)):
+        changed = {**profile, "bmr": int(energy["bmr"]), "tdee": int(energy["tdee"]), "macros": energy["macros"]}
+        if changed == profile:
+            continue
+        if changed["tdee"] != profile.get("tdee") and profile.get("diet_plan"):
+            changed["diet_plan"] = _replan(manager, username, profile["diet_plan"], energy["tdee"])
+            replanned += 1
+        manager.update_profile(username, changed)
+        updated += 1
+    return {"profiles": len(records), "updated": updated, "replanned": replanned}
+
+
+# Global instance
+energy_calculator = EnergyCalculator()
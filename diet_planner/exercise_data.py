@@ -0,0 +1,378 @@
+"""
+Exercise Data
+MET compendium with fuzzy activity lookup and batched calorie burn computation
+"""
+
+from array import array
+from collections import OrderedDict
+from itertools import repeat
+import difflib
+import operator
+import re
+import threading
+
+# Category fallbacks for activities not in the compendium. cardio, strength
+# and yoga are the values every entry was logged with before the compendium.
+CATEGORY_METS = {
+    "cardio": 8,
+    "strength": 5,
+    "yoga": 3,
+    "sports": 6,
+    "daily": 3.5,
+}
+DEFAULT_MET = 5
+DEFAULT_WEIGHT = 70
+
+# (name, category, MET, aliases), values from the 2011 Compendium of
+# Physical Activities. A plain name ("Cycling") is the general entry that
+# wins over its qualified variants ("Cycling, vigorous") on a bare query.
+COMPENDIUM = [
+    # Walking and running
+    ("Walking", "cardio", 3.5, ("walk", "walk moderate pace")),
+    ("Walking, leisurely", "cardio", 2.8, ("stroll", "slow walk")),
+    ("Walking, brisk", "cardio", 4.3, ("brisk walk", "fast walk")),
+    ("Power walking", "cardio", 5.0, ("power walk", "speed walking")),
+    ("Walking, uphill", "cardio", 6.0, ("incline walk", "incline walking")),
+    ("Walking the dog", "daily", 3.0, ("dog walk",)),
+    ("Hiking", "cardio", 6.0, ("hike", "trekking", "trek")),
+    ("Jogging", "cardio", 7.0, ("jog",)),
+    ("Running", "cardio", 9.8, ("run",)),
+    ("Running, slow", "cardio", 8.3, ("easy run", "slow run")),
+    ("Running, fast", "cardio", 11.5, ("fast run", "tempo run")),
+    ("Running, treadmill", "cardio", 9.0, ("treadmill",)),
+    ("Running, cross country", "cardio", 9.0, ("trail running", "trail run")),
+    ("Sprinting", "cardio", 15.0, ("sprints", "sprint")),
+    ("Marathon running", "cardio", 13.3, ("marathon",)),
+    # Cycling
+    ("Cycling", "cardio", 7.5, ("bike", "biking", "bicycling", "cycle", "bike ride")),
+    ("Cycling, leisurely", "cardio", 4.0, ("leisure cycling", "easy bike ride")),
+    ("Cycling, vigorous", "cardio", 10.0, ("fast cycling", "road cycling")),
+    ("Cycling, mountain bike", "cardio", 8.5, ("mountain biking", "mtb")),
+    ("Stationary cycling", "cardio", 7.0, ("stationary bike", "exercise bike")),
+    ("Spinning", "cardio", 8.5, ("spin class", "spin")),
+    # Swimming and water
+    ("Swimming", "cardio", 6.0, ("swim",)),
+    ("Swimming laps, freestyle", "cardio", 5.8, ("laps", "freestyle", "lap swimming")),
+    ("Swimming laps, vigorous", "cardio", 9.8, ("fast swimming",)),
+    ("Swimming, breaststroke", "cardio", 5.3, ("breaststroke",)),
+    ("Swimming, backstroke", "cardio", 4.8, ("backstroke",)),
+    ("Swimming, butterfly", "cardio", 13.8, ("butterfly",)),
+    ("Water aerobics", "cardio", 5.5, ("aqua aerobics", "aqua fitness")),
+    ("Kayaking", "sports", 5.0, ("canoeing", "paddling")),
+    ("Surfing", "sports", 3.0, ("surf",)),
+    # Gym cardio
+    ("Rowing machine", "cardio", 7.0, ("rowing", "rower", "erg", "ergometer")),
+    ("Rowing machine, vigorous", "cardio", 8.5, ("fast rowing",)),
+    ("Elliptical", "cardio", 5.0, ("elliptical trainer", "cross trainer")),
+    ("Stair climbing", "cardio", 8.8, ("stairs", "climbing stairs", "stair climb")),
+    ("Stair machine", "cardio", 9.0, ("stairmaster", "stepmill", "stair stepper")),
+    ("Jump rope", "cardio", 11.8, ("skipping", "skipping rope", "jumping rope")),
+    ("Aerobics", "cardio", 7.3, ("aerobic", "high impact aerobics")),
+    ("Aerobics, low impact", "cardio", 5.0, ("low impact aerobics",)),
+    ("Step aerobics", "cardio", 8.5, ("step class",)),
+    ("Zumba", "cardio", 6.5, ()),
+    ("Dancing", "cardio", 5.0, ("dance",)),
+    ("Dancing, vigorous", "cardio", 7.8, ("bhangra", "disco dancing")),
+    ("HIIT", "cardio", 8.0, ("high intensity interval training", "interval training", "tabata")),
+    ("Circuit training", "strength", 8.0, ("circuit", "crossfit", "bootcamp", "boot camp")),
+    ("Burpees", "cardio", 8.0, ("burpee",)),
+    ("Jumping jacks", "cardio", 8.0, ("star jumps",)),
+    ("Mountain climbers", "cardio", 8.0, ("mountain climber",)),
+    ("Kickboxing", "cardio", 7.3, ("cardio kickboxing",)),
+    ("Boxing, punching bag", "cardio", 5.5, ("punching bag", "heavy bag")),
+    ("Boxing, sparring", "sports", 7.8, ("boxing", "sparring")),
+    ("Roller skating", "cardio", 7.0, ("skating", "rollerblading", "inline skating")),
+    ("Ice skating", "sports", 7.0, ()),
+    ("Skiing, downhill", "sports", 5.3, ("skiing", "downhill skiing")),
+    ("Skiing, cross country", "cardio", 9.0, ("cross country skiing", "nordic skiing")),
+    # Strength
+    ("Strength training", "strength", 5.0, ("strength", "resistance training", "gym workout")),
+    ("Weight lifting", "strength", 3.5, ("weights", "weight training", "lifting", "dumbbells")),
+    ("Weight lifting, vigorous", "strength", 6.0, ("powerlifting", "bodybuilding", "heavy lifting", "deadlifts")),
+    ("Kettlebell training", "strength", 8.0, ("kettlebell", "kettlebells", "kettlebell swings")),
+    ("Bodyweight exercises", "strength", 3.8, ("calisthenics", "bodyweight")),
+    ("Calisthenics, vigorous", "strength", 8.0, ("vigorous calisthenics",)),
+    ("Push-ups", "strength", 3.8, ("pushups", "push ups", "press ups")),
+    ("Pull-ups", "strength", 3.8, ("pullups", "pull ups", "chin ups")),
+    ("Squats", "strength", 5.0, ("squat", "air squats")),
+    ("Lunges", "strength", 3.8, ("lunge",)),
+    ("Sit-ups", "strength", 3.8, ("situps", "sit ups", "crunches", "abs")),
+    ("Plank", "strength", 3.8, ("planks", "core workout", "core")),
+    ("Resistance bands", "strength", 3.5, ("band workout", "theraband")),
+    # Yoga and flexibility
+    ("Yoga", "yoga", 2.5, ("hatha yoga",)),
+    ("Yoga, power", "yoga", 4.0, ("power yoga", "vinyasa", "ashtanga")),
+    ("Hot yoga", "yoga", 3.0, ("bikram", "bikram yoga")),
+    ("Surya namaskar", "yoga", 3.3, ("sun salutation", "sun salutations")),
+    ("Pranayama", "yoga", 1.3, ("breathing exercises",)),
+    ("Meditation", "yoga", 1.0, ("meditating",)),
+    ("Stretching", "yoga", 2.3, ("stretch", "mobility", "flexibility")),
+    ("Pilates", "yoga", 3.0, ()),
+    ("Tai chi", "yoga", 3.0, ("qigong",)),
+    # Sports
+    ("Cricket", "sports", 4.8, ("batting", "bowling practice")),
+    ("Football", "sports", 7.0, ("soccer", "futsal")),
+    ("Football, competitive", "sports", 10.0, ("soccer match", "football match")),
+    ("Basketball", "sports", 6.5, ("hoops",)),
+    ("Basketball, game", "sports", 8.0, ("basketball match",)),
+    ("Badminton", "sports", 5.5, ()),
+    ("Tennis", "sports", 7.3, ()),
+    ("Tennis, singles", "sports", 8.0, ()),
+    ("Tennis, doubles", "sports", 6.0, ()),
+    ("Table tennis", "sports", 4.0, ("ping pong", "ping-pong")),
+    ("Squash", "sports", 7.3, ()),
+    ("Volleyball", "sports", 4.0, ()),
+    ("Volleyball, beach", "sports", 8.0, ("beach volleyball",)),
+    ("Hockey", "sports", 7.8, ("field hockey",)),
+    ("Ice hockey", "sports", 8.0, ()),
+    ("Rugby", "sports", 8.3, ()),
+    ("Handball", "sports", 12.0, ()),
+    ("Baseball", "sports", 5.0, ("softball",)),
+    ("Golf", "sports", 4.8, ("golfing",)),
+    ("Frisbee", "sports", 3.0, ("ultimate frisbee",)),
+    ("Martial arts", "sports", 10.3, ("karate", "taekwondo", "judo", "kung fu", "mma")),
+    ("Rock climbing", "sports", 8.0, ("climbing", "bouldering")),
+    ("Skateboarding", "sports", 5.0, ()),
+    ("Horse riding", "sports", 5.5, ("horseback riding", "equestrian")),
+    # Daily activities
+    ("Gardening", "daily", 3.8, ("weeding", "planting")),
+    ("Mowing the lawn", "daily", 5.5, ("mowing", "lawn mowing")),
+    ("House cleaning", "daily", 3.3, ("cleaning", "housework", "chores")),
+    ("Mopping", "daily", 3.5, ("mopping floors",)),
+    ("Vacuuming", "daily", 3.3, ("hoovering",)),
+    ("Cooking", "daily", 2.0, ("cooking food",)),
+    ("Carrying groceries", "daily", 2.5, ("grocery shopping", "shopping")),
+    ("Playing with children", "daily", 4.0, ("playing with kids", "kids")),
+    ("Moving furniture", "daily", 5.8, ("moving house",)),
+    ("Shoveling snow", "daily", 5.3, ("snow shoveling",)),
+]
+
+# Words that describe a session rather than the activity
+_STOP_WORDS = frozenset((
+    "a", "an", "the", "and", "of", "my", "in", "at", "on", "for", "with",
+    "morning", "evening", "afternoon", "night", "daily", "session", "sessions",
+    "workout", "exercise", "min", "mins", "minute", "minutes", "hr", "hrs", "hour", "hours",
+))
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize_activity(name):
+    """Lowercase words of an activity name joined by single spaces"""
+    return " ".join(_WORD_RE.findall(str(name).lower()))
+
+
+def _stem(word):
+    """Crude suffix stripping so 'runs', 'running' and 'run' share a token"""
+    if len(word) > 5 and word.endswith("ing"):
+        word = word[:-3]
+        if len(word) > 2 and word[-1] == word[-2]:
+            word = word[:-1]
+    elif len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        word = word[:-1]
+    return word
+
+
+def _tokens(normalized):
+    # Stop words are checked before and after stemming ("morning" -> "morn")
+    words = (word for word in normalized.split() if word not in _STOP_WORDS)
+    return [word for word in map(_stem, words) if word not in _STOP_WORDS and not word.isdigit()]
+
+
+def burned(met, weight, minutes):
+    """Calories burned: MET x weight (kg) x time (hours)"""
+    return int(met * weight * (minutes / 60))
+
+
+def burn_column(mets, weight, minutes):
+    """
+    Calories burned for many sessions in one element-wise pass
+
+    Args:
+        mets: MET value per session
+        weight: Body weight in kg (one value for all sessions)
+        minutes: Duration per session
+
+    Returns:
+        array('l') of calories burned, equal to burned() row by row
+    """
+    hours = map(operator.truediv, minutes, repeat(60))
+    return array('l', map(int, map(operator.mul, map(operator.mul, mets, repeat(weight)), hours)))
+
+
+class ExerciseCatalog:
+    """
+    Indexed MET table
+
+    Names and aliases go into an exact-match dict and their stemmed words
+    into an inverted index, both built once. A lookup tries the exact
+    name, then scores names and aliases by shared words (misspelt words are
+    corrected against the index vocabulary with difflib), preferring the
+    logged category and the least qualified name. A word match counts only
+    if it covers at least half of the query's words and most of the
+    matched name's, so "bench press" does not become "press ups"; weaker
+    matches fall back to the category MET. Results are memoized in a
+    bounded LRU since users log the same few activities over and over.
+    """
+
+    def __init__(self, entries=COMPENDIUM, cache_size=4096):
+        self.names = []
+        self.categories = []
+        self.mets = array('d')
+        self._name_index = {}
+        self._token_index = {}           # word -> label ids
+        self._label_activity = array('H')  # label id -> activity id
+        self._label_sizes = array('B')     # label id -> distinct words
+        self._token_counts = array('B')
+        for name, category, met, aliases in entries:
+            activity_id = len(self.names)
+            self.names.append(name)
+            self.categories.append(category)
+            self.mets.append(met)
+            tokens = set(_tokens(normalize_activity(name)))
+            for label in (name, *aliases):
+                normalized = normalize_activity(label)
+                self._name_index.setdefault(normalized, activity_id)
+                label_tokens = set(_tokens(normalized))
+                label_id = len(self._label_activity)
+                self._label_activity.append(activity_id)
+                self._label_sizes.append(len(label_tokens))
+                for token in label_tokens:
+                    self._token_index.setdefault(token, set()).add(label_id)
+            self._token_counts.append(len(tokens))
+        self._vocabulary = sorted(self._token_index)
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.names)
+
+    def _correct(self, token):
+        """Closest indexed word for a misspelt one, or None"""
+        if token in self._token_index:
+            return token
+        matches = difflib.get_close_matches(token, self._vocabulary, n=1, cutoff=0.8)
+        return matches[0] if matches else None
+
+    def _match(self, normalized, category):
+        activity_id = self._name_index.get(normalized)
+        if activity_id is not None:
+            return activity_id
+
+        query = set(_tokens(normalized))
+        overlaps = {}
+        for token in {self._correct(token) for token in query}:
+            for label_id in self._token_index.get(token, ()):
+                overlaps[label_id] = overlaps.get(label_id, 0) + 1
+
+        # Shared words must cover half the query and most of the label
+        scores = {}
+        for label_id, shared in overlaps.items():
+            if 2 * shared >= len(query) and 2 * shared > self._label_sizes[label_id]:
+                activity_id = self._label_activity[label_id]
+                scores[activity_id] = max(scores.get(activity_id, 0), shared)
+        if not scores:
+            return None
+        # Most shared words, then the logged category, then the plainest name
+        return max(scores, key=lambda i: (scores[i], self.categories[i] == category, -self._token_counts[i], -i))
+
+    def find(self, name, category=None):
+        """
+        Activity id for a free-text exercise name, or None
+
+        Args:
+            name: What the user typed, e.g. "evening jog" or "swiming"
+            category: Logged category, used to break ties
+        """
+        normalized = normalize_activity(name)
+        if not normalized:
+            return None
+        key = (normalized, category)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        activity_id = self._match(normalized, category)
+        with self._lock:
+            self._cache[key] = activity_id
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return activity_id
+
+    def get(self, activity_id):
+        """Activity dict for an id"""
+        return {
+            "name": self.names[activity_id],
+            "category": self.categories[activity_id],
+            "met": self.mets[activity_id],
+        }
+
+    def lookup(self, name, category=None):
+        """Activity dict for a free-text name, or None"""
+        activity_id = self.find(name, category)
+        return None if activity_id is None else self.get(activity_id)
+
+    def met_for(self, name, category=None):
+        """MET for an exercise name, falling back to its category's value"""
+        activity_id = self.find(name, category)
+        if activity_id is None:
+            return CATEGORY_METS.get(category, DEFAULT_MET)
+        return self.mets[activity_id]
+
+    def search(self, query, limit=10):
+        """Activity names containing a query, for autocomplete"""
+        normalized = normalize_activity(query)
+        return [name for name in self.names if normalized in normalize_activity(name)][:limit]
+
+
+def logged_met(entry):
+    """
+    MET a fitness log entry was computed with
+
+    Entries store it since the compendium was added; older ones were
+    computed from their category alone.
+    """
+    met = entry.get("met")
+    if met is None:
+        met = CATEGORY_METS.get(entry.get("category"), DEFAULT_MET)
+    return met
+
+
+def recompute_burns(manager, username, weight):
+    """
+    Recompute calories burned over a user's whole fitness history
+
+    Run when their weight changes: every session is recomputed in one
+    burn_column() pass with the MET it was logged with, and the changed
+    entries are written back in a single batch (daily totals follow).
+    Daily summary rows from compacted logs have no per-session MET and
+    are left as they are.
+
+    Args:
+        manager: UserManager holding the logs
+        username: User whose history to update
+        weight: New body weight in kg
+
+    Returns:
+        Number of entries updated
+    """
+    sessions = [
+        entry for entry in manager.get_log_range(username, 'fitness_log')
+        if entry.get("id") and entry.get("category") != "summary"
+    ]
+    if not sessions:
+        return 0
+    mets = array('d', map(logged_met, sessions))
+    minutes = array('d', (entry.get("duration", 0) for entry in sessions))
+    burns = burn_column(mets, weight, minutes)
+    changes = {
+        entry["id"]: {"calories_burned": burn, "met": met}
+        for entry, met, burn in zip(sessions, mets, burns)
+        if entry.get("calories_burned") != burn
+    }
+    return manager.update_log_entries(username, 'fitness_log', changes) if changes else 0
+
+
+# Global instance
+exercise_catalog = ExerciseCatalog()
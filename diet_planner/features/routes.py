@@ -1,61 +1,142 @@
-from flask import Blueprint, render_template, request, redirect, url_for
+from itertools import islice
+import json
+
+from flask import Blueprint, Response, render_template, request, g, stream_with_context
+from diet_planner.auth.decorators import login_required
+from diet_planner.chat_coach import chat_coach
 from diet_planner.data_store import user_manager
-from diet_planner.food_data import get_healthy_suggestion, get_diet_plan, food_database
-from diet_planner.workout_data import get_weekly_workout_plan
+from diet_planner.food_data import get_healthy_suggestion, get_diet_plan, food_catalog
+from diet_planner.http_cache import response_cache
+from diet_planner.sampling import seeded_rng
+from diet_planner.workout_data import generate_program
 
 features = Blueprint('features', __name__, url_prefix='/features')
 
 @features.route("/")
+@login_required
 def dashboard():
-    if not user_manager.current_user:
-        return redirect(url_for('auth.login'))
     return render_template("features.html")
 
 @features.route("/chat", methods=["POST"])
 def chat():
-    user_message = request.form.get("message", "").lower()
-    response = "I'm not sure about that. Try asking about 'protein' or 'tips'."
-    
-    if "hello" in user_message:
-        response = "Hello! I'm your AI Diet Coach. How can I help you today?"
-    elif "protein" in user_message:
-        response = "High protein foods include Paneer, Chicken, Lentils, and Eggs."
-    elif "weight loss" in user_message:
-        response = "To lose weight, aim for a calorie deficit of 300-500 kcal and increase protein intake."
-    elif "water" in user_message:
-        response = "Staying hydrated is key! Aim for at least 8 glasses a day."
-    elif "thank" in user_message:
-        response = "You're welcome! Keep crushing your goals! 💪"
-        
-    return response
+    # Intents, foods and numeric limits are matched in one pass over the message
+    return chat_coach.reply(request.form.get("message", ""))
 
 @features.route("/suggest")
+@login_required
 def suggest():
-    if not user_manager.current_user:
-        return redirect(url_for('auth.login'))
-    suggestion = get_healthy_suggestion()
+    # Same pick all day for a user, so the page is stable across reloads
+    suggestion = get_healthy_suggestion(rng=seeded_rng(g.username, "suggest"))
     return render_template("features.html", suggestion=suggestion, mode="suggestion")
 
 @features.route("/generate_plan")
+@login_required
 def generate_plan():
-    if not user_manager.current_user:
-        return redirect(url_for('auth.login'))
-    
-    user_data = user_manager.get_user_data()
+    user_data = user_manager.get_user_data(g.username, with_logs=False)
     target = user_data['profile'].get('tdee', 2000)
     plan = get_diet_plan(target)
     return render_template("features.html", plan=plan, mode="plan", target=target)
 
 @features.route("/workout_plan")
+@login_required
 def workout_plan():
-    if not user_manager.current_user:
-        return redirect(url_for('auth.login'))
-        
-    user_data = user_manager.get_user_data()
+    user_data = user_manager.get_user_data(g.username, with_logs=False)
     activity = user_data['profile'].get('activity', 'moderate')
-    plan = get_weekly_workout_plan(activity)
-    return render_template("features.html", workout_plan=plan, mode="workout", activity=activity)
+    goal = user_data['profile'].get('goal', 'maintain')
+    # Unparseable values fall back to the defaults
+    days = request.args.get("days", type=int)
+    weeks = request.args.get("weeks", 4, type=int)
+    # Generated once per (activity, goal, days, weeks) and shared read-only
+    program = generate_program(activity, goal, days, weeks)
+    return render_template("features.html", program=program, mode="workout", activity=activity)
+
+# Page size bounds for the food listing
+LIST_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Query parameter -> (catalog column, bound) for the listing filters
+_RANGE_PARAMS = {
+    "min_calories": ("calories", 0), "max_calories": ("calories", 1),
+    "min_protein": ("p", 0), "max_protein": ("p", 1),
+    "min_carbs": ("c", 0), "max_carbs": ("c", 1),
+    "min_fats": ("f", 0), "max_fats": ("f", 1),
+}
+
+
+def _list_filters(args):
+    """Catalog filters from the query string; raises ValueError on bad numbers"""
+    filters = {}
+    if args.get("category"):
+        filters["category"] = args["category"]
+    if args.get("healthy") in ("1", "0"):
+        filters["healthy"] = args["healthy"] == "1"
+    bounds = {}
+    for param, (column, side) in _RANGE_PARAMS.items():
+        if args.get(param):
+            bounds.setdefault(column, [None, None])[side] = float(args[param])
+    filters.update((column, tuple(bound)) for column, bound in bounds.items())
+    return filters
+
+
+def _list_cursor(args, default_limit):
+    """(cursor, limit) from the query string; raises ValueError on bad numbers"""
+    after = int(args.get("cursor", -1))
+    limit = args.get("limit")
+    limit = default_limit if limit is None else max(1, int(limit))
+    return after, limit
+
 
 @features.route("/list_foods")
+@response_cache.cached(max_age=300, private=False)
 def list_foods():
-    return render_template("features.html", all_foods=food_database, mode="list")
+    try:
+        filters = _list_filters(request.args)
+        after, limit = _list_cursor(request.args, LIST_PAGE_SIZE)
+    except ValueError:
+        return "Invalid filter or cursor", 400
+    
+    food_ids, next_cursor = food_catalog.page(after, min(limit, MAX_PAGE_SIZE), **filters)
+    # Links to the next page keep the filters and only replace the cursor
+    next_args = {key: value for key, value in request.args.items() if key != "cursor"}
+    return render_template(
+        "features.html", mode="list",
+        foods=food_catalog.rows(food_ids),
+        categories=food_catalog.categories,
+        filters=request.args,
+        next_args=next_args,
+        next_cursor=next_cursor,
+    )
+
+
+@features.route("/list_foods/stream")
+def list_foods_stream():
+    """
+    Matching foods streamed as NDJSON (default) or a JSON array
+
+    Accepts the list_foods filters plus an optional cursor and limit (no
+    limit streams every match). Rows are serialized one at a time.
+    """
+    try:
+        filters = _list_filters(request.args)
+        after, limit = _list_cursor(request.args, None)
+    except ValueError:
+        return {"error": "Invalid filter or cursor"}, 400
+    as_array = request.args.get("format") == "json"
+    
+    def generate():
+        food_ids = food_catalog.iter_where(after, **filters)
+        if limit is not None:
+            food_ids = islice(food_ids, limit)
+        if as_array:
+            yield "["
+        for position, food_id in enumerate(food_ids):
+            row = json.dumps(food_catalog.row(food_id))
+            if as_array:
+                yield row if position == 0 else "," + row
+            else:
+                yield row + "\n"
+        if as_array:
+            yield "]"
+    
+    mimetype = "application/json" if as_array else "application/x-ndjson"
+    return Response(stream_with_context(generate()), mimetype=mimetype)
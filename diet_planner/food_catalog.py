@@ -0,0 +1,528 @@
+"""
+Food Catalog
+Columnar, array-backed storage for the food database with vectorized queries
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Sequence
+from itertools import compress, islice, repeat
+import heapq
+import operator
+import re
+
+from diet_planner.food_tags import food_tags
+
+# Numeric columns kept as contiguous C doubles
+NUMERIC_COLUMNS = ("calories", "p", "c", "f")
+
+# iter_where() answers a calorie bound from the sorted index when it matches
+# at most this share of the catalog; wider ranges are cheaper to scan lazily
+INDEX_SELECTIVITY = 0.25
+
+_SPACE_RE = re.compile(r"\s+")
+_SERVING_RE = re.compile(r"\s*\([^)]*\)\s*$")
+
+
+def normalize_name(name):
+    """Case-fold a food name and collapse whitespace for lookups"""
+    return _SPACE_RE.sub(" ", name.casefold()).strip()
+
+
+def _bounds(spec):
+    """(low, high, strict_low, strict_high) from a 2- or 4-tuple range spec"""
+    low, high, *strict = spec
+    return (low, high, *(strict or (False, False)))
+
+
+def strip_serving(name):
+    """Drop a trailing serving note, e.g. 'Rajma (1 cup)' -> 'Rajma'"""
+    return _SERVING_RE.sub("", name)
+
+
+def _num(value):
+    """Return whole numbers as ints so rows look like the original literals"""
+    return int(value) if value.is_integer() else value
+
+
+class FoodRecords(Sequence):
+    """Read-only list-like view that materializes catalog rows as dicts"""
+
+    def __init__(self, catalog):
+        self._catalog = catalog
+
+    def __len__(self):
+        return len(self._catalog)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._catalog.row(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("food index out of range")
+        return self._catalog.row(index)
+
+    def __iter__(self):
+        row = self._catalog.row
+        for i in range(len(self._catalog)):
+            yield row(i)
+
+    def append(self, food):
+        """Add a food dict to the underlying catalog"""
+        self._catalog.add(food)
+
+
+class CalorieIndex:
+    """
+    Calorie-sorted index over catalog rows
+
+    Keeps parallel arrays of sorted calorie keys and row ids so nearest
+    lookups are O(log n) and range lookups O(log n + k). Can cover the
+    whole catalog or any subset of row ids (e.g. a user's filtered foods).
+    """
+
+    def __init__(self, catalog, food_ids=None):
+        self._catalog = catalog
+        if food_ids is None:
+            food_ids = range(len(catalog))
+        order = sorted(food_ids, key=catalog.calories.__getitem__)
+        self.ids = array('L', order)
+        self.keys = array('d', map(catalog.calories.__getitem__, order))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, food_id):
+        """Insert a row id, keeping the index sorted"""
+        value = self._catalog.calories[food_id]
+        pos = bisect_right(self.keys, value)
+        self.keys.insert(pos, value)
+        self.ids.insert(pos, food_id)
+
+    def span(self, low=None, high=None, strict_low=False, strict_high=False):
+        """(start, stop) positions in ids of the rows within the bounds"""
+        start = 0 if low is None else (bisect_right if strict_low else bisect_left)(self.keys, low)
+        stop = len(self.keys) if high is None else (bisect_left if strict_high else bisect_right)(self.keys, high)
+        return start, max(start, stop)
+
+    def range(self, low=None, high=None, strict_low=False, strict_high=False):
+        """Row ids with low <= calories <= high (< for strict bounds), in calorie order"""
+        start, stop = self.span(low, high, strict_low, strict_high)
+        return self.ids[start:stop].tolist()
+
+    def nearest(self, target, k=1, skip=None):
+        """
+        Row ids closest to target calories
+
+        Args:
+            target: Calorie value to match
+            k: Number of ids to return
+            skip: Optional container of row ids to pass over
+
+        Returns:
+            Up to k row ids ordered by calorie distance, ties by row id
+        """
+        keys, ids = self.keys, self.ids
+        size = len(keys)
+        right = bisect_left(keys, target)
+        left = right - 1
+        result = []
+        while len(result) < k and (left >= 0 or right < size):
+            left_gap = target - keys[left] if left >= 0 else float('inf')
+            right_gap = keys[right] - target if right < size else float('inf')
+            gap = min(left_gap, right_gap)
+
+            # Everything at the same distance forms one group, emitted by id
+            group = []
+            if left_gap == gap:
+                value = keys[left]
+                while left >= 0 and keys[left] == value:
+                    group.append(ids[left])
+                    left -= 1
+            if right_gap == gap:
+                value = keys[right]
+                while right < size and keys[right] == value:
+                    group.append(ids[right])
+                    right += 1
+
+            for food_id in sorted(group):
+                if skip is not None and food_id in skip:
+                    continue
+                result.append(food_id)
+                if len(result) == k:
+                    break
+        return result
+
+
+class FoodCatalog:
+    """
+    Food catalog stored column-wise
+
+    Calories and macros live in array('d') columns, categories are interned
+    to small integer codes and the healthy flag is a byte column. Rows are
+    addressed by their integer id (insertion order). Queries return lists of
+    row ids; use row()/rows() to materialize the familiar food dicts.
+
+    A CalorieIndex over all rows and a normalized name -> row id index
+    (plus aliases) are kept up to date as foods are added.
+    """
+
+    def __init__(self):
+        self.names = []
+        self.calories = array('d')
+        self.p = array('d')
+        self.c = array('d')
+        self.f = array('d')
+        self.category_codes = array('H')
+        self.healthy = array('b')
+        # Dietary/allergen bit flags (see food_tags), derived once per row
+        self.tags = array('H')
+
+        # Interned categories: code -> name and name -> code
+        self.categories = []
+        self._category_lookup = {}
+
+        # Category code -> row ids in that category, ascending
+        self.category_postings = []
+
+        # Bumped on every change so caches can key on it
+        self.version = 0
+
+        self.calorie_index = CalorieIndex(self)
+
+        # Normalized name -> row id, and alias -> row id for other spellings
+        self._name_index = {}
+        self._aliases = {}
+
+    @classmethod
+    def from_records(cls, records):
+        """Build a catalog from an iterable of food dicts"""
+        catalog = cls()
+        catalog.extend(records)
+        return catalog
+
+    def __len__(self):
+        return len(self.names)
+
+    # --- Loading ---
+    def intern_category(self, name):
+        """Return the integer code for a category, creating it if needed"""
+        code = self._category_lookup.get(name)
+        if code is None:
+            code = len(self.categories)
+            self.categories.append(name)
+            self._category_lookup[name] = code
+            self.category_postings.append(array('L'))
+        return code
+
+    def category_code(self, name):
+        """Return the code for an existing category, or None"""
+        return self._category_lookup.get(name)
+
+    def _append(self, food):
+        """Append a row to the columns without touching the indexes"""
+        food_id = len(self.names)
+        name = food['name']
+        normalized = normalize_name(name)
+        self._name_index.setdefault(normalized, food_id)
+        # The name without its serving note doubles as an alias
+        self._aliases.setdefault(strip_serving(normalized), food_id)
+        self.names.append(name)
+        self.calories.append(food['calories'])
+        self.p.append(food.get('p', 0))
+        self.c.append(food.get('c', 0))
+        self.f.append(food.get('f', 0))
+        code = self.intern_category(food.get('category', 'Other'))
+        self.category_codes.append(code)
+        self.category_postings[code].append(food_id)
+        self.healthy.append(1 if food.get('healthy') else 0)
+        self.tags.append(food_tags(food))
+        return food_id
+
+    def add(self, food):
+        """Append one food dict and return its row id"""
+        food_id = self._append(food)
+        self.calorie_index.add(food_id)
+        self.version += 1
+        return food_id
+
+    def extend(self, records, reindex=True):
+        """
+        Append many food dicts, re-sorting the calorie index once
+
+        Args:
+            records: Iterable of food dicts, consumed lazily
+            reindex: Pass False when appending in several batches and call
+                reindex() after the last one
+
+        Returns:
+            Number of rows appended
+        """
+        start = len(self.names)
+        for food in records:
+            self._append(food)
+        if reindex:
+            self.reindex()
+        return len(self.names) - start
+
+    def reindex(self):
+        """Rebuild the calorie index over every row and bump the version"""
+        self.calorie_index = CalorieIndex(self)
+        self.version += 1
+
+    def add_alias(self, alias, name):
+        """Map an alternative spelling onto an existing food name"""
+        food_id = self._name_index.get(normalize_name(name))
+        if food_id is None:
+            return False
+        self._aliases[normalize_name(alias)] = food_id
+        return True
+
+    def add_aliases(self, aliases):
+        """Register a dict of alias -> food name"""
+        for alias, name in aliases.items():
+            self.add_alias(alias, name)
+
+    def contains_name(self, name):
+        """Whether a food with exactly this normalized name exists (aliases ignored)"""
+        return normalize_name(name) in self._name_index
+
+    def find_exact(self, name):
+        """Row id for exactly this normalized name, or None (aliases and serving notes ignored)"""
+        return self._name_index.get(normalize_name(name))
+
+    def find_name(self, name):
+        """
+        Row id for a food name, or None
+
+        Tries the exact normalized name, then aliases, then the name with
+        any serving note removed so 'Rajma (2 cups)' finds 'Rajma (1 cup)'.
+        """
+        normalized = normalize_name(name)
+        food_id = self._name_index.get(normalized)
+        if food_id is None:
+            food_id = self._aliases.get(normalized)
+        if food_id is None:
+            food_id = self._aliases.get(strip_serving(normalized))
+        return food_id
+
+    def get_by_name(self, name):
+        """Food dict for a name or alias, or None"""
+        food_id = self.find_name(name)
+        return None if food_id is None else self.row(food_id)
+
+    # --- Row access ---
+    def row(self, food_id):
+        """Materialize a single row as a food dict"""
+        return {
+            "name": self.names[food_id],
+            "calories": _num(self.calories[food_id]),
+            "p": _num(self.p[food_id]),
+            "c": _num(self.c[food_id]),
+            "f": _num(self.f[food_id]),
+            "category": self.categories[self.category_codes[food_id]],
+            "healthy": bool(self.healthy[food_id]),
+        }
+
+    def rows(self, food_ids):
+        """Materialize several rows as food dicts"""
+        return [self.row(i) for i in food_ids]
+
+    def records(self):
+        """Dict-returning sequence view for code written against the old list"""
+        return FoodRecords(self)
+
+    def column(self, name):
+        """Return a numeric column by name"""
+        if name not in NUMERIC_COLUMNS:
+            raise KeyError(name)
+        return getattr(self, name)
+
+    # --- Queries ---
+    def _gather(self, values, food_ids):
+        """Iterate a column over the given row ids (or all rows if None)"""
+        return values if food_ids is None else map(values.__getitem__, food_ids)
+
+    def _range_mask(self, column, low, high, strict_low=False, strict_high=False, food_ids=None):
+        """Boolean iterators for low <= value <= high (< for strict bounds), evaluated in C"""
+        values = self.column(column)
+        masks = []
+        if low is not None:
+            masks.append(map(operator.lt if strict_low else operator.le, repeat(low), self._gather(values, food_ids)))
+        if high is not None:
+            masks.append(map(operator.gt if strict_high else operator.ge, repeat(high), self._gather(values, food_ids)))
+        return masks
+
+    def where(self, candidates=None, category=None, categories=None, healthy=None, exclude_tags=0, **ranges):
+        """
+        Predicate query over the catalog
+
+        Args:
+            candidates: Optional iterable of row ids to restrict the search to
+            category: Single category name to match
+            categories: Iterable of acceptable category names
+            healthy: True/False to filter on the healthy flag
+            exclude_tags: food_tags bit mask; rows carrying any of these
+                tags are dropped (tags & mask == 0 is kept)
+            **ranges: column=(low, high) inclusive bounds; either bound may
+                be None. A (low, high, strict_low, strict_high) tuple makes
+                the flagged bounds strict (> / <).
+
+        Returns:
+            List of matching row ids in catalog order
+        """
+        if category is not None:
+            categories = [category]
+        codes = None
+        if categories is not None:
+            codes = {self._category_lookup[name] for name in categories if name in self._category_lookup}
+            if not codes:
+                return []
+
+        # A calorie bound narrows the search through the sorted index first,
+        # otherwise a category filter starts from its postings
+        food_ids = None
+        calorie_bounds = ranges.pop('calories', None)
+        if calorie_bounds is not None:
+            food_ids = sorted(self.calorie_index.range(*_bounds(calorie_bounds)))
+        elif codes is not None and candidates is None:
+            food_ids = list(self._postings(codes))
+            codes = None
+        if candidates is not None:
+            if food_ids is None:
+                food_ids = sorted(set(candidates))
+            else:
+                allowed = set(candidates)
+                food_ids = [i for i in food_ids if i in allowed]
+
+        masks = []
+        for column, spec in ranges.items():
+            masks.extend(self._range_mask(column, *_bounds(spec), food_ids=food_ids))
+
+        if codes is not None:
+            masks.append(map(codes.__contains__, self._gather(self.category_codes, food_ids)))
+
+        if healthy is not None:
+            masks.append(map(operator.eq, repeat(1 if healthy else 0), self._gather(self.healthy, food_ids)))
+
+        if exclude_tags:
+            masks.append(map(operator.not_, map(operator.and_, repeat(exclude_tags), self._gather(self.tags, food_ids))))
+
+        domain = range(len(self)) if food_ids is None else food_ids
+        if not masks:
+            return list(domain)
+
+        combined = masks[0]
+        for mask in masks[1:]:
+            combined = map(operator.and_, combined, mask)
+        return list(compress(domain, combined))
+
+    def _postings(self, codes, after=-1):
+        """Row ids (> after) in the given categories, ascending, as an iterator"""
+        runs = []
+        for code in sorted(codes):
+            postings = self.category_postings[code]
+            runs.append(islice(postings, bisect_right(postings, after), None))
+        return runs[0] if len(runs) == 1 else heapq.merge(*runs)
+
+    def iter_where(self, after=-1, category=None, categories=None, healthy=None, **ranges):
+        """
+        Lazy form of where() for paging through the catalog
+
+        Args:
+            after: Only row ids greater than this (a page cursor)
+            category / categories / healthy / **ranges: As in where()
+
+        Yields:
+            Matching row ids in catalog order. A calorie bound matching at
+            most INDEX_SELECTIVITY of the rows is looked up in the calorie
+            index, and its matches are sorted up front (memory grows with
+            the matches, not the catalog). Otherwise a category filter walks
+            that category's postings, or every row is scanned, holding only
+            the current row; remaining bounds are checked row by row.
+        """
+        if category is not None:
+            categories = [category]
+        codes = None
+        if categories is not None:
+            codes = {self._category_lookup[name] for name in categories if name in self._category_lookup}
+            if not codes:
+                return
+
+        hits = self._calorie_hits(ranges['calories']) if 'calories' in ranges else None
+        if hits is not None:
+            del ranges['calories']
+            domain = islice(hits, bisect_right(hits, after), None)
+        elif codes is not None:
+            domain = self._postings(codes, after)
+            codes = None
+        else:
+            domain = range(max(after + 1, 0), len(self))
+
+        bounds = [(self.column(column), *_bounds(spec)) for column, spec in ranges.items()]
+        healthy_flag = None if healthy is None else (1 if healthy else 0)
+        for food_id in domain:
+            if codes is not None and self.category_codes[food_id] not in codes:
+                continue
+            if healthy_flag is not None and self.healthy[food_id] != healthy_flag:
+                continue
+            for values, low, high, strict_low, strict_high in bounds:
+                value = values[food_id]
+                if low is not None and (value <= low if strict_low else value < low):
+                    break
+                if high is not None and (value >= high if strict_high else value > high):
+                    break
+            else:
+                yield food_id
+
+    def _calorie_hits(self, spec):
+        """Sorted row ids within a calorie bound, or None if the bound is too wide to pay off"""
+        start, stop = self.calorie_index.span(*_bounds(spec))
+        if stop - start > len(self) * INDEX_SELECTIVITY:
+            return None
+        return sorted(self.calorie_index.ids[start:stop])
+
+    def page(self, after=-1, limit=50, **filters):
+        """
+        One page of a filtered listing
+
+        Args:
+            after: Cursor from the previous page (-1 for the first page)
+            limit: Page size
+            **filters: As in iter_where()
+
+        Returns:
+            (row ids, next cursor or None on the last page)
+        """
+        food_ids = list(islice(self.iter_where(after, **filters), limit + 1))
+        if len(food_ids) > limit:
+            food_ids = food_ids[:limit]
+            return food_ids, food_ids[-1]
+        return food_ids, None
+
+    def in_range(self, column, low, high):
+        """Row ids whose column value lies within [low, high]"""
+        if column == "calories":
+            return self.calorie_index.range(low, high)
+        return self.where(**{column: (low, high)})
+
+    def nearest(self, target, k=1, column="calories", candidates=None):
+        """
+        Row ids closest to target on a numeric column
+
+        Args:
+            target: Value to match
+            k: Number of ids to return
+            column: Numeric column name (default calories)
+            candidates: Optional iterable of row ids to choose from
+
+        Returns:
+            Up to k row ids ordered by distance
+        """
+        if column == "calories" and candidates is None:
+            return self.calorie_index.nearest(target, k)
+        values = self.column(column)
+        if candidates is None:
+            candidates = range(len(self))
+        return heapq.nsmallest(k, candidates, key=lambda i: abs(values[i] - target))
@@ -1,7 +1,9 @@
 # Advanced Food Database with Macros
 # Structure: { name, calories, protein, carbs, fats, category, healthy }
 
-food_database = [
+from diet_planner.food_catalog import FoodCatalog
+
+seed_foods = [
     # Indian Foods - Curries & Main Dishes
     {"name": "Paneer Butter Masala (1 cup)", "calories": 350, "p": 12, "c": 15, "f": 25, "category": "Indian", "healthy": False},
     {"name": "Dal Tadka (1 cup)", "calories": 180, "p": 12, "c": 25, "f": 4, "category": "Indian", "healthy": True},
@@ -84,12 +86,52 @@ food_database = [
     {"name": "Protein Shake (1 cup)", "calories": 150, "p": 20, "c": 10, "f": 3, "category": "Beverage", "healthy": True},
 ]
 
-def get_healthy_suggestion():
+# Common alternative spellings / names -> catalog name
+food_aliases = {
+    "chapati": "Roti (1 piece)",
+    "phulka": "Roti (1 piece)",
+    "dal": "Dal Tadka (1 cup)",
+    "daal": "Dal Tadka (1 cup)",
+    "chole": "Chana Masala (1 cup)",
+    "chickpea curry": "Chana Masala (1 cup)",
+    "kidney beans": "Rajma (1 cup)",
+    "chawal": "Rice (1 cup cooked)",
+    "white rice": "Rice (1 cup cooked)",
+    "chicken breast": "Grilled Chicken Breast",
+    "boiled eggs": "Eggs (2 boiled)",
+    "egg": "Eggs (2 boiled)",
+    "omelette": "Egg Omelet (3 eggs)",
+    "egg omelette": "Egg Omelet (3 eggs)",
+    "idly": "Idli (2 pcs)",
+    "uthappam": "Uttapam (1 pc)",
+    "oatmeal": "Oats (1 cup cooked)",
+    "porridge": "Oats (1 cup cooked)",
+    "curd": "Yogurt (1 cup)",
+    "dahi": "Yogurt (1 cup)",
+    "yoghurt": "Yogurt (1 cup)",
+    "greek yoghurt": "Greek Yogurt (1 cup)",
+    "cottage cheese": "Paneer (100g)",
+    "groundnuts": "Peanuts (1 oz)",
+    "chai": "Black Tea with Milk",
+    "tea": "Black Tea with Milk",
+    "coffee": "Coffee with Milk",
+    "whey shake": "Protein Shake (1 cup)",
+}
+
+# Columnar catalog built from the seed data. food_database remains a
+# dict-returning view over it so existing callers keep working.
+food_catalog = FoodCatalog.from_records(seed_foods)
+food_catalog.add_aliases(food_aliases)
+food_database = food_catalog.records()
+
+def get_healthy_suggestion(rng=None):
+    """Random healthy food; pass a seeded random.Random for a reproducible pick"""
     import random
-    healthy_foods = [f for f in food_database if f['healthy']]
-    return random.choice(healthy_foods) if healthy_foods else None
+    healthy_ids = food_catalog.where(healthy=True)
+    return food_catalog.row((rng or random).choice(healthy_ids)) if healthy_ids else None
 
-def get_diet_plan(target_calories):
+def get_diet_plan_ids(target_calories):
+    """Daily plan as catalog row ids: {meal: [food_id, ...], total_calories}"""
     # Same simple logic for now, could be enhanced with macros awareness
     plan = {
         "breakfast": [],
@@ -106,34 +148,19 @@ def get_diet_plan(target_calories):
         "snacks": target_calories * 0.1
     }
     
-    # Helper to find closest food match
-    def find_food(calories_needed):
-        # Sort by closeness to calories_needed
-        candidates = sorted(food_database, key=lambda x: abs(x['calories'] - calories_needed))
-        return candidates[0] if candidates else None
-
-    # Breakfast
-    b_item = find_food(targets['breakfast'])
-    if b_item:
-        plan['breakfast'].append(b_item)
-        plan['total_calories'] += b_item['calories']
-        
-    # Lunch 
-    l_item = find_food(targets['lunch'])
-    if l_item: 
-        plan['lunch'].append(l_item)
-        plan['total_calories'] += l_item['calories']
-
-    # Dinner
-    d_item = find_food(targets['dinner'])
-    if d_item:
-        plan['dinner'].append(d_item)
-        plan['total_calories'] += d_item['calories']
-        
-    # Snack
-    s_item = find_food(targets['snacks'])
-    if s_item:
-        plan['snacks'].append(s_item)
-        plan['total_calories'] += s_item['calories']
+    # Closest food match per meal
+    for meal, calories_needed in targets.items():
+        closest = food_catalog.nearest(calories_needed)
+        if closest:
+            plan[meal].append(closest[0])
+            plan['total_calories'] += food_catalog.row(closest[0])['calories']
         
     return plan
+
+
+def get_diet_plan(target_calories):
+    plan = get_diet_plan_ids(target_calories)
+    return {
+        meal: food_catalog.rows(value) if isinstance(value, list) else value
+        for meal, value in plan.items()
+    }
@@ -0,0 +1,219 @@
+"""
+Food Search Index
+Prebuilt token and trigram inverted index over food names
+"""
+
+from array import array
+from bisect import bisect_left
+import heapq
+import re
+import threading
+
+from diet_planner.food_data import food_catalog
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Relevance weights per matched query term
+EXACT_WEIGHT = 3.0
+PREFIX_WEIGHT = 1.0  # plus up to 1.0 for how much of the token the prefix covers
+FUZZY_WEIGHT = 1.0   # scaled by trigram similarity
+
+# Upper bound on documents gathered per query term before ranking
+CANDIDATE_CAP = 2000
+
+
+def tokenize(text):
+    """Lowercase a name and split it into alphanumeric tokens"""
+    return _TOKEN_RE.findall(text.lower())
+
+
+def _trigrams(token):
+    """Boundary-padded character trigrams of a token"""
+    padded = f"^{token}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _edit_distance(a, b, limit):
+    """Levenshtein distance, giving up early once it exceeds limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b)
+            ))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class FoodSearchIndex:
+    """
+    Inverted index for food name search
+
+    Tokens map to posting arrays of catalog row ids. A sorted vocabulary
+    answers prefix queries with bisect, and a trigram -> tokens map finds
+    near-miss spellings. New catalog rows are indexed incrementally the next
+    time the index is queried; indexing holds a lock so concurrent queries
+    never index a row twice, and the vocabulary is swapped in already sorted.
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.postings = {}     # token -> array of row ids
+        self.vocabulary = []   # sorted tokens, for prefix ranges
+        self.trigrams = {}     # trigram -> set of tokens
+        self.token_counts = array('H')  # row id -> number of tokens in name
+        self._indexed = 0
+        self._lock = threading.Lock()
+
+    def sync(self):
+        """Index any catalog rows added since the last call"""
+        names = self.catalog.names
+        if self._indexed == len(names):
+            return
+        with self._lock:
+            new_tokens = []
+            for food_id in range(self._indexed, len(names)):
+                new_tokens.extend(self._add(food_id, names[food_id]))
+            if new_tokens:
+                # One sort for the whole batch (bulk imports add many tokens);
+                # readers keep the old list until the new one is complete
+                self.vocabulary = sorted(self.vocabulary + new_tokens)
+            self._indexed = len(names)
+
+    def _add(self, food_id, name):
+        """Index a row's tokens; returns tokens new to the vocabulary"""
+        tokens = tokenize(name)
+        self.token_counts.append(min(len(tokens), 0xFFFF))
+        new_tokens = []
+        for token in set(tokens):
+            posting = self.postings.get(token)
+            if posting is None:
+                posting = self.postings[token] = array('L')
+                new_tokens.append(token)
+                for gram in _trigrams(token):
+                    self.trigrams.setdefault(gram, set()).add(token)
+            posting.append(food_id)
+        return new_tokens
+
+    # --- Term matching ---
+    def _prefix_tokens(self, term):
+        """Vocabulary tokens starting with term (excluding term itself)"""
+        vocabulary = self.vocabulary
+        i = bisect_left(vocabulary, term)
+        matches = []
+        while i < len(vocabulary) and vocabulary[i].startswith(term):
+            if vocabulary[i] != term:
+                matches.append(vocabulary[i])
+            i += 1
+        return matches
+
+    def _fuzzy_tokens(self, term):
+        """Vocabulary tokens within a small edit distance of term"""
+        if len(term) < 3:
+            return []
+        grams = _trigrams(term)
+        shared = {}
+        for gram in grams:
+            for token in self.trigrams.get(gram, ()):
+                shared[token] = shared.get(token, 0) + 1
+
+        limit = 1 if len(term) < 6 else 2
+        matches = []
+        for token, count in shared.items():
+            similarity = 2 * count / (len(grams) + len(_trigrams(token)))
+            if similarity < 0.3 or token == term:
+                continue
+            # Compare against the same-length prefix so partial words still match
+            distance = min(_edit_distance(term, token, limit), _edit_distance(term, token[:len(term)], limit))
+            if distance <= limit:
+                matches.append((token, FUZZY_WEIGHT * similarity))
+        return matches
+
+    def _term_tokens(self, term, limit, fuzzy):
+        """Map vocabulary token -> weight for one query term"""
+        weights = {}
+        if term in self.postings:
+            weights[term] = EXACT_WEIGHT
+        for token in self._prefix_tokens(term):
+            weights[token] = PREFIX_WEIGHT + len(term) / len(token)
+        if fuzzy and self._posting_total(weights) < limit:
+            for token, weight in self._fuzzy_tokens(term):
+                weights.setdefault(token, weight)
+        return weights
+
+    def _posting_total(self, weights):
+        """Number of postings behind a set of tokens (with duplicates)"""
+        return sum(len(self.postings[token]) for token in weights)
+
+    def _gather(self, weights):
+        """Map row id -> best weight, best tokens first, up to CANDIDATE_CAP rows"""
+        scores = {}
+        for token in sorted(weights, key=weights.__getitem__, reverse=True):
+            weight = weights[token]
+            for food_id in self.postings[token]:
+                if weight > scores.get(food_id, 0):
+                    scores[food_id] = weight
+                    if len(scores) >= CANDIDATE_CAP:
+                        return scores
+        return scores
+
+    # --- Queries ---
+    def search_ids(self, query, limit=10, fuzzy=True):
+        """
+        Ranked row ids for a free-text query
+
+        Every query term must match a name token exactly, as a prefix or
+        (when few results are found) as a close misspelling. The rarest term
+        seeds the candidate set; the others are checked against it.
+
+        Args:
+            query: Search text
+            limit: Maximum number of ids to return
+            fuzzy: Allow typo-tolerant matches
+
+        Returns:
+            List of row ids, best match first
+        """
+        self.sync()
+        terms = tokenize(query)
+        if not terms:
+            return []
+
+        term_tokens = [self._term_tokens(term, limit, fuzzy) for term in dict.fromkeys(terms)]
+        term_tokens.sort(key=self._posting_total)
+
+        scores = self._gather(term_tokens[0])
+        for weights in term_tokens[1:]:
+            if not scores:
+                break
+            if self._posting_total(weights) <= CANDIDATE_CAP:
+                term_scores = self._gather(weights)
+                scores = {i: s + term_scores[i] for i, s in scores.items() if i in term_scores}
+            else:
+                # Common term: check the (bounded) candidates' own tokens instead
+                names = self.catalog.names
+                matched = {}
+                for food_id, score in scores.items():
+                    best = max((weights.get(token, 0) for token in tokenize(names[food_id])), default=0)
+                    if best:
+                        matched[food_id] = score + best
+                scores = matched
+
+        # Shorter names rank higher among equally good matches
+        token_counts = self.token_counts
+        return heapq.nsmallest(limit, scores, key=lambda i: (-(scores[i] + 1.0 / (1 + token_counts[i])), i))
+
+    def search(self, query, limit=10, fuzzy=True):
+        """Ranked food dicts for a free-text query"""
+        return self.catalog.rows(self.search_ids(query, limit, fuzzy))
+
+
+# Global instance
+food_search_index = FoodSearchIndex(food_catalog)
@@ -0,0 +1,155 @@
+"""
+Food Tags
+Dietary and allergen bit flags derived once per food, for restriction filtering by bitwise AND
+"""
+
+import re
+
+# One bit per ingredient class a restriction or allergy can rule out
+MEAT = 1 << 0
+FISH = 1 << 1
+SHELLFISH = 1 << 2
+EGG = 1 << 3
+DAIRY = 1 << 4
+GLUTEN = 1 << 5
+TREE_NUTS = 1 << 6
+PEANUTS = 1 << 7
+SOY = 1 << 8
+
+TAGS = {
+    "meat": MEAT,
+    "fish": FISH,
+    "shellfish": SHELLFISH,
+    "egg": EGG,
+    "dairy": DAIRY,
+    "gluten": GLUTEN,
+    "tree_nuts": TREE_NUTS,
+    "peanuts": PEANUTS,
+    "soy": SOY,
+}
+
+# Dietary restriction -> tags it rules out
+RESTRICTIONS = {
+    "vegetarian": MEAT | FISH | SHELLFISH,
+    "pescatarian": MEAT,
+    "vegan": MEAT | FISH | SHELLFISH | EGG | DAIRY,
+    "eggless": EGG,
+    "gluten_free": GLUTEN,
+    "dairy_free": DAIRY,
+    "lactose_free": DAIRY,
+    "nut_free": TREE_NUTS | PEANUTS,
+}
+
+# Allergy (as users type it) -> tags it rules out
+ALLERGENS = {
+    "nuts": TREE_NUTS | PEANUTS,
+    "nut": TREE_NUTS | PEANUTS,
+    "tree_nuts": TREE_NUTS,
+    "peanut": PEANUTS,
+    "peanuts": PEANUTS,
+    "dairy": DAIRY,
+    "milk": DAIRY,
+    "lactose": DAIRY,
+    "egg": EGG,
+    "eggs": EGG,
+    "gluten": GLUTEN,
+    "wheat": GLUTEN,
+    "soy": SOY,
+    "soya": SOY,
+    "fish": FISH,
+    "shellfish": SHELLFISH,
+    "seafood": FISH | SHELLFISH,
+}
+
+# Name words that imply a tag
+_KEYWORDS = {
+    MEAT: ("chicken", "mutton", "lamb", "beef", "pork", "bacon", "ham", "turkey", "meat",
+           "sausage", "keema", "salami"),
+    FISH: ("fish", "salmon", "tuna", "sardine", "sardines", "mackerel", "cod", "anchovy"),
+    SHELLFISH: ("prawn", "prawns", "shrimp", "shrimps", "crab", "lobster", "shellfish"),
+    EGG: ("egg", "eggs", "omelet", "omelette", "mayonnaise"),
+    DAIRY: ("milk", "paneer", "yogurt", "yoghurt", "curd", "cheese", "butter", "ghee",
+            "cream", "lassi", "whey", "raita", "kheer"),
+    GLUTEN: ("roti", "chapati", "bread", "paratha", "naan", "wheat", "bhature", "samosa",
+             "upma", "semolina", "rava", "pasta", "noodles", "pizza", "burger", "biscuit",
+             "biscuits", "cookie", "cookies", "cake", "oats", "barley", "cornflakes", "flour"),
+    TREE_NUTS: ("almond", "almonds", "cashew", "cashews", "walnut", "walnuts", "pistachio",
+                "pistachios", "hazelnut", "hazelnuts", "pecan", "pecans"),
+    PEANUTS: ("peanut", "peanuts", "namkeen"),
+    SOY: ("tofu", "soy", "soya", "edamame", "tempeh"),
+}
+
+# Multi-word names that imply a tag
+_PHRASES = {
+    "protein shake": DAIRY,
+    "plant protein": SOY,
+}
+
+# Categories whose foods all carry a tag
+_CATEGORY_TAGS = {
+    "Dairy": DAIRY,
+}
+
+# Words that cancel a tag, e.g. "peanut butter" is not dairy
+_NEGATIONS = {
+    DAIRY: ("peanut butter", "almond butter", "almond milk", "soy milk", "oat milk",
+            "coconut milk", "plant"),
+}
+
+_WORD_RE = re.compile(r"[a-z]+")
+
+_WORD_TAGS = {word: tag for tag, words in _KEYWORDS.items() for word in words}
+
+
+def derive_tags(name, category=None):
+    """
+    Tag bits for a food from its name and category
+
+    Keyword rules are a best effort for foods without explicit tags;
+    datasets can pass a "tags" list on each food instead.
+    """
+    lowered = name.lower()
+    bits = _CATEGORY_TAGS.get(category, 0)
+    for word in _WORD_RE.findall(lowered):
+        bits |= _WORD_TAGS.get(word, 0)
+    for phrase, tag in _PHRASES.items():
+        if phrase in lowered:
+            bits |= tag
+    for tag, phrases in _NEGATIONS.items():
+        if bits & tag and category not in _CATEGORY_TAGS and any(phrase in lowered for phrase in phrases):
+            bits &= ~tag
+    return bits
+
+
+def tags_from_names(names):
+    """Tag bits for a list of tag names (unknown names are ignored)"""
+    bits = 0
+    for name in names:
+        bits |= TAGS.get(str(name).strip().lower(), 0)
+    return bits
+
+
+def tag_names(bits):
+    """Tag names set in a bit field, in TAGS order"""
+    return [name for name, bit in TAGS.items() if bits & bit]
+
+
+def food_tags(food):
+    """Tag bits for a food dict: its explicit "tags" list if present, else derived"""
+    explicit = food.get("tags")
+    if explicit is not None:
+        if isinstance(explicit, str):
+            explicit = explicit.replace(";", ",").split(",")
+        return tags_from_names(explicit)
+    return derive_tags(food["name"], food.get("category"))
+
+
+def forbidden_mask(restrictions=(), allergies=()):
+    """Tags a food must not carry for these restrictions and allergies"""
+    mask = 0
+    for restriction in restrictions:
+        mask |= RESTRICTIONS.get(restriction, 0)
+    for allergy in allergies:
+        key = str(allergy).strip().lower().replace(" ", "_")
+        mask |= ALLERGENS.get(key, TAGS.get(key, 0))
+    return mask
@@ -0,0 +1,196 @@
+"""
+HTTP Caching
+ETag/Cache-Control handling and a bounded response cache for catalog-backed endpoints
+"""
+
+from collections import OrderedDict
+from functools import wraps
+import hashlib
+import threading
+
+from flask import current_app, g, jsonify, make_response, request
+
+from diet_planner.food_data import food_catalog
+from diet_planner.storage import today_key
+
+# Rough per-entry bookkeeping cost on top of the body and key
+_ENTRY_OVERHEAD = 256
+
+
+def _cache_headers(response, max_age, private):
+    if private:
+        response.cache_control.private = True
+    else:
+        response.cache_control.public = True
+    if max_age:
+        response.cache_control.max_age = max_age
+    else:
+        response.cache_control.no_cache = True
+    return response
+
+
+def cached_json(payload, max_age=0):
+    """
+    JSON response that clients can revalidate with If-None-Match
+
+    The ETag is a hash of the body, so identical results (seeded picks,
+    pure catalog queries) give the same tag and a 304 with no body.
+
+    Args:
+        payload: JSON-serializable response data
+        max_age: Seconds the client may reuse it without asking (0 means
+            always revalidate)
+
+    Returns:
+        Flask response (status 304 if the client's copy is current)
+    """
+    response = jsonify(payload)
+    response.add_etag()
+    # Responses are per user (login required, seeded per user)
+    _cache_headers(response, max_age, private=True)
+    return response.make_conditional(request)
+
+
+class ResponseCache:
+    """
+    Bounded LRU cache of rendered responses
+
+    Keys are the endpoint, its arguments, the catalog version and, for
+    per-user endpoints, the user and day. Values are the encoded body with
+    its ETag, so a hit skips both the query and jsonify/render_template.
+    Memory is bounded by total body bytes rather than entry count; the
+    whole cache is dropped when the catalog version changes.
+    """
+
+    def __init__(self, catalog, max_bytes=8 * 1024 * 1024):
+        self.catalog = catalog
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._version = catalog.version
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._endpoints = {}
+
+    def _key(self, per_user):
+        args = tuple(sorted(request.args.items(multi=True)))
+        view_args = tuple(sorted((request.view_args or {}).items()))
+        user = (g.get("username"), today_key()) if per_user else None
+        return (request.endpoint, view_args, args, user, self.catalog.version)
+
+    def get(self, key):
+        """Cached (body, etag, mimetype, status, size) or None"""
+        with self._lock:
+            if self._version != self.catalog.version:
+                self._entries.clear()
+                self._bytes = 0
+                self._version = self.catalog.version
+                self.invalidations += 1
+            counters = self._endpoints.setdefault(key[0], [0, 0])
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                counters[0] += 1
+                return entry
+            self.misses += 1
+            counters[1] += 1
+            return None
+
+    def put(self, key, entry):
+        """Store an entry, evicting least recently used ones over the byte budget"""
+        size = len(entry[0]) + len(repr(key)) + _ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[4]
+            self._entries[key] = entry + (size,)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted[4]
+                self.evictions += 1
+
+    def cached(self, max_age=0, per_user=False, private=True):
+        """
+        Decorator caching a view's 200 responses
+
+        Apply it below the login decorators so g.username is set.
+
+        Args:
+            max_age: Cache-Control max-age in seconds (0: always revalidate)
+            per_user: Key on the logged-in user and day (for seeded or
+                user-specific results)
+            private: Keep shared proxies from storing the response
+
+        Cached or not, responses get an ETag and a matching If-None-Match
+        gets a 304.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapped(*args, **kwargs):
+                key = self._key(per_user)
+                entry = self.get(key)
+                if entry is None:
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+                    body = response.get_data()
+                    etag = hashlib.sha1(body).hexdigest()
+                    self.put(key, (body, etag, response.mimetype, response.status_code))
+                    cache_status = "MISS"
+                else:
+                    body, etag, mimetype, status, _ = entry
+                    response = current_app.response_class(body, status=status, mimetype=mimetype)
+                    cache_status = "HIT"
+
+                response.set_etag(etag)
+                response.headers["X-Cache"] = cache_status
+                _cache_headers(response, max_age, private)
+                response = response.make_conditional(request)
+                if response.status_code == 304:
+                    with self._lock:
+                        self.not_modified += 1
+                return response
+            return wrapped
+        return decorator
+
+    def clear(self):
+        """Drop every cached response"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Hit/miss/eviction counters, memory use and per-endpoint hit rates"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "not_modified": self.not_modified,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "endpoints": {
+                    endpoint: {
+                        "hits": hits,
+                        "misses": misses,
+                        "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+                    }
+                    for endpoint, (hits, misses) in sorted(self._endpoints.items())
+                },
+            }
+
+
+# Global instance
+response_cache = ResponseCache(food_catalog)
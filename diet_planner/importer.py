@@ -0,0 +1,402 @@
+"""
+Food Importer
+Streams CSV, JSON and NDJSON food datasets into the catalog with validation and de-duplication
+
+Usage:
+    python -m diet_planner.importer FILE [FILE ...] [--format csv|json|ndjson]
+        [--output foods.ndjson] [--graph foods.graph]
+"""
+
+import argparse
+import csv
+import json
+import math
+import sys
+import time
+
+from diet_planner.food_tags import tag_names
+
+# Accepted column names (lowercased) for each catalog field
+FIELD_ALIASES = {
+    "name": ("name", "food", "food_name", "description", "item"),
+    "calories": ("calories", "kcal", "energy", "energy_kcal", "calories_kcal"),
+    "p": ("p", "protein", "protein_g"),
+    "c": ("c", "carbs", "carbohydrate", "carbohydrates", "carbohydrate_g", "carbs_g"),
+    "f": ("f", "fat", "fats", "total_fat", "fat_g", "total_lipid"),
+    "category": ("category", "food_category", "group", "food_group"),
+    "healthy": ("healthy", "is_healthy"),
+    "tags": ("tags", "allergens"),
+}
+
+# Energy per gram of protein, carbs and fat, for rows without calories
+MACRO_KCAL = {"p": 4, "c": 4, "f": 9}
+
+# Plausibility limits for one serving
+MAX_CALORIES = 5000
+MAX_MACRO_GRAMS = 1000
+
+_TRUE_STRINGS = {"1", "true", "yes", "y", "t"}
+
+# Characters read at a time from JSON array files, and the largest
+# single object accepted (guards against unbounded buffering)
+JSON_CHUNK = 1 << 20
+MAX_JSON_OBJECT = 64 * JSON_CHUNK
+
+FORMATS = ("csv", "json", "ndjson")
+
+_MISSING = object()
+
+
+class InvalidFood(ValueError):
+    """A source row that cannot become a catalog food"""
+
+
+# --- Parsing ---
+def detect_format(path):
+    """Format from a file extension (.csv, .json, .ndjson/.jsonl)"""
+    lowered = path.lower()
+    if lowered.endswith(".csv"):
+        return "csv"
+    if lowered.endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    if lowered.endswith(".json"):
+        return "json"
+    raise ValueError(f"Cannot tell the format of {path}; pass --format")
+
+
+def _read_csv(stream):
+    yield from csv.DictReader(stream)
+
+
+def _read_ndjson(stream):
+    for line_no, line in enumerate(stream, 1):
+        line = line.strip()
+        if line:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as exc:
+                yield InvalidFood(f"line {line_no}: {exc.msg}")
+
+
+def _read_json_array(stream, chunk_size=JSON_CHUNK):
+    """
+    Objects of a top-level JSON array, decoded one at a time
+
+    The buffer only ever holds the unread tail of the current chunk plus
+    one object, so arbitrarily large arrays stream in bounded memory.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    started = eof = False
+    while True:
+        # Skip whitespace and separators up to the next value
+        while position < len(buffer) and buffer[position] in " \t\r\n,":
+            position += 1
+        if not started and position < len(buffer):
+            if buffer[position] != "[":
+                raise ValueError("JSON input must be an array of food objects")
+            started = True
+            position += 1
+            continue
+        if started and position < len(buffer) and buffer[position] == "]":
+            return
+        if position < len(buffer):
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                item = _MISSING
+            if item is not _MISSING and (end < len(buffer) or eof):
+                yield item
+                position = end
+                continue
+        if eof:
+            if started:
+                raise ValueError("Unterminated JSON array")
+            return
+        if len(buffer) - position > MAX_JSON_OBJECT:
+            raise ValueError("JSON object too large or malformed")
+        chunk = stream.read(chunk_size)
+        eof = not chunk
+        buffer = buffer[position:] + chunk
+        position = 0
+
+
+_READERS = {"csv": _read_csv, "json": _read_json_array, "ndjson": _read_ndjson}
+
+
+def read_records(stream, fmt):
+    """
+    Raw records from a text stream
+
+    Yields dicts (or InvalidFood for undecodable lines) without reading
+    the whole input.
+    """
+    if fmt not in _READERS:
+        raise ValueError(f"Unknown format {fmt!r}; expected one of {', '.join(FORMATS)}")
+    return _READERS[fmt](stream)
+
+
+# --- Validation ---
+_columns_cache = {}
+
+
+def _columns(keys):
+    """
+    {field: source key} for a record's keys
+
+    Resolved once per distinct key tuple (i.e. once per CSV header or
+    JSON shape), so rows are read with plain lookups.
+    """
+    columns = _columns_cache.get(keys)
+    if columns is None:
+        lowered = {str(key).strip().lower(): key for key in keys}
+        columns = {
+            field: [lowered[alias] for alias in aliases if alias in lowered]
+            for field, aliases in FIELD_ALIASES.items()
+        }
+        if len(_columns_cache) < 256:
+            _columns_cache[keys] = columns
+    return columns
+
+
+def _field(record, keys):
+    for key in keys:
+        value = record[key]
+        if value is not None and value != "":
+            return value
+    return None
+
+
+def _number(record, keys, field):
+    value = _field(record, keys)
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.strip().lower().removesuffix("kcal").removesuffix("g").strip().replace(",", "")
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise InvalidFood(f"{field} is not a number: {value!r}")
+    if not math.isfinite(number) or number < 0:
+        raise InvalidFood(f"{field} out of range: {value!r}")
+    return number
+
+
+def normalize_food(record):
+    """
+    Catalog food dict from a raw record
+
+    Column names are matched case-insensitively against FIELD_ALIASES.
+    Missing macros count as 0, and missing calories are derived from
+    the macros (4/4/9 kcal per gram). Values are rounded to 0.1.
+
+    Raises:
+        InvalidFood: If the record has no name, has unusable numbers, or
+            has neither calories nor macros
+    """
+    if not isinstance(record, dict):
+        raise InvalidFood("record is not an object")
+    columns = _columns(tuple(record))
+
+    name = _field(record, columns["name"])
+    name = " ".join(str(name).split()) if name is not None else ""
+    if not name:
+        raise InvalidFood("missing name")
+
+    macros = {field: _number(record, columns[field], field) for field in MACRO_KCAL}
+    calories = _number(record, columns["calories"], "calories")
+    if calories is None:
+        if all(value is None for value in macros.values()):
+            raise InvalidFood(f"{name}: no calories or macros")
+        calories = sum(MACRO_KCAL[field] * (value or 0) for field, value in macros.items())
+    if calories > MAX_CALORIES or any((value or 0) > MAX_MACRO_GRAMS for value in macros.values()):
+        raise InvalidFood(f"{name}: implausible serving size")
+
+    category = _field(record, columns["category"])
+    healthy = _field(record, columns["healthy"])
+    if isinstance(healthy, str):
+        healthy = healthy.strip().lower() in _TRUE_STRINGS
+
+    food = {"name": name, "calories": round(calories, 1)}
+    food.update((field, round(value or 0, 1)) for field, value in macros.items())
+    food["category"] = " ".join(str(category).split()) if category else "Other"
+    food["healthy"] = bool(healthy)
+    tags = _field(record, columns["tags"])
+    if tags is not None:
+        # Explicit tags (list or "a,b" string) replace the name-based rules
+        food["tags"] = tags
+    return food
+
+
+# --- Import ---
+class ImportReport:
+    """Counters for one import run"""
+
+    ERROR_SAMPLES = 10
+
+    def __init__(self):
+        self.read = 0
+        self.imported = 0
+        self.duplicates = 0
+        self.invalid = 0
+        self.errors = []
+        self.started = time.perf_counter()
+        self.seconds = 0.0
+
+    def reject(self, reason):
+        self.invalid += 1
+        if len(self.errors) < self.ERROR_SAMPLES:
+            self.errors.append(f"row {self.read}: {reason}")
+
+    def finish(self):
+        self.seconds = time.perf_counter() - self.started
+        return self
+
+    @property
+    def rows_per_sec(self):
+        elapsed = self.seconds or (time.perf_counter() - self.started)
+        return self.read / elapsed if elapsed else 0.0
+
+    def as_dict(self):
+        return {
+            "read": self.read,
+            "imported": self.imported,
+            "duplicates": self.duplicates,
+            "invalid": self.invalid,
+            "errors": list(self.errors),
+            "seconds": round(self.seconds, 3),
+            "rows_per_sec": round(self.rows_per_sec),
+        }
+
+    def __str__(self):
+        return (f"{self.read} rows read, {self.imported} imported, {self.duplicates} duplicates, "
+                f"{self.invalid} invalid in {self.seconds:.2f}s ({self.rows_per_sec:,.0f} rows/s)")
+
+
+def _valid_foods(records, catalog, report):
+    """
+    Normalized foods not already in the catalog
+
+    The catalog appends each food before the next is pulled, so checking
+    it also catches duplicates within the file without a separate set.
+    """
+    for record in records:
+        report.read += 1
+        try:
+            if isinstance(record, InvalidFood):
+                raise record
+            food = normalize_food(record)
+        except InvalidFood as exc:
+            report.reject(exc)
+            continue
+        if catalog.contains_name(food["name"]):
+            report.duplicates += 1
+            continue
+        yield food
+
+
+def import_foods(source, catalog=None, fmt=None, batch_size=10000, progress=None):
+    """
+    Stream foods from a file into the catalog
+
+    Rows are validated and normalized as they are read, foods whose
+    normalized name is already in the catalog (or earlier in the file)
+    are skipped, and the calorie index is sorted once at the end.
+
+    Args:
+        source: Path or open text stream
+        catalog: Target FoodCatalog (default the app's food_catalog)
+        fmt: "csv", "json" or "ndjson" (default: from the file extension)
+        batch_size: Rows appended between progress callbacks
+        progress: Optional callable(report) run after every batch
+
+    Returns:
+        ImportReport
+    """
+    if catalog is None:
+        from diet_planner.food_data import food_catalog as catalog
+
+    if isinstance(source, (str, bytes)) or hasattr(source, "__fspath__"):
+        path = str(source)
+        fmt = fmt or detect_format(path)
+        with open(path, newline="", encoding="utf-8-sig") as stream:
+            return import_foods(stream, catalog, fmt, batch_size, progress)
+    if fmt is None:
+        raise ValueError("fmt is required when importing from a stream")
+
+    report = ImportReport()
+    foods = _valid_foods(read_records(source, fmt), catalog, report)
+    try:
+        while True:
+            appended = catalog.extend(_take(foods, batch_size), reindex=False)
+            report.imported += appended
+            if progress is not None:
+                progress(report)
+            if not appended:
+                break
+    finally:
+        # Index everything appended, even if the input ended in an error
+        catalog.reindex()
+    return report.finish()
+
+
+def _take(iterator, count):
+    for _, item in zip(range(count), iterator):
+        yield item
+
+
+def write_ndjson(catalog, path, start=0):
+    """Write catalog rows from `start` on as NDJSON (the importer's own format)"""
+    with open(path, "w", encoding="utf-8") as out:
+        for food_id in range(start, len(catalog)):
+            # Tags are written out so a reload does not have to derive them again
+            food = {**catalog.row(food_id), "tags": tag_names(catalog.tags[food_id])}
+            out.write(json.dumps(food) + "\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import foods into the diet planner catalog")
+    parser.add_argument("files", nargs="+", help="CSV, JSON array or NDJSON files")
+    parser.add_argument("--format", choices=FORMATS, help="Input format (default: from extension)")
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--output", help="Write the imported foods as NDJSON (for DIET_PLANNER_FOODS)")
+    parser.add_argument("--graph", help="Also prebuild the alternatives graph (for DIET_PLANNER_FOODS_GRAPH)")
+    args = parser.parse_args(argv)
+
+    from diet_planner.food_data import food_catalog
+
+    def progress(report):
+        sys.stderr.write(f"\r{report.read:,} rows ({report.rows_per_sec:,.0f} rows/s)")
+        sys.stderr.flush()
+
+    first_new = len(food_catalog)
+    failed = False
+    for path in args.files:
+        try:
+            report = import_foods(path, food_catalog, args.format, args.batch_size, progress)
+        except (OSError, ValueError, csv.Error) as exc:
+            sys.stderr.write(f"\n{path}: {exc}\n")
+            failed = True
+            continue
+        sys.stderr.write("\n")
+        print(f"{path}: {report}")
+        for error in report.errors:
+            print(f"  {error}")
+
+    if args.output:
+        write_ndjson(food_catalog, args.output, first_new)
+        print(f"Wrote {len(food_catalog) - first_new} foods to {args.output}")
+    if args.graph:
+        from diet_planner.alternatives import alternatives_graph
+        started = time.perf_counter()
+        alternatives_graph.build()
+        alternatives_graph.save(args.graph)
+        print(f"Built alternatives graph for {len(food_catalog)} foods in {time.perf_counter() - started:.2f}s")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
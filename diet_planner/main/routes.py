@@ -1,17 +1,20 @@
-from flask import Blueprint, render_template, request, redirect, url_for
+from flask import Blueprint, render_template, request, redirect, url_for, g
+from diet_planner.auth.decorators import login_required
 from diet_planner.data_store import user_manager
-from diet_planner.food_data import get_diet_plan
+from diet_planner.energy import energy_calculator
+from diet_planner.exercise_data import DEFAULT_WEIGHT, burned, exercise_catalog, recompute_burns
+from diet_planner.plan_store import daily_plan, profile_view
+from diet_planner.storage import today_key
 
 main = Blueprint('main', __name__)
 
 @main.route("/", methods=["GET", "POST"])
+@login_required
 def index():
-    if not user_manager.current_user:
-        return redirect(url_for('auth.login'))
-        
-    user_data = user_manager.get_user_data()
+    user_data = user_manager.get_user_data(g.username, with_logs=False)
     profile = user_data['profile']
-    food_log = user_data['diet_log']
+    today = today_key()
+    food_log = user_manager.get_day_log(g.username, 'diet_log', today)
     
     if request.method == "POST":
         # Handle Profile Creation
@@ -25,38 +28,8 @@ def index():
         diet_pref = request.form.get("diet_pref", "non-veg")
         goal = request.form.get("goal", "maintain") # loss, gain, maintain
 
-        # Calculate BMR (Mifflin-St Jeor Equation)
-        if gender == "male":
-            bmr = 10 * weight + 6.25 * height - 5 * age + 5
-        else:
-            bmr = 10 * weight + 6.25 * height - 5 * age - 161
-            
-        # Activity Multiplier
-        activity_multipliers = {
-            "sedentary": 1.2,
-            "light": 1.375,
-            "moderate": 1.55,
-            "active": 1.725,
-            "very_active": 1.9
-        }
-        
-        tdee = bmr * activity_multipliers.get(activity, 1.2)
-        
-        # Goal Adjustment
-        if goal == "loss":
-            tdee -= 500
-        elif goal == "gain":
-            tdee += 500
-            
-        # Auto-generate Diet Plan
-        generated_plan = get_diet_plan(tdee)
-        
-        # Macros Calculation (Simple Split: 50% C, 30% P, 20% F)
-        macros = {
-            "carbs": int((tdee * 0.50) / 4),
-            "protein": int((tdee * 0.30) / 4),
-            "fats": int((tdee * 0.20) / 9)
-        }
+        body_fat = request.form.get("body_fat")
+        body_fat = float(body_fat) if body_fat else None
 
         new_profile = {
             "age": age,
@@ -66,47 +39,55 @@ def index():
             "activity": activity,
             "diet_pref": diet_pref,
             "goal": goal,
-            "bmr": int(bmr),
-            "tdee": int(tdee),
-            "macros": macros,
-            "diet_plan": generated_plan
         }
+        if body_fat is not None:
+            new_profile["body_fat"] = body_fat
+
+        # BMR, TDEE and macro targets from the shared calculator (formula set in create_app)
+        energy = energy_calculator.compute(new_profile, rounded=False)
+        new_profile["bmr"] = int(energy["bmr"])
+        new_profile["tdee"] = int(energy["tdee"])
+        new_profile["macros"] = energy["macros"]
+
+        # Auto-generate Diet Plan (stored as food ids, hydrated when rendered)
+        new_profile["diet_plan"] = daily_plan(energy["tdee"])
         
-        user_manager.update_profile(user_manager.current_user, new_profile)
+        user_manager.update_profile(g.username, new_profile)
+        # Past sessions were computed with the old weight
+        if weight != (profile or {}).get('weight', DEFAULT_WEIGHT):
+            recompute_burns(user_manager, g.username, weight)
         return redirect(url_for("main.index"))
 
-    # Calculate totals
-    total_calories = sum(item['calories'] for item in food_log)
+    # Today's totals come from running aggregates, not a pass over the logs
+    totals = user_manager.get_daily_totals(g.username, today)
+    total_calories = totals['calories']
     remaining_calories = profile.get('tdee', 0) - total_calories if profile else 0
     
-    water_count = user_data.get('water_log', {}).get('today', 0)
+    water_count = user_manager.get_counter(g.username, 'water_log', today)
     
-    fitness_log = user_data.get('fitness_log', [])
-    steps_count = user_data.get('step_log', {}).get('today', 0)
-    calories_burned = sum(item['calories_burned'] for item in fitness_log)
+    fitness_log = user_manager.get_day_log(g.username, 'fitness_log', today)
+    steps_count = user_manager.get_counter(g.username, 'step_log', today)
+    calories_burned = totals['burned']
     
     # Steps rough estimate: 0.04 cal per step
     calories_burned += int(steps_count * 0.04)
 
-    return render_template("index.html", profile=profile, food_log=food_log, 
+    return render_template("index.html", profile=profile_view(profile), food_log=food_log, 
                            total_calories=total_calories, remaining_calories=remaining_calories, 
-                           water_count=water_count, user=user_manager.current_user,
-                           fitness_log=fitness_log, steps_count=steps_count, calories_burned=calories_burned)
+                           water_count=water_count, user=g.username,
+                           fitness_log=fitness_log, steps_count=steps_count, calories_burned=calories_burned,
+                           activity_names=exercise_catalog.names)
 
 @main.route("/add_food", methods=["POST"])
+@login_required
 def add_food():
-    if not user_manager.current_user:
-        return redirect(url_for('auth.login'))
-        
     name = request.form.get("food_name")
     calories = int(request.form.get("calories"))
     meal_type = request.form.get("meal_type", "snack") # breakfast, lunch, dinner, snack
     
-    # Simple macro lookup (mock) or estimate
-    # In a real app we'd lookup 'name' in food_database
-    # For now, let's just default to some values if not found or allow manual input eventually
-    from diet_planner.food_data import food_database
-    found_food = next((f for f in food_database if f['name'].lower() == name.lower()), None)
+    # Look up macros by name/alias; unknown foods are logged without macros
+    from diet_planner.food_data import food_catalog
+    found_food = food_catalog.get_by_name(name)
     
     macros = {"p": 0, "c": 0, "f": 0}
     if found_food:
@@ -120,41 +101,33 @@ def add_food():
         "name": name, 
         "calories": calories,
         "meal_type": meal_type,
-        "macros": macros
+        "macros": macros,
+        "date": today_key()
     }
     
-    user_manager.get_user_data()['diet_log'].append(item)
+    user_manager.add_log_entry(g.username, 'diet_log', item)
     return redirect(url_for("main.index"))
 
 @main.route("/add_water")
+@login_required
 def add_water():
-    if not user_manager.current_user:
-        return redirect(url_for('auth.login'))
-    
-    user_data = user_manager.get_user_data()
     # Simple integer counter for today
-    current = user_data.get('water_log', {}).get('today', 0)
-    if 'water_log' not in user_data: user_data['water_log'] = {}
-    
-    user_data['water_log']['today'] = current + 1
+    user_manager.increment_counter(g.username, 'water_log', today_key())
     return redirect(url_for("main.index"))
 
 @main.route("/add_exercise", methods=["POST"])
+@login_required
 def add_exercise():
-    if not user_manager.current_user:
-        return redirect(url_for('auth.login'))
-        
     name = request.form.get("exercise_name")
     category = request.form.get("category")
     duration = int(request.form.get("duration"))
     
-    # Simple Calorie Burn Estimate (METs approx)
-    # Cardio: 8, Strength: 5, Yoga: 3
-    mets = {"cardio": 8, "strength": 5, "yoga": 3}
-    user_weight = user_manager.get_user_data()['profile'].get('weight', 70)
+    # MET from the compendium by name, else the category's typical value
+    met = exercise_catalog.met_for(name, category)
+    user_weight = user_manager.get_user_data(g.username, with_logs=False)['profile'].get('weight', DEFAULT_WEIGHT)
     
     # Formula: Calories = MET * Weight(kg) * Time(hours)
-    burned = int(mets.get(category, 5) * user_weight * (duration/60))
+    calories_burned = burned(met, user_weight, duration)
 
     import uuid
     item_id = str(uuid.uuid4())[:8]
@@ -164,52 +137,46 @@ def add_exercise():
         "name": name,
         "category": category,
         "duration": duration,
-        "calories_burned": burned
+        "met": met,
+        "calories_burned": calories_burned,
+        "date": today_key()
     }
     
-    user_manager.get_user_data()['fitness_log'].append(item)
+    user_manager.add_log_entry(g.username, 'fitness_log', item)
     return redirect(url_for("main.index"))
 
 @main.route("/add_steps", methods=["POST"])
+@login_required
 def add_steps():
-    if not user_manager.current_user:
-        return redirect(url_for('auth.login'))
-        
     steps = int(request.form.get("steps"))
-    user_manager.get_user_data()['step_log']['today'] = steps
+    user_manager.set_counter(g.username, 'step_log', today_key(), steps)
     return redirect(url_for("main.index"))
 
 @main.route("/delete_food/<food_id>")
+@login_required
 def delete_food(food_id):
-    if not user_manager.current_user:
-        return redirect(url_for('auth.login'))
-        
-    log = user_manager.get_user_data()['diet_log']
-    # Filter in place or reassign
-    user_manager.get_user_data()['diet_log'] = [item for item in log if item.get('id') != food_id]
+    user_manager.delete_log_entry(g.username, 'diet_log', food_id)
     return redirect(url_for("main.index"))
 
 @main.route("/edit_food/<food_id>", methods=["GET", "POST"])
+@login_required
 def edit_food(food_id):
-    if not user_manager.current_user:
-        return redirect(url_for('auth.login'))
-
-    log = user_manager.get_user_data()['diet_log']
-    item = next((i for i in log if i.get('id') == food_id), None)
+    item = user_manager.get_log_entry(g.username, 'diet_log', food_id)
     if not item:
         return redirect(url_for("main.index"))
         
     if request.method == "POST":
-        item['name'] = request.form.get("food_name")
-        item['calories'] = int(request.form.get("calories"))
+        user_manager.update_log_entry(g.username, 'diet_log', food_id, {
+            'name': request.form.get("food_name"),
+            'calories': int(request.form.get("calories"))
+        })
         return redirect(url_for("main.index"))
         
     return render_template("edit_food.html", item=item)
 
 @main.route("/reset")
+@login_required
 def reset():
-    if not user_manager.current_user:
-        return redirect(url_for('auth.login'))
-    user_manager.update_profile(user_manager.current_user, {})
-    user_manager.get_user_data()['diet_log'] = []
+    user_manager.update_profile(g.username, {})
+    user_manager.clear_log(g.username, 'diet_log')
     return redirect(url_for("main.index"))
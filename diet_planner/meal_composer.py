@@ -0,0 +1,251 @@
+"""
+Meal Composition Engine
+Chooses several foods with serving multipliers so a meal hits calorie and macro targets
+"""
+
+import heapq
+import time
+
+from diet_planner.food_data import food_catalog
+
+# Serving multipliers tried for each food (ascending, used for pruning)
+SERVING_STEPS = (0.5, 1.0, 1.5, 2.0)
+
+# Allowed relative deviation per target before a meal counts as a hit
+DEFAULT_TOLERANCES = {"calories": 0.05, "protein": 0.15, "carbs": 0.15, "fats": 0.20}
+
+# Relative weight of each deviation in the objective
+ERROR_WEIGHTS = (2.0, 1.0, 1.0, 1.0)
+
+NUTRIENTS = ("calories", "protein", "carbs", "fats")
+
+
+class _OutOfTime(Exception):
+    """Raised inside the search when the node or time budget is spent"""
+
+
+class MealComposer:
+    """
+    Branch-and-bound meal composer
+
+    A bounded pool of candidate foods is drawn from a CalorieIndex around the
+    meal's calorie target and ranked by how well each food's macro split
+    matches the target split. A depth-first search then tries up to
+    max_items foods, each at one of SERVING_STEPS, minimising the weighted
+    relative deviation from the targets. Because totals only grow as foods
+    are added, the overshoot already accumulated is a lower bound used to
+    prune branches. The search stops as soon as every target is within
+    tolerance, after max_nodes search nodes, or when the time budget runs
+    out, returning the best meal found. The node limit keeps results
+    reproducible; the time budget only guards latency on slow hosts.
+    """
+
+    def __init__(self, catalog=None, max_items=3, pool_size=24, scan_size=1500,
+                 servings=SERVING_STEPS, max_nodes=2000, time_budget=0.05):
+        self.catalog = catalog if catalog is not None else food_catalog
+        self.max_items = max_items
+        self.pool_size = pool_size
+        self.scan_size = scan_size
+        self.servings = tuple(sorted(servings))
+        self.max_nodes = max_nodes
+        self.time_budget = time_budget
+
+    @staticmethod
+    def targets_from_split(calories, split):
+        """
+        Gram targets for a meal from its calories and a macro split
+
+        Args:
+            calories: Meal calories
+            split: {carbs, protein, fats} as fractions (0.5) or percents (50)
+        """
+        scale = 100 if sum(split.values()) > 1.5 else 1
+        return {
+            "calories": calories,
+            "protein": calories * split["protein"] / scale / 4,
+            "carbs": calories * split["carbs"] / scale / 4,
+            "fats": calories * split["fats"] / scale / 9,
+        }
+
+    def candidates(self, target, calorie_index=None, exclude=None, size=None):
+        """
+        Candidate row ids ranked by macro-split similarity to the target
+
+        Args:
+            target: {calories, protein, carbs, fats}
+            calorie_index: CalorieIndex of allowed foods (default whole catalog)
+            exclude: Optional set of row ids not to use
+            size: Number of ids to return (default pool_size)
+        """
+        catalog = self.catalog
+        if calorie_index is None:
+            calorie_index = catalog.calorie_index
+        size = self.pool_size if size is None else size
+        target_calories = target["calories"]
+        max_calories = target_calories * (1 + DEFAULT_TOLERANCES["calories"]) / self.servings[0]
+
+        # Bounded scan around a typical per-item share of the meal
+        scan = calorie_index.nearest(target_calories / 2, self.scan_size, skip=exclude)
+        scan = [i for i in scan if 0 < catalog.calories[i] <= max_calories]
+
+        energy = target["protein"] * 4 + target["carbs"] * 4 + target["fats"] * 9
+        if energy <= 0:
+            return scan[:size]
+        shares = (target["protein"] * 4 / energy, target["carbs"] * 4 / energy, target["fats"] * 9 / energy)
+
+        def mismatch(food_id):
+            p, c, f = catalog.p[food_id] * 4, catalog.c[food_id] * 4, catalog.f[food_id] * 9
+            total = p + c + f or 1
+            return abs(p / total - shares[0]) + abs(c / total - shares[1]) + abs(f / total - shares[2])
+
+        return heapq.nsmallest(size, scan, key=mismatch)
+
+    def solve(self, target, calorie_index=None, exclude=None, tolerances=None, time_budget=None, pool=None):
+        """
+        Compose one meal
+
+        Args:
+            target: {calories, protein, carbs, fats}; macros in grams
+            calorie_index: CalorieIndex of allowed foods (default whole catalog)
+            exclude: Optional set of row ids not to use
+            tolerances: Relative tolerance per nutrient (default DEFAULT_TOLERANCES)
+            time_budget: Seconds allowed for the search (default self.time_budget)
+            pool: Optional ranked candidate ids from candidates(), e.g. shared
+                across several solves for the same target
+
+        Returns:
+            Dict with items [(food_id, servings)], nutrient totals, error and
+            within_tolerance, or None if no food could be used
+        """
+        catalog = self.catalog
+        tolerances = {**DEFAULT_TOLERANCES, **(tolerances or {})}
+        budget = self.time_budget if time_budget is None else time_budget
+
+        if pool is None:
+            pool = self.candidates(target, calorie_index, exclude)
+        else:
+            pool = [i for i in pool if not exclude or i not in exclude][:self.pool_size]
+        if not pool:
+            return None
+
+        goal = tuple(float(target.get(n, 0)) for n in NUTRIENTS)
+        scale = tuple(max(g, 1.0) for g in goal)
+        limits = tuple(tolerances[n] * s for n, s in zip(NUTRIENTS, scale))
+        vectors = [
+            (catalog.calories[i], catalog.p[i], catalog.c[i], catalog.f[i])
+            for i in pool
+        ]
+
+        best = {"error": float("inf"), "items": (), "totals": (0.0, 0.0, 0.0, 0.0)}
+        deadline = time.perf_counter() + budget
+        nodes = [0]
+
+        def overshoot(totals):
+            return sum(
+                w * (t - g) / s
+                for w, t, g, s in zip(ERROR_WEIGHTS, totals, goal, scale) if t > g
+            )
+
+        def error(totals):
+            return sum(w * abs(t - g) / s for w, t, g, s in zip(ERROR_WEIGHTS, totals, goal, scale))
+
+        def within(totals):
+            return all(abs(t - g) <= limit for t, g, limit in zip(totals, goal, limits))
+
+        def search(start, chosen, totals):
+            nodes[0] += 1
+            if nodes[0] > self.max_nodes:
+                raise _OutOfTime
+            if nodes[0] & 0xFF == 0 and time.perf_counter() > deadline:
+                raise _OutOfTime
+            if chosen:
+                current = error(totals)
+                if current < best["error"]:
+                    best.update(error=current, items=tuple(chosen), totals=totals)
+                    if within(totals):
+                        return True
+            if len(chosen) == self.max_items:
+                return False
+            for position in range(start, len(pool)):
+                vector = vectors[position]
+                for servings in self.servings:
+                    new_totals = tuple(t + v * servings for t, v in zip(totals, vector))
+                    # Larger servings only overshoot more, so stop at the first prune
+                    if overshoot(new_totals) >= best["error"]:
+                        break
+                    chosen.append((pool[position], servings))
+                    done = search(position + 1, chosen, new_totals)
+                    chosen.pop()
+                    if done:
+                        return True
+            return False
+
+        try:
+            search(0, [], (0.0, 0.0, 0.0, 0.0))
+        except _OutOfTime:
+            pass
+
+        if not best["items"]:
+            return None
+        totals = best["totals"]
+        return {
+            "items": list(best["items"]),
+            "calories": round(totals[0]),
+            "protein": round(totals[1], 1),
+            "carbs": round(totals[2], 1),
+            "fats": round(totals[3], 1),
+            "error": round(best["error"], 4),
+            "within_tolerance": within(totals),
+        }
+
+    def evaluate(self, items):
+        """
+        Nutrient totals for a list of (food_id, servings)
+
+        Sums in the same order and rounds the same way as solve(), so a
+        stored meal re-evaluates to exactly the totals it was solved with.
+        """
+        catalog = self.catalog
+        totals = (0.0, 0.0, 0.0, 0.0)
+        for food_id, servings in items:
+            vector = (catalog.calories[food_id], catalog.p[food_id], catalog.c[food_id], catalog.f[food_id])
+            totals = tuple(t + v * servings for t, v in zip(totals, vector))
+        return {
+            "items": [tuple(item) for item in items],
+            "calories": round(totals[0]),
+            "protein": round(totals[1], 1),
+            "carbs": round(totals[2], 1),
+            "fats": round(totals[3], 1),
+        }
+
+    def as_food(self, solution):
+        """
+        Present a solved meal like a single food dict
+
+        Keeps name/calories/p/c/f/category/healthy so templates and
+        suggestion lookups work unchanged, and lists the parts under 'items'.
+        """
+        catalog = self.catalog
+        items = []
+        for food_id, servings in solution["items"]:
+            food = catalog.row(food_id)
+            food["servings"] = servings
+            items.append(food)
+
+        def label(food):
+            return food["name"] if food["servings"] == 1 else f"{food['name']} x{food['servings']:g}"
+
+        return {
+            "name": " + ".join(label(food) for food in items),
+            "calories": solution["calories"],
+            "p": solution["protein"],
+            "c": solution["carbs"],
+            "f": solution["fats"],
+            "category": items[0]["category"],
+            "healthy": all(food["healthy"] for food in items),
+            "items": items,
+        }
+
+
+# Global instance
+meal_composer = MealComposer()
@@ -3,8 +3,11 @@ Meal Suggestion Engine
 Provides alternative meal suggestions and recommendations for diet plans
 """
 
-from diet_planner.food_data import food_database
-import random
+from diet_planner.alternatives import alternatives_graph
+from diet_planner.food_data import food_database, food_catalog
+from diet_planner.food_search import food_search_index
+from diet_planner.meal_composer import meal_composer
+from diet_planner.sampling import choice, reservoir, sample
 
 
 class MealSuggestions:
@@ -12,8 +15,35 @@ class MealSuggestions:
     
     def __init__(self):
         self.food_db = food_database
+        self.catalog = food_catalog
+        self.graph = alternatives_graph
     
-    def get_alternative_meals(self, current_meal, calorie_range=50, limit=5):
+    def _lookup(self, current_meal, relation, limit, category=None, complete=False):
+        """
+        Precomputed alternatives for a catalog food, or None to fall back
+
+        The graph answers only when the meal is a catalog row with unchanged
+        calories (composed or edited meals are scanned as before) and its
+        stored list is long enough for the requested limit. With `complete`
+        it must also be shorter than its cap, i.e. hold every food in the
+        window rather than only the nearest ones.
+        """
+        name = current_meal.get('name')
+        food_id = self.catalog.find_name(name) if name else None
+        if food_id is None or self.catalog.names[food_id] != name:
+            return None
+        if current_meal.get('calories', 200) != self.catalog.calories[food_id]:
+            return None
+        if category is not None and self.catalog.categories[self.catalog.category_codes[food_id]] != category:
+            return None
+        related = self.graph.related(food_id, relation)
+        # A short list holds every match; a full one only the best `size`
+        full = len(related) == self.graph.sizes[relation]
+        if full and (complete or limit > len(related)):
+            return None
+        return self.catalog.rows(related)
+    
+    def get_alternative_meals(self, current_meal, calorie_range=50, limit=5, rng=None):
         """
         Get alternative meals for a given meal
         
@@ -21,64 +51,85 @@ class MealSuggestions:
             current_meal: Current meal dict with calories
             calorie_range: How many calories range to look for (default ±50)
             limit: Maximum number of suggestions
+            rng: Optional random.Random (e.g. sampling.seeded_rng) for
+                reproducible picks; the global random module otherwise
         
         Returns:
-            List of alternative meal suggestions
+            List of alternative meal suggestions, sampled uniformly from
+            every food in the calorie window
         """
+        if calorie_range == 50:
+            # Only a list that covers the whole window keeps the sample
+            # uniform; a full one would favour the nearest neighbours
+            alternatives = self._lookup(current_meal, "alternatives", limit, complete=True)
+            if alternatives is not None:
+                return sample(alternatives, limit, rng)
+        
         target_calories = current_meal.get('calories', 200)
         min_cal = target_calories - calorie_range
         max_cal = target_calories + calorie_range
         
-        alternatives = [
-            f for f in self.food_db
-            if min_cal <= f['calories'] <= max_cal
-            and f['name'] != current_meal.get('name')
-        ]
+        names = self.catalog.names
+        candidates = (
+            food_id for food_id in self.catalog.where(calories=(min_cal, max_cal))
+            if names[food_id] != current_meal.get('name')
+        )
         
-        # Shuffle and limit
-        random.shuffle(alternatives)
-        return alternatives[:limit]
+        # Random pick without building the filtered list
+        return self.catalog.rows(reservoir(candidates, limit, rng))
     
     def get_healthier_alternatives(self, current_meal, limit=3):
         """Get healthier alternatives for a meal"""
+        related = self._lookup(current_meal, "healthier", limit)
+        if related is not None:
+            return related[:limit]
+        
         target_calories = current_meal.get('calories', 200)
         
         # Look for healthy foods in similar calorie range
-        healthier = [
-            f for f in self.food_db
-            if f['healthy'] and
-            abs(f['calories'] - target_calories) <= 80 and
-            f['name'] != current_meal.get('name')
-        ]
+        candidates = self.catalog.where(
+            healthy=True, calories=(target_calories - 80, target_calories + 80)
+        )
         
         # Sort by closest calorie match
-        healthier.sort(key=lambda x: abs(x['calories'] - target_calories))
+        healthier = [
+            f for f in self.catalog.rows(self.catalog.nearest(target_calories, len(candidates), candidates=candidates))
+            if f['name'] != current_meal.get('name')
+        ]
         return healthier[:limit]
     
     def get_similar_category_meals(self, current_meal, limit=4):
         """Get meals from same category"""
         category = current_meal.get('category', 'Breakfast')
+        related = self._lookup(current_meal, "similar", limit, category=category)
+        if related is not None:
+            return related[:limit]
+        
         target_calories = current_meal.get('calories', 200)
         
-        similar = [
-            f for f in self.food_db
-            if f['category'] == category and
-            f['name'] != current_meal.get('name')
-        ]
+        candidates = self.catalog.where(category=category)
         
         # Sort by calorie proximity
-        similar.sort(key=lambda x: abs(x['calories'] - target_calories))
+        similar = [
+            f for f in self.catalog.rows(self.catalog.nearest(target_calories, len(candidates), candidates=candidates))
+            if f['name'] != current_meal.get('name')
+        ]
         return similar[:limit]
     
     def get_protein_boosted_meals(self, current_meal, limit=3):
         """Get high-protein alternatives"""
+        related = self._lookup(current_meal, "protein", limit)
+        if related is not None:
+            return related[:limit]
+        
         target_calories = current_meal.get('calories', 200)
         
         high_protein = [
-            f for f in self.food_db
-            if f['p'] >= 20 and  # High protein
-            abs(f['calories'] - target_calories) <= 100 and
-            f['name'] != current_meal.get('name')
+            f for f in self.catalog.rows(self.catalog.where(
+                p=(20, None),  # High protein
+                calories=(target_calories - 100, target_calories + 100)
+            ))
+            if f['name'] != current_meal.get('name')
         ]
         
         # Sort by protein content (descending)
@@ -87,106 +138,97 @@ class MealSuggestions:
     
     def get_low_carb_meals(self, current_meal, limit=3):
         """Get low-carb alternatives"""
+        related = self._lookup(current_meal, "low_carb", limit)
+        if related is not None:
+            return related[:limit]
+        
         target_calories = current_meal.get('calories', 200)
         
         low_carb = [
-            f for f in self.food_db
-            if f['c'] <= 15 and  # Low carbs
-            abs(f['calories'] - target_calories) <= 100 and
-            f['name'] != current_meal.get('name')
+            f for f in self.catalog.rows(self.catalog.where(
+                c=(None, 15),  # Low carbs
+                calories=(target_calories - 100, target_calories + 100)
+            ))
+            if f['name'] != current_meal.get('name')
         ]
         
         low_carb.sort(key=lambda x: x['c'])
         return low_carb[:limit]
     
-    def get_combo_meal_suggestions(self, target_calories, macro_target):
+    def get_combo_meal_suggestions(self, target_calories, macro_target, limit=3):
         """
         Suggest food combinations for a meal to hit macro targets
         
         Args:
             target_calories: Total calories for the meal
             macro_target: Dict with target macros {carbs: %, protein: %, fats: %}
+            limit: Maximum number of combinations
         
         Returns:
             List of meal combinations
         """
         combinations = []
+        target = meal_composer.targets_from_split(target_calories, macro_target)
         
-        # Try different food combinations
-        for i, main_food in enumerate(self.food_db[:20]):  # Sample main foods
-            remaining_cal = target_calories - main_food['calories']
-            if remaining_cal < 0:
-                continue
-            
-            # Find a side dish to complement
-            for side_food in self.food_db[20:40]:
-                if abs((main_food['calories'] + side_food['calories']) - target_calories) < 50:
-                    combo = {
-                        'main': main_food,
-                        'side': side_food,
-                        'total_calories': main_food['calories'] + side_food['calories'],
-                        'total_protein': main_food['p'] + side_food['p'],
-                        'total_carbs': main_food['c'] + side_food['c'],
-                        'total_fats': main_food['f'] + side_food['f']
-                    }
-                    combinations.append(combo)
-            
-            if len(combinations) >= 3:
+        # Each further combination leaves out the previous one's lead food
+        excluded = set()
+        for _ in range(limit):
+            solution = meal_composer.solve(target, exclude=excluded)
+            if not solution:
                 break
+            meal = meal_composer.as_food(solution)
+            combinations.append({
+                'items': meal['items'],
+                'total_calories': solution['calories'],
+                'total_protein': solution['protein'],
+                'total_carbs': solution['carbs'],
+                'total_fats': solution['fats']
+            })
+            excluded.add(solution['items'][0][0])
         
         return combinations
     
-    def get_daily_suggestions(self, breakfast, lunch, dinner, snack, tdee):
+    def get_daily_suggestions(self, breakfast, lunch, dinner, snack, tdee, rng=None):
         """
         Get suggestions for each meal along with the plan
         
+        Args:
+            rng: Optional random.Random for reproducible alternatives
+        
         Returns:
             Dict with suggestions for each meal
         """
         suggestions = {
-            'breakfast_alternatives': self.get_alternative_meals(breakfast, limit=3),
+            'breakfast_alternatives': self.get_alternative_meals(breakfast, limit=3, rng=rng),
             'breakfast_healthier': self.get_healthier_alternatives(breakfast, limit=2),
-            'lunch_alternatives': self.get_alternative_meals(lunch, limit=3),
+            'lunch_alternatives': self.get_alternative_meals(lunch, limit=3, rng=rng),
             'lunch_high_protein': self.get_protein_boosted_meals(lunch, limit=2),
-            'dinner_alternatives': self.get_alternative_meals(dinner, limit=3),
+            'dinner_alternatives': self.get_alternative_meals(dinner, limit=3, rng=rng),
             'dinner_low_carb': self.get_low_carb_meals(dinner, limit=2),
-            'snack_alternatives': self.get_alternative_meals(snack, limit=3),
+            'snack_alternatives': self.get_alternative_meals(snack, limit=3, rng=rng),
         }
         
         return suggestions
     
-    def get_random_healthy_meal(self):
+    def get_random_healthy_meal(self, rng=None):
         """Get a random healthy meal suggestion"""
-        healthy_foods = [f for f in self.food_db if f['healthy']]
-        return random.choice(healthy_foods) if healthy_foods else None
+        food_id = choice(self.catalog.where(healthy=True), rng)
+        return None if food_id is None else self.catalog.row(food_id)
     
     def search_meals(self, query, limit=5):
-        """Search for meals by name"""
-        query_lower = query.lower()
-        results = [
-            f for f in self.food_db
-            if query_lower in f['name'].lower()
-        ]
-        return results[:limit]
+        """Search for meals by name (prefix, typo-tolerant, ranked)"""
+        return food_search_index.search(query, limit=limit)
     
-    def get_meals_by_calories(self, min_cal, max_cal, limit=5):
-        """Get meals within a calorie range"""
-        meals = [
-            f for f in self.food_db
-            if min_cal <= f['calories'] <= max_cal
-        ]
-        random.shuffle(meals)
-        return meals[:limit]
+    def get_meals_by_calories(self, min_cal, max_cal, limit=5, rng=None):
+        """Get meals within a calorie range (random pick, seeded if rng is given)"""
+        return self.catalog.rows(sample(self.catalog.where(calories=(min_cal, max_cal)), limit, rng))
     
     def get_meals_by_protein(self, min_protein, max_protein=None, limit=5):
         """Get meals by protein content"""
         if max_protein is None:
             max_protein = 100
         
-        meals = [
-            f for f in self.food_db
-            if min_protein <= f['p'] <= max_protein
-        ]
+        meals = self.catalog.rows(self.catalog.where(p=(min_protein, max_protein)))
         
         meals.sort(key=lambda x: x['p'], reverse=True)
         return meals[:limit]
@@ -0,0 +1,275 @@
+"""
+Plan Storage
+Compact food-id plan representation with lazy hydration for templates
+"""
+
+from collections.abc import Mapping
+from itertools import repeat
+import copy
+
+from diet_planner.food_catalog import normalize_name
+from diet_planner.food_data import food_catalog, get_diet_plan_ids
+from diet_planner.meal_composer import meal_composer
+
+# Marks a stored plan as compact: food-id references instead of food dicts,
+# plus "keys": {str(food_id): normalized name} so every reference can be
+# checked against the catalog it is hydrated from
+PLAN_FORMAT = 3
+
+# Profile plan from get_diet_plan: {meal: [foods], total_calories}
+DAILY = "daily"
+# Customizer plan: {meals: {meal: food}, total_calories, macros, macro_split}
+CUSTOM = "custom"
+
+_INTERNAL_KEYS = ("format", "layout", "meals", "keys")
+
+
+def is_compact(plan):
+    """Whether a stored plan uses food-id references"""
+    return isinstance(plan, Mapping) and plan.get("format") == PLAN_FORMAT
+
+
+def _ref_ids(layout, ref):
+    """Row ids referenced by one stored meal"""
+    if layout == DAILY:
+        return ref
+    if ref is None:
+        return []
+    if "food" in ref:
+        return [ref["food"]]
+    return [food_id for food_id, _ in ref["items"]]
+
+
+def food_keys(layout, meals):
+    """{str(food_id): normalized name} for every food a plan references"""
+    return {
+        str(food_id): normalize_name(food_catalog.names[food_id])
+        for ref in meals.values() for food_id in _ref_ids(layout, ref)
+    }
+
+
+def resolve_food(food_id, keys):
+    """
+    Current row id for a stored food reference
+
+    Row ids are positions in the catalog, so an id stored before foods
+    were removed or reordered can point at a different food. The id is
+    trusted only if the food there still has the stored name; otherwise
+    the food is looked up by that exact name.
+
+    Args:
+        food_id: Stored row id
+        keys: The plan's {str(food_id): normalized name}
+
+    Returns:
+        Row id, or None if the food is no longer in the catalog
+    """
+    key = keys.get(str(food_id))
+    if key is None:
+        return None
+    if 0 <= food_id < len(food_catalog) and normalize_name(food_catalog.names[food_id]) == key:
+        return food_id
+    return food_catalog.find_exact(key)
+
+
+def daily_plan(target_calories):
+    """Compact equivalent of food_data.get_diet_plan"""
+    plan = get_diet_plan_ids(target_calories)
+    total = plan.pop("total_calories")
+    return {"format": PLAN_FORMAT, "layout": DAILY, "meals": plan,
+            "keys": food_keys(DAILY, plan), "total_calories": total}
+
+
+def custom_plan(meals, **extra):
+    """
+    Compact customizer plan
+
+    Args:
+        meals: {meal name: ref}, where ref is None, {"food": food_id} for a
+            single food or {"items": [[food_id, servings], ...]} for a
+            composed meal
+        **extra: Plain values kept as-is (total_calories, macros, ...)
+    """
+    return {"format": PLAN_FORMAT, "layout": CUSTOM, "meals": meals,
+            "keys": food_keys(CUSTOM, meals), **extra}
+
+
+def hydrate_meal(layout, ref, keys):
+    """
+    Food dict(s) for one stored meal reference
+
+    Every id is checked with resolve_food(). A daily meal drops foods that
+    are gone from the catalog; a custom meal that lost any of its foods
+    hydrates to None (no meal) rather than to the wrong food or totals.
+    """
+    if layout == DAILY:
+        return food_catalog.rows([food_id for food_id in map(resolve_food, ref, repeat(keys))
+                                  if food_id is not None])
+    if ref is None:
+        return None
+    if "food" in ref:
+        food_id = resolve_food(ref["food"], keys)
+        return None if food_id is None else food_catalog.row(food_id)
+    items = [[resolve_food(food_id, keys), servings] for food_id, servings in ref["items"]]
+    if any(food_id is None for food_id, _ in items):
+        return None
+    return meal_composer.as_food(meal_composer.evaluate(items))
+
+
+def hydrate_plan(plan):
+    """Full plan with food dicts, in the shape the generators used to return"""
+    if not is_compact(plan):
+        return plan
+    keys = plan["keys"]
+    meals = {name: hydrate_meal(plan["layout"], ref, keys) for name, ref in plan["meals"].items()}
+    extra = copy.deepcopy({key: value for key, value in plan.items() if key not in _INTERNAL_KEYS})
+    if plan["layout"] == DAILY:
+        return {**meals, **extra}
+    return {"meals": meals, **extra}
+
+
+class _MealsView(Mapping):
+    """Meal name -> food dict, hydrated on first access"""
+
+    def __init__(self, layout, refs, keys):
+        self._layout = layout
+        self._refs = refs
+        self._keys = keys
+        self._hydrated = {}
+
+    def __getitem__(self, name):
+        if name not in self._hydrated:
+            self._hydrated[name] = hydrate_meal(self._layout, self._refs[name], self._keys)
+        return self._hydrated[name]
+
+    def __iter__(self):
+        return iter(self._refs)
+
+    def __len__(self):
+        return len(self._refs)
+
+
+class PlanView(Mapping):
+    """
+    Read-only view of a compact plan that looks like the hydrated dict
+
+    Templates index it exactly like the old embedded plans; food dicts are
+    built from the catalog only for the meals actually rendered.
+    """
+
+    def __init__(self, plan):
+        self._plan = plan
+        self._meals = _MealsView(plan["layout"], plan["meals"], plan["keys"])
+        self._extra = [key for key in plan if key not in _INTERNAL_KEYS]
+
+    def __getitem__(self, key):
+        if self._plan["layout"] == DAILY:
+            if key in self._meals:
+                return self._meals[key]
+        elif key == "meals":
+            return self._meals
+        if key in _INTERNAL_KEYS:
+            raise KeyError(key)
+        return self._plan[key]
+
+    def _keys(self):
+        meals = list(self._meals) if self._plan["layout"] == DAILY else ["meals"]
+        return meals + self._extra
+
+    def __iter__(self):
+        return iter(self._keys())
+
+    def __len__(self):
+        return len(self._keys())
+
+
+def view_plan(plan):
+    """Lazy view for compact plans; legacy embedded plans are returned as-is"""
+    return PlanView(plan) if is_compact(plan) else plan
+
+
+def profile_view(profile):
+    """Profile copy whose diet_plan hydrates lazily when rendered"""
+    if not profile or not is_compact(profile.get("diet_plan")):
+        return profile
+    return {**profile, "diet_plan": PlanView(profile["diet_plan"])}
+
+
+# --- Migration of embedded plans ---
+def _food_id(food):
+    # Exact names only: an alias or serving-note match could be a different
+    # food, and an unmatched meal is better left embedded
+    return food_catalog.find_exact(food["name"]) if isinstance(food, Mapping) and "name" in food else None
+
+
+def _compact_meal(food):
+    if food is None:
+        return None
+    if "items" in food:
+        items = [[_food_id(item), item.get("servings", 1)] for item in food["items"]]
+        if any(food_id is None for food_id, _ in items):
+            raise LookupError(food["name"])
+        return {"items": items}
+    food_id = _food_id(food)
+    if food_id is None:
+        raise LookupError(food.get("name"))
+    return {"food": food_id}
+
+
+def compact_plan(plan):
+    """
+    Compact form of a plan with embedded food dicts
+
+    Returns:
+        The compact plan, or None if some food is no longer in the catalog
+        (the embedded plan is then kept as it is)
+    """
+    if not isinstance(plan, Mapping) or is_compact(plan):
+        return None
+    try:
+        if isinstance(plan.get("meals"), Mapping):
+            meals = {name: _compact_meal(food) for name, food in plan["meals"].items()}
+            extra = {key: value for key, value in plan.items() if key != "meals"}
+            return custom_plan(meals, **extra)
+
+        meals = {}
+        for name, foods in plan.items():
+            if isinstance(foods, list):
+                ids = [_food_id(food) for food in foods]
+                if None in ids:
+                    return None
+                meals[name] = ids
+        extra = {key: value for key, value in plan.items() if key not in meals}
+        return {"format": PLAN_FORMAT, "layout": DAILY, "meals": meals, "keys": food_keys(DAILY, meals), **extra}
+    except LookupError:
+        return None
+
+
+def migrate_profile(profile):
+    """
+    Profile with its plan compacted and duplicated settings dropped
+
+    Returns:
+        The new profile dict, or None if nothing needed changing
+    """
+    if not profile:
+        return None
+    changed = dict(profile)
+    compact = compact_plan(profile.get("diet_plan"))
+    if compact is not None:
+        changed["diet_plan"] = compact
+    # Copies of diet_preferences written alongside older custom plans
+    changed.pop("customizer_settings", None)
+    return changed if changed != profile else None
+
+
+def migrate_profiles(manager):
+    """Compact the stored plans of every user; returns the number updated"""
+    updated = 0
+    for username in manager.backend.usernames():
+        record = manager.get_user_data(username, with_logs=False)
+        profile = migrate_profile(record.get("profile")) if record else None
+        if profile is not None:
+            manager.update_profile(username, profile)
+            updated += 1
+    return updated
@@ -0,0 +1,64 @@
+"""
+Seeded Sampling
+Reproducible random picks keyed by user, day and catalog version
+"""
+
+import hashlib
+import random
+
+from diet_planner.food_data import food_catalog
+from diet_planner.storage import today_key
+
+
+def seed_for(*parts):
+    """Stable 64-bit seed for the given parts (same in every process)"""
+    text = "\x1f".join(map(str, parts))
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "big")
+
+
+def seeded_rng(username, scope, day=None, catalog=None):
+    """
+    Random generator for one user, day and catalog version
+
+    Args:
+        username: User the picks are for
+        scope: Name of the feature drawing (keeps features independent)
+        day: ISO date (default today)
+        catalog: Catalog whose version is part of the key
+
+    Returns:
+        random.Random that yields the same picks until the day or the
+        catalog changes
+    """
+    catalog = catalog if catalog is not None else food_catalog
+    return random.Random(seed_for(username, day or today_key(), catalog.version, scope))
+
+
+def choice(seq, rng=None):
+    """One item of a sequence, or None if it is empty"""
+    return seq[(rng or random).randrange(len(seq))] if seq else None
+
+
+def sample(seq, k, rng=None):
+    """Up to k items of a sequence in random order, drawn by index"""
+    return [seq[i] for i in (rng or random).sample(range(len(seq)), min(k, len(seq)))]
+
+
+def reservoir(iterable, k, rng=None):
+    """
+    Up to k items of an iterable in random order, in one pass
+
+    Keeps only k items (Algorithm R), so the candidates never need to be
+    collected into a list first.
+    """
+    rng = rng or random
+    kept = []
+    for seen, item in enumerate(iterable):
+        if seen < k:
+            kept.append(item)
+        else:
+            slot = rng.randrange(seen + 1)
+            if slot < k:
+                kept[slot] = item
+    rng.shuffle(kept)
+    return kept
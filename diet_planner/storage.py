@@ -0,0 +1,833 @@
+"""
+Storage Backends
+Pluggable persistence for UserManager: in-memory dict or SQLite (WAL)
+"""
+
+from bisect import bisect_left, bisect_right, insort
+from contextlib import contextmanager
+import datetime
+import json
+import queue
+import sqlite3
+import threading
+
+from diet_planner import daily_totals
+
+# Append-only per-user logs (lists of entry dicts with an 'id')
+LOG_NAMES = ("diet_log", "fitness_log")
+
+# Per-user, per-day integer counters
+COUNTER_NAMES = ("water_log", "step_log")
+
+# Whole-value record fields
+RECORD_FIELDS = ("password", "profile", "settings", "diet_preferences")
+
+
+def today_key():
+    """ISO date used to file log entries"""
+    return datetime.date.today().isoformat()
+
+
+def _within(days, start, end):
+    """Keys of a {day: value} dict within [start, end]"""
+    return [day for day in days if (start is None or day >= start) and (end is None or day <= end)]
+
+
+def _dated(entry):
+    """Entry with a 'date' field, stamped with today if it has none"""
+    return entry if entry.get('date') else {**entry, 'date': today_key()}
+
+
+class StorageBackend:
+    """
+    Interface every user store implements
+
+    Records have the shape built by UserManager.create_user: password,
+    profile, settings, diet_preferences, created_at, the LOG_NAMES lists and
+    the COUNTER_NAMES {day: count} dicts. Log entries carry an ISO 'date'
+    (stamped on append if missing).
+
+    Backends also keep running per-day totals of the logs (see
+    daily_totals.py), updated in the same write as the log entry itself.
+    """
+
+    def create_user(self, username, record):
+        """Store a new record; return False if the user exists"""
+        raise NotImplementedError
+
+    def get_user(self, username, with_logs=True):
+        """
+        Record dict for a user, or None
+
+        With with_logs=False the backend may leave out the LOG_NAMES and
+        COUNTER_NAMES fields instead of loading the user's whole history.
+        """
+        raise NotImplementedError
+
+    def has_user(self, username):
+        """Whether a user record exists"""
+        raise NotImplementedError
+
+    def usernames(self):
+        """All stored usernames"""
+        raise NotImplementedError
+
+    def set_field(self, username, field, value):
+        """Replace one of RECORD_FIELDS; return False if the user is unknown"""
+        raise NotImplementedError
+
+    def merge_field(self, username, field, changes):
+        """dict.update() one of RECORD_FIELDS; return False if the user is unknown"""
+        raise NotImplementedError
+
+    def append_log(self, username, log_name, entry):
+        """Append an entry dict to one of LOG_NAMES"""
+        raise NotImplementedError
+
+    def update_log(self, username, log_name, entry_id, changes):
+        """Update fields of a log entry by id; return False if not found"""
+        raise NotImplementedError
+
+    def update_logs(self, username, log_name, changes_by_id):
+        """
+        Update many log entries of one user at once
+
+        Backends override this to apply the batch under one lock or
+        transaction. Returns the number of entries found and updated.
+        """
+        return sum(bool(self.update_log(username, log_name, entry_id, changes))
+                   for entry_id, changes in changes_by_id.items())
+
+    def delete_log(self, username, log_name, entry_id):
+        """Delete a log entry by id; return False if not found"""
+        raise NotImplementedError
+
+    def clear_log(self, username, log_name):
+        """Remove every entry of a log"""
+        raise NotImplementedError
+
+    def get_log_entry(self, username, log_name, entry_id):
+        """A single log entry by id, or None"""
+        raise NotImplementedError
+
+    def get_log_range(self, username, log_name, start=None, end=None):
+        """Entries dated within [start, end] (ISO dates, inclusive), by date"""
+        raise NotImplementedError
+
+    def compact_logs(self, username, before):
+        """
+        Fold each day before `before` into one summary entry per log
+
+        Daily totals are unchanged. Returns the number of entries removed.
+        """
+        raise NotImplementedError
+
+    def get_counter(self, username, counter_name, day):
+        """Counter value for a day (0 if unset)"""
+        raise NotImplementedError
+
+    def set_counter(self, username, counter_name, day, value):
+        """Set a counter for a day"""
+        raise NotImplementedError
+
+    def increment_counter(self, username, counter_name, day, amount=1):
+        """Atomically add to a counter and return the new value"""
+        raise NotImplementedError
+
+    def get_counter_range(self, username, counter_name, start=None, end=None):
+        """{day: value} for days within [start, end], in date order"""
+        raise NotImplementedError
+
+    def get_daily_totals(self, username, day):
+        """Running totals for one day (empty totals if nothing logged)"""
+        raise NotImplementedError
+
+    def get_totals_range(self, username, start=None, end=None):
+        """{day: totals} for logged days within [start, end], in date order"""
+        raise NotImplementedError
+
+    def replace_daily_totals(self, username, totals):
+        """Overwrite all running totals, e.g. after a rebuild"""
+        raise NotImplementedError
+
+
+class _Log:
+    """
+    One user's log, partitioned by day
+
+    Append, update and delete by id are O(1): deleted slots are tombstoned
+    (None) and compacted once they make up half the list. Entry ids are also
+    filed under their ISO date, and a sorted list of dates answers range
+    queries with bisect, touching only the days asked for. snapshot()
+    returns an immutable tuple that is rebuilt only after a write, so
+    readers share it without copying or locking.
+    """
+
+    __slots__ = ("entries", "positions", "days", "day_keys", "_snapshot")
+
+    def __init__(self, entries=()):
+        self.entries = []
+        self.positions = {}
+        self.days = {}      # day -> {entry_id: None}, in insertion order
+        self.day_keys = []  # sorted days that have entries
+        self._snapshot = None
+        for entry in entries:
+            self.append(entry)
+
+    def _file(self, entry):
+        day = entry['date']
+        ids = self.days.get(day)
+        if ids is None:
+            ids = self.days[day] = {}
+            insort(self.day_keys, day)
+        ids[entry['id']] = None
+
+    def _unfile(self, entry):
+        day = entry['date']
+        ids = self.days[day]
+        del ids[entry['id']]
+        if not ids:
+            del self.days[day]
+            del self.day_keys[bisect_left(self.day_keys, day)]
+
+    def append(self, entry):
+        self.positions[entry['id']] = len(self.entries)
+        self.entries.append(entry)
+        self._file(entry)
+        self._snapshot = None
+
+    def get(self, entry_id):
+        position = self.positions.get(entry_id)
+        return None if position is None else self.entries[position]
+
+    def update(self, entry_id, changes):
+        """Return (old, new) entries, or None if the id is unknown"""
+        position = self.positions.get(entry_id)
+        if position is None:
+            return None
+        # Replace rather than mutate so existing snapshots stay unchanged
+        old = self.entries[position]
+        new = self.entries[position] = {**old, **changes}
+        if new['date'] != old['date']:
+            self._unfile(old)
+            self._file(new)
+        self._snapshot = None
+        return old, new
+
+    def delete(self, entry_id):
+        """Return the removed entry, or None if the id is unknown"""
+        position = self.positions.pop(entry_id, None)
+        if position is None:
+            return None
+        entry = self.entries[position]
+        self.entries[position] = None
+        self._unfile(entry)
+        if len(self.positions) * 2 < len(self.entries):
+            self._compact()
+        self._snapshot = None
+        return entry
+
+    def _compact(self):
+        self.entries = [entry for entry in self.entries if entry is not None]
+        self.positions = {entry['id']: position for position, entry in enumerate(self.entries)}
+
+    def span(self, start=None, end=None):
+        """Days with entries in [start, end] (either bound may be None)"""
+        day_keys = self.day_keys
+        low = 0 if start is None else bisect_left(day_keys, start)
+        high = len(day_keys) if end is None else bisect_right(day_keys, end)
+        return day_keys[low:high]
+
+    def day_entries(self, day):
+        entries, positions = self.entries, self.positions
+        return [entries[positions[entry_id]] for entry_id in self.days.get(day, ())]
+
+    def range(self, start=None, end=None):
+        """Entries dated within [start, end], by date then insertion"""
+        return [entry for day in self.span(start, end) for entry in self.day_entries(day)]
+
+    def summarize(self, log_name, day):
+        """
+        Fold a day's entries into one summary entry
+
+        The summary takes the slot of the day's first entry so log order is
+        kept. Returns the number of entries removed.
+        """
+        entries = self.day_entries(day)
+        if len(entries) < 2:
+            return 0
+        summary = daily_totals.summary_entry(log_name, day, entries)
+        first = self.positions[entries[0]['id']]
+        for entry in entries:
+            self.entries[self.positions.pop(entry['id'])] = None
+        self.entries[first] = summary
+        self.positions[summary['id']] = first
+        self.days[day] = {summary['id']: None}
+        if len(self.positions) * 2 < len(self.entries):
+            self._compact()
+        self._snapshot = None
+        return len(entries) - 1
+
+    def snapshot(self):
+        snapshot = self._snapshot
+        if snapshot is None:
+            snapshot = self._snapshot = tuple(entry for entry in self.entries if entry is not None)
+        return snapshot
+
+
+class _UserSlot:
+    """A user's record split into plain fields, logs, counters and daily totals"""
+
+    __slots__ = ("fields", "logs", "counters", "totals", "_snapshot")
+
+    def __init__(self, record):
+        self.fields = {k: v for k, v in record.items() if k not in LOG_NAMES and k not in COUNTER_NAMES}
+        self.logs = {name: _Log(map(_dated, record.get(name, ()))) for name in LOG_NAMES}
+        self.counters = {name: dict(record.get(name, {})) for name in COUNTER_NAMES}
+        self.totals = daily_totals.rebuild({name: log.snapshot() for name, log in self.logs.items()})
+        self._snapshot = None
+
+    def add_totals(self, log_name, entry, sign=1):
+        """Fold one entry into its day's totals (copy-on-write per day)"""
+        day = entry['date']
+        self.totals[day] = daily_totals.combine(
+            self.totals.get(day), daily_totals.entry_totals(log_name, entry), sign
+        )
+
+    def snapshot(self):
+        """Read-only view of the record; call with the user's lock held"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            snapshot = dict(self.fields)
+            for name, log in self.logs.items():
+                snapshot[name] = log.snapshot()
+            for name, counts in self.counters.items():
+                snapshot[name] = dict(counts)
+            self._snapshot = snapshot
+        return snapshot
+
+
+class MemoryBackend(StorageBackend):
+    """
+    Process-local dict store with lock striping
+
+    Writers take one of `stripes` locks chosen by username, so different
+    users never contend on the same lock. get_user() returns a copy-on-write
+    snapshot (logs as tuples) that is rebuilt only after the user's next
+    write: reading a cached snapshot takes no lock, and a missing one is
+    built under the user's lock so it can never capture a half-applied
+    write or be stored after a newer one. Treat snapshots as read-only;
+    all changes go through the backend methods.
+
+    Safe for threaded servers; every worker process has its own copy, so
+    use SQLiteBackend when running more than one process.
+    """
+
+    def __init__(self, stripes=64):
+        # Structure: { username: _UserSlot }
+        self._users = {}
+        self._locks = [threading.Lock() for _ in range(stripes)]
+
+    def _lock(self, username):
+        return self._locks[hash(username) % len(self._locks)]
+
+    def _write(self, username):
+        """Slot for a user about to be modified (caller holds its lock)"""
+        slot = self._users[username]
+        slot._snapshot = None
+        return slot
+
+    def create_user(self, username, record):
+        with self._lock(username):
+            if username in self._users:
+                return False
+            self._users[username] = _UserSlot(record)
+            return True
+
+    def get_user(self, username, with_logs=True):
+        # The cached snapshot is already cheap, so logs are always included
+        slot = self._users.get(username)
+        if slot is None:
+            return None
+        # Writers clear the snapshot under the lock before changing anything,
+        # so a cached one is never older than the last completed write
+        snapshot = slot._snapshot
+        if snapshot is not None:
+            return snapshot
+        with self._lock(username):
+            return slot.snapshot()
+
+    def has_user(self, username):
+        return username in self._users
+
+    def usernames(self):
+        return list(self._users)
+
+    def set_field(self, username, field, value):
+        with self._lock(username):
+            if username not in self._users:
+                return False
+            self._write(username).fields[field] = value
+            return True
+
+    def merge_field(self, username, field, changes):
+        with self._lock(username):
+            if username not in self._users:
+                return False
+            slot = self._write(username)
+            slot.fields[field] = {**slot.fields[field], **changes}
+            return True
+
+    def append_log(self, username, log_name, entry):
+        entry = _dated(entry)
+        with self._lock(username):
+            slot = self._write(username)
+            slot.logs[log_name].append(entry)
+            slot.add_totals(log_name, entry)
+
+    def update_log(self, username, log_name, entry_id, changes):
+        with self._lock(username):
+            slot = self._write(username)
+            changed = slot.logs[log_name].update(entry_id, changes)
+            if changed is None:
+                return False
+            old, new = changed
+            slot.add_totals(log_name, old, -1)
+            slot.add_totals(log_name, new)
+            return True
+
+    def update_logs(self, username, log_name, changes_by_id):
+        updated = 0
+        with self._lock(username):
+            slot = self._write(username)
+            log = slot.logs[log_name]
+            for entry_id, changes in changes_by_id.items():
+                changed = log.update(entry_id, changes)
+                if changed is None:
+                    continue
+                old, new = changed
+                slot.add_totals(log_name, old, -1)
+                slot.add_totals(log_name, new)
+                updated += 1
+        return updated
+
+    def delete_log(self, username, log_name, entry_id):
+        with self._lock(username):
+            slot = self._write(username)
+            entry = slot.logs[log_name].delete(entry_id)
+            if entry is None:
+                return False
+            slot.add_totals(log_name, entry, -1)
+            return True
+
+    def clear_log(self, username, log_name):
+        with self._lock(username):
+            slot = self._write(username)
+            cleared = daily_totals.sum_entries(log_name, slot.logs[log_name].snapshot())
+            for day, totals in cleared.items():
+                slot.totals[day] = daily_totals.combine(slot.totals.get(day), totals, -1)
+            slot.logs[log_name] = _Log()
+
+    def get_log_entry(self, username, log_name, entry_id):
+        with self._lock(username):
+            return self._users[username].logs[log_name].get(entry_id)
+
+    def get_log_range(self, username, log_name, start=None, end=None):
+        with self._lock(username):
+            return self._users[username].logs[log_name].range(start, end)
+
+    def compact_logs(self, username, before):
+        with self._lock(username):
+            slot = self._write(username)
+            removed = 0
+            for log_name, log in slot.logs.items():
+                for day in log.span(end=before):
+                    if day < before:
+                        removed += log.summarize(log_name, day)
+            return removed
+
+    def get_counter(self, username, counter_name, day):
+        with self._lock(username):
+            return self._users[username].counters[counter_name].get(day, 0)
+
+    def set_counter(self, username, counter_name, day, value):
+        with self._lock(username):
+            self._write(username).counters[counter_name][day] = value
+
+    def increment_counter(self, username, counter_name, day, amount=1):
+        with self._lock(username):
+            counts = self._write(username).counters[counter_name]
+            counts[day] = counts.get(day, 0) + amount
+            return counts[day]
+
+    def get_counter_range(self, username, counter_name, start=None, end=None):
+        with self._lock(username):
+            counts = self._users[username].counters[counter_name]
+            return {day: counts[day] for day in sorted(_within(counts, start, end))}
+
+    def get_daily_totals(self, username, day):
+        with self._lock(username):
+            return dict(self._users[username].totals.get(day) or daily_totals.empty_totals())
+
+    def get_totals_range(self, username, start=None, end=None):
+        with self._lock(username):
+            totals = self._users[username].totals
+            return {day: dict(totals[day]) for day in sorted(_within(totals, start, end))}
+
+    def replace_daily_totals(self, username, totals):
+        with self._lock(username):
+            self._write(username).totals = {day: dict(values) for day, values in totals.items()}
+
+
+# --- SQLite ---
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    password TEXT NOT NULL,
+    profile TEXT NOT NULL,
+    settings TEXT NOT NULL,
+    diet_preferences TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS log_entries (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL REFERENCES users(username) ON DELETE CASCADE,
+    log_name TEXT NOT NULL,
+    entry_id TEXT NOT NULL,
+    log_date TEXT NOT NULL,
+    payload TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS log_entries_by_id ON log_entries (username, log_name, entry_id);
+CREATE INDEX IF NOT EXISTS log_entries_by_date ON log_entries (username, log_name, log_date);
+CREATE TABLE IF NOT EXISTS counters (
+    username TEXT NOT NULL REFERENCES users(username) ON DELETE CASCADE,
+    counter_name TEXT NOT NULL,
+    log_date TEXT NOT NULL,
+    value INTEGER NOT NULL,
+    PRIMARY KEY (username, counter_name, log_date)
+);
+CREATE TABLE IF NOT EXISTS daily_totals (
+    username TEXT NOT NULL REFERENCES users(username) ON DELETE CASCADE,
+    log_date TEXT NOT NULL,
+    calories REAL NOT NULL DEFAULT 0,
+    protein REAL NOT NULL DEFAULT 0,
+    carbs REAL NOT NULL DEFAULT 0,
+    fats REAL NOT NULL DEFAULT 0,
+    burned REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (username, log_date)
+);
+"""
+
+# Statements are constant strings so each pooled connection compiles them
+# once and reuses them from its statement cache.
+_INSERT_USER = "INSERT OR IGNORE INTO users (username, password, profile, settings, diet_preferences, created_at) VALUES (?, ?, ?, ?, ?, ?)"
+_SELECT_USER = "SELECT password, profile, settings, diet_preferences, created_at FROM users WHERE username = ?"
+_SELECT_USERNAMES = "SELECT username FROM users"
+_USER_EXISTS = "SELECT 1 FROM users WHERE username = ?"
+_SELECT_FIELD = {field: f"SELECT {field} FROM users WHERE username = ?" for field in RECORD_FIELDS}
+_UPDATE_FIELD = {field: f"UPDATE users SET {field} = ? WHERE username = ?" for field in RECORD_FIELDS}
+_INSERT_LOG = "INSERT INTO log_entries (username, log_name, entry_id, log_date, payload) VALUES (?, ?, ?, ?, ?)"
+_SELECT_LOGS = "SELECT log_name, log_date, payload FROM log_entries WHERE username = ? ORDER BY seq"
+_SELECT_LOG = "SELECT log_date, payload FROM log_entries WHERE username = ? AND log_name = ?"
+_SELECT_LOG_ENTRY = "SELECT log_date, payload FROM log_entries WHERE username = ? AND log_name = ? AND entry_id = ?"
+_UPDATE_LOG_ENTRY = "UPDATE log_entries SET payload = ?, log_date = ? WHERE username = ? AND log_name = ? AND entry_id = ?"
+_DELETE_LOG_ENTRY = "DELETE FROM log_entries WHERE username = ? AND log_name = ? AND entry_id = ?"
+_CLEAR_LOG = "DELETE FROM log_entries WHERE username = ? AND log_name = ?"
+_SELECT_LOG_RANGE = ("SELECT log_date, payload FROM log_entries "
+                     "WHERE username = ? AND log_name = ? AND log_date BETWEEN ? AND ? ORDER BY log_date, seq")
+_SELECT_COMPACTABLE = ("SELECT seq, log_name, log_date, payload FROM log_entries "
+                       "WHERE username = ? AND log_date < ? ORDER BY seq")
+_DELETE_LOG_DAY = "DELETE FROM log_entries WHERE username = ? AND log_name = ? AND log_date = ?"
+# Counters written before real dates were used were filed under 'today'
+_MIGRATE_TODAY_COUNTERS = "UPDATE OR IGNORE counters SET log_date = ? WHERE log_date = 'today'"
+_DELETE_TODAY_COUNTERS = "DELETE FROM counters WHERE log_date = 'today'"
+_INSERT_LOG_AT = "INSERT INTO log_entries (seq, username, log_name, entry_id, log_date, payload) VALUES (?, ?, ?, ?, ?, ?)"
+_SELECT_COUNTERS = "SELECT counter_name, log_date, value FROM counters WHERE username = ?"
+_SELECT_COUNTER = "SELECT value FROM counters WHERE username = ? AND counter_name = ? AND log_date = ?"
+_SELECT_COUNTER_RANGE = ("SELECT log_date, value FROM counters "
+                         "WHERE username = ? AND counter_name = ? AND log_date BETWEEN ? AND ? ORDER BY log_date")
+_UPSERT_COUNTER = ("INSERT INTO counters (username, counter_name, log_date, value) VALUES (?, ?, ?, ?) "
+                   "ON CONFLICT (username, counter_name, log_date) DO UPDATE SET value = excluded.value")
+_INCREMENT_COUNTER = ("INSERT INTO counters (username, counter_name, log_date, value) VALUES (?, ?, ?, ?) "
+                      "ON CONFLICT (username, counter_name, log_date) DO UPDATE SET value = value + excluded.value")
+_TOTAL_COLUMNS = ", ".join(daily_totals.TOTAL_FIELDS)
+_ADD_TOTALS = (
+    f"INSERT INTO daily_totals (username, log_date, {_TOTAL_COLUMNS}) "
+    f"VALUES (?, ?{', ?' * len(daily_totals.TOTAL_FIELDS)}) "
+    "ON CONFLICT (username, log_date) DO UPDATE SET "
+    + ", ".join(f"{field} = {field} + excluded.{field}" for field in daily_totals.TOTAL_FIELDS)
+)
+_SELECT_TOTALS = f"SELECT {_TOTAL_COLUMNS} FROM daily_totals WHERE username = ? AND log_date = ?"
+_SELECT_TOTALS_RANGE = (f"SELECT log_date, {_TOTAL_COLUMNS} FROM daily_totals "
+                        "WHERE username = ? AND log_date BETWEEN ? AND ? ORDER BY log_date")
+_CLEAR_TOTALS = "DELETE FROM daily_totals WHERE username = ?"
+
+
+class ConnectionPool:
+    """Fixed-size pool of SQLite connections configured for WAL"""
+
+    def __init__(self, path, size=5, timeout=30.0):
+        self.path = path
+        self.timeout = timeout
+        self._pool = queue.LifoQueue(maxsize=size)
+        for _ in range(size):
+            self._pool.put(self._connect())
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.timeout,
+            check_same_thread=False,
+            isolation_level=None,  # explicit BEGIN/COMMIT below
+            cached_statements=256,
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the duration of a with-block"""
+        conn = self._pool.get(timeout=self.timeout)
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    @contextmanager
+    def transaction(self):
+        """Borrow a connection inside BEGIN IMMEDIATE ... COMMIT"""
+        with self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def close(self):
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+
+
+class SQLiteBackend(StorageBackend):
+    """
+    SQLite store shared by every worker process
+
+    Runs in WAL mode so readers do not block the writer. Log entries live in
+    one table indexed per user, per log and per date; counters are keyed by
+    (user, counter, date). Structured fields are stored as JSON. Daily
+    totals are upserted in the same transaction as the log change.
+    """
+
+    def __init__(self, path, pool_size=5):
+        self.pool = ConnectionPool(path, size=pool_size)
+        with self.pool.connection() as conn:
+            conn.executescript(_SCHEMA)
+        with self.pool.transaction() as conn:
+            conn.execute(_MIGRATE_TODAY_COUNTERS, (today_key(),))
+            conn.execute(_DELETE_TODAY_COUNTERS)
+
+    @staticmethod
+    def _add_totals(conn, username, day, deltas, sign=1):
+        """Upsert deltas into one day's totals row"""
+        values = daily_totals.combine(None, deltas, sign)
+        conn.execute(_ADD_TOTALS, (username, day, *(values[f] for f in daily_totals.TOTAL_FIELDS)))
+
+    def _add_entry_totals(self, conn, username, log_name, entry, sign=1):
+        self._add_totals(conn, username, entry['date'], daily_totals.entry_totals(log_name, entry), sign)
+
+    def create_user(self, username, record):
+        with self.pool.transaction() as conn:
+            cursor = conn.execute(_INSERT_USER, (
+                username,
+                record['password'],
+                json.dumps(record['profile']),
+                json.dumps(record['settings']),
+                json.dumps(record['diet_preferences']),
+                record['created_at'].isoformat(),
+            ))
+            return cursor.rowcount == 1
+
+    def get_user(self, username, with_logs=True):
+        logs = counters = ()
+        with self.pool.connection() as conn:
+            row = conn.execute(_SELECT_USER, (username,)).fetchone()
+            if row is None:
+                return None
+            if with_logs:
+                logs = conn.execute(_SELECT_LOGS, (username,)).fetchall()
+                counters = conn.execute(_SELECT_COUNTERS, (username,)).fetchall()
+
+        password, profile, settings, preferences, created_at = row
+        record = {
+            'password': password,
+            'profile': json.loads(profile),
+            'settings': json.loads(settings),
+            'diet_preferences': json.loads(preferences),
+            'created_at': datetime.datetime.fromisoformat(created_at),
+        }
+        if not with_logs:
+            return record
+        for log_name in LOG_NAMES:
+            record[log_name] = []
+        for counter_name in COUNTER_NAMES:
+            record[counter_name] = {}
+        for log_name, day, payload in logs:
+            entry = json.loads(payload)
+            entry.setdefault('date', day)
+            record[log_name].append(entry)
+        for counter_name, day, value in counters:
+            record[counter_name][day] = value
+        return record
+
+    def has_user(self, username):
+        with self.pool.connection() as conn:
+            return conn.execute(_USER_EXISTS, (username,)).fetchone() is not None
+
+    def usernames(self):
+        with self.pool.connection() as conn:
+            return [row[0] for row in conn.execute(_SELECT_USERNAMES)]
+
+    def set_field(self, username, field, value):
+        stored = value if field == 'password' else json.dumps(value)
+        with self.pool.transaction() as conn:
+            return conn.execute(_UPDATE_FIELD[field], (stored, username)).rowcount == 1
+
+    def merge_field(self, username, field, changes):
+        with self.pool.transaction() as conn:
+            row = conn.execute(_SELECT_FIELD[field], (username,)).fetchone()
+            if row is None:
+                return False
+            value = json.loads(row[0])
+            value.update(changes)
+            conn.execute(_UPDATE_FIELD[field], (json.dumps(value), username))
+            return True
+
+    def append_log(self, username, log_name, entry):
+        entry = _dated(entry)
+        with self.pool.transaction() as conn:
+            conn.execute(_INSERT_LOG, (username, log_name, entry['id'], entry['date'], json.dumps(entry)))
+            self._add_entry_totals(conn, username, log_name, entry)
+
+    def update_log(self, username, log_name, entry_id, changes):
+        with self.pool.transaction() as conn:
+            row = conn.execute(_SELECT_LOG_ENTRY, (username, log_name, entry_id)).fetchone()
+            if row is None:
+                return False
+            old = {'date': row[0], **json.loads(row[1])}
+            new = {**old, **changes}
+            conn.execute(_UPDATE_LOG_ENTRY, (json.dumps(new), new['date'], username, log_name, entry_id))
+            self._add_entry_totals(conn, username, log_name, old, -1)
+            self._add_entry_totals(conn, username, log_name, new)
+            return True
+
+    def update_logs(self, username, log_name, changes_by_id):
+        updated = 0
+        with self.pool.transaction() as conn:
+            for entry_id, changes in changes_by_id.items():
+                row = conn.execute(_SELECT_LOG_ENTRY, (username, log_name, entry_id)).fetchone()
+                if row is None:
+                    continue
+                old = {'date': row[0], **json.loads(row[1])}
+                new = {**old, **changes}
+                conn.execute(_UPDATE_LOG_ENTRY, (json.dumps(new), new['date'], username, log_name, entry_id))
+                self._add_entry_totals(conn, username, log_name, old, -1)
+                self._add_entry_totals(conn, username, log_name, new)
+                updated += 1
+        return updated
+
+    def delete_log(self, username, log_name, entry_id):
+        with self.pool.transaction() as conn:
+            row = conn.execute(_SELECT_LOG_ENTRY, (username, log_name, entry_id)).fetchone()
+            if row is None:
+                return False
+            conn.execute(_DELETE_LOG_ENTRY, (username, log_name, entry_id))
+            self._add_entry_totals(conn, username, log_name, {'date': row[0], **json.loads(row[1])}, -1)
+            return True
+
+    def clear_log(self, username, log_name):
+        with self.pool.transaction() as conn:
+            entries = [
+                {'date': day, **json.loads(payload)}
+                for day, payload in conn.execute(_SELECT_LOG, (username, log_name))
+            ]
+            for day, totals in daily_totals.sum_entries(log_name, entries).items():
+                self._add_totals(conn, username, day, totals, -1)
+            conn.execute(_CLEAR_LOG, (username, log_name))
+
+    def get_log_entry(self, username, log_name, entry_id):
+        with self.pool.connection() as conn:
+            row = conn.execute(_SELECT_LOG_ENTRY, (username, log_name, entry_id)).fetchone()
+        return None if row is None else {'date': row[0], **json.loads(row[1])}
+
+    def get_log_range(self, username, log_name, start=None, end=None):
+        with self.pool.connection() as conn:
+            rows = conn.execute(_SELECT_LOG_RANGE, (username, log_name, start or "", end or "9999-12-31")).fetchall()
+        return [{'date': day, **json.loads(payload)} for day, payload in rows]
+
+    def compact_logs(self, username, before):
+        with self.pool.transaction() as conn:
+            days = {}
+            for seq, log_name, day, payload in conn.execute(_SELECT_COMPACTABLE, (username, before)):
+                group = days.setdefault((log_name, day), {'seq': seq, 'entries': []})
+                group['entries'].append({'date': day, **json.loads(payload)})
+
+            removed = 0
+            for (log_name, day), group in days.items():
+                entries = group['entries']
+                if len(entries) < 2:
+                    continue
+                summary = daily_totals.summary_entry(log_name, day, entries)
+                conn.execute(_DELETE_LOG_DAY, (username, log_name, day))
+                # Reuse the first entry's seq so the summary keeps its place
+                conn.execute(_INSERT_LOG_AT, (
+                    group['seq'], username, log_name, summary['id'], day, json.dumps(summary)
+                ))
+                removed += len(entries) - 1
+            return removed
+
+    def get_counter(self, username, counter_name, day):
+        with self.pool.connection() as conn:
+            row = conn.execute(_SELECT_COUNTER, (username, counter_name, day)).fetchone()
+        return row[0] if row else 0
+
+    def set_counter(self, username, counter_name, day, value):
+        with self.pool.transaction() as conn:
+            conn.execute(_UPSERT_COUNTER, (username, counter_name, day, value))
+
+    def increment_counter(self, username, counter_name, day, amount=1):
+        with self.pool.transaction() as conn:
+            conn.execute(_INCREMENT_COUNTER, (username, counter_name, day, amount))
+            return conn.execute(_SELECT_COUNTER, (username, counter_name, day)).fetchone()[0]
+
+    def get_counter_range(self, username, counter_name, start=None, end=None):
+        with self.pool.connection() as conn:
+            rows = conn.execute(_SELECT_COUNTER_RANGE, (
+                username, counter_name, start or "", end or "9999-12-31"
+            )).fetchall()
+        return dict(rows)
+
+    def get_daily_totals(self, username, day):
+        with self.pool.connection() as conn:
+            row = conn.execute(_SELECT_TOTALS, (username, day)).fetchone()
+        if row is None:
+            return daily_totals.empty_totals()
+        return dict(zip(daily_totals.TOTAL_FIELDS, row))
+
+    def get_totals_range(self, username, start=None, end=None):
+        with self.pool.connection() as conn:
+            rows = conn.execute(_SELECT_TOTALS_RANGE, (username, start or "", end or "9999-12-31")).fetchall()
+        return {row[0]: dict(zip(daily_totals.TOTAL_FIELDS, row[1:])) for row in rows}
+
+    def replace_daily_totals(self, username, totals):
+        with self.pool.transaction() as conn:
+            conn.execute(_CLEAR_TOTALS, (username,))
+            for day, values in totals.items():
+                self._add_totals(conn, username, day, values)
+
+    def close(self):
+        self.pool.close()
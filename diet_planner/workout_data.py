@@ -1,59 +1,258 @@
+"""
+Workout Data
+Static weekly plans and generated progressive workout programs
+"""
+
+from collections import OrderedDict
+from types import MappingProxyType
+import threading
+
+WEEKDAYS = ("Sunday", "Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday")
+
+ACTIVITY_LEVELS = ("sedentary", "light", "moderate", "active", "very_active")
+GOALS = ("loss", "maintain", "gain")
+MAX_WEEKS = 12
+
+
+def _freeze(value):
+    """Read-only view of nested plan data, so shared tables cannot be edited by callers"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+# Fixed plan per activity level, built once at import
+WEEKLY_PLANS = _freeze({
+    "sedentary": {
+        "Sunday": "Rest & Light Stretching",
+        "Monday": "20 min brisk walk",
+        "Tuesday": "Rest",
+        "Wednesday": "20 min brisk walk",
+        "Thursday": "Rest",
+        "Friday": "20 min brisk walk",
+        "Saturday": "30 min light activity (gardening, cleaning, etc.)"
+    },
+    "light": {
+        "Sunday": "Rest & Recovery",
+        "Monday": "30 min Jog / Power Walk",
+        "Tuesday": "20 min Bodyweight Exercises (Squats, Pushups)",
+        "Wednesday": "30 min Jog / Power Walk",
+        "Thursday": "Active Rest (Yoga/Stretching)",
+        "Friday": "30 min Jog / Power Walk",
+        "Saturday": "45 min Hike or Long Walk"
+    },
+    "moderate": {
+        "Sunday": "Rest",
+        "Monday": "45 min Cardio (Run/Cycle)",
+        "Tuesday": "40 min Strength Training (Upper Body)",
+        "Wednesday": "30 min HIIT Cardio",
+        "Thursday": "40 min Strength Training (Lower Body)",
+        "Friday": "45 min Cardio (Run/Cycle)",
+        "Saturday": "60 min Active Hobby (Sports, Hiking, Swimming)"
+    },
+    "active": {
+        "Sunday": "Active Recovery (Yoga/Light Swim)",
+        "Monday": "60 min Cardio",
+        "Tuesday": "60 min Strength Training (Push)",
+        "Wednesday": "60 min Cardio + Core",
+        "Thursday": "60 min Strength Training (Pull)",
+        "Friday": "60 min HIIT",
+        "Saturday": "60 min Strength Training (Legs)"
+    },
+    "very_active": {
+        "Sunday": "Rest",
+        "Monday": "AM: Cardio, PM: Strength (Chest/Tri)",
+        "Tuesday": "AM: Cardio, PM: Strength (Back/Bi)",
+        "Wednesday": "AM: Cardio, PM: Strength (Legs/Shoulders)",
+        "Thursday": "60 min High Intensity Activity",
+        "Friday": "Full Body Strength Circuit",
+        "Saturday": "90+ min Endurance Activity"
+    }
+})
+
+# --- Program generation tables ---
+
+# Base session length (minutes) and default training days per activity level
+BASE_MINUTES = {"sedentary": 20, "light": 30, "moderate": 45, "active": 60, "very_active": 75}
+DEFAULT_DAYS = {"sedentary": 3, "light": 4, "moderate": 5, "active": 6, "very_active": 6}
+
+# Weekdays trained for a given number of days a week (0 = Sunday)
+DAY_PATTERNS = {
+    1: (3,),
+    2: (1, 4),
+    3: (1, 3, 5),
+    4: (1, 2, 4, 5),
+    5: (1, 2, 3, 5, 6),
+    6: (1, 2, 3, 4, 5, 6),
+    7: (0, 1, 2, 3, 4, 5, 6),
+}
+
+# Session type -> (description, share of the base length)
+SESSIONS = {
+    "walk": ("Brisk Walk", 1.0),
+    "long_walk": ("Long Walk or Light Hike", 1.5),
+    "cardio": ("Cardio (Run/Cycle)", 1.0),
+    "hiit": ("HIIT Cardio", 0.7),
+    "long": ("Endurance Session (Run/Cycle/Swim)", 1.5),
+    "strength_full": ("Full Body Strength", 0.9),
+    "strength_upper": ("Strength Training (Upper Body)", 0.9),
+    "strength_lower": ("Strength Training (Lower Body)", 0.9),
+    "bodyweight": ("Bodyweight Exercises (Squats, Pushups)", 0.8),
+    "mobility": ("Yoga / Stretching", 0.7),
+}
+
+# Training-day order per goal; a week with n days uses the first n
+ROTATIONS = {
+    "loss": ("cardio", "strength_full", "hiit", "cardio", "strength_full", "long", "mobility"),
+    "maintain": ("cardio", "strength_upper", "hiit", "strength_lower", "cardio", "long", "mobility"),
+    "gain": ("strength_upper", "strength_lower", "cardio", "strength_upper", "strength_lower", "strength_full", "mobility"),
+}
+
+# Sessions swapped for gentler ones at lower activity levels
+SUBSTITUTIONS = {
+    "sedentary": {"cardio": "walk", "hiit": "walk", "long": "long_walk",
+                  "strength_full": "bodyweight", "strength_upper": "bodyweight", "strength_lower": "bodyweight"},
+    "light": {"hiit": "cardio", "strength_full": "bodyweight"},
+}
+
+# Four-week cycle: (phase, volume multiplier); every cycle starts 10% above the last
+CYCLE = (("base", 1.0), ("build", 1.1), ("peak", 1.2), ("deload", 0.8))
+CYCLE_STEP = 0.1
+
+REST_DAY = MappingProxyType({"type": "rest", "description": "Rest & Recovery", "minutes": 0})
+ACTIVE_REST_DAY = MappingProxyType({"type": "rest", "description": "Active Recovery (Yoga/Light Swim)", "minutes": 0})
+
+
+def _session_minutes(level, session, factor):
+    """Session length rounded to 5 minutes (at least 10)"""
+    minutes = BASE_MINUTES[level] * SESSIONS[session][1] * factor
+    return max(10, int(5 * round(minutes / 5)))
+
+
+def _training_order(level, goal, days):
+    rotation = ROTATIONS[goal][:days]
+    swaps = SUBSTITUTIONS.get(level, {})
+    return [swaps.get(session, session) for session in rotation]
+
+
+def _build_program(level, goal, days, weeks):
+    order = _training_order(level, goal, days)
+    trained = DAY_PATTERNS[days]
+    # Active users keep moving on their first rest day of the week
+    keeps_moving = level in ("active", "very_active")
+
+    schedule = []
+    for week in range(weeks):
+        phase, volume = CYCLE[week % len(CYCLE)]
+        factor = volume * (1 + CYCLE_STEP * (week // len(CYCLE)))
+        sessions = iter(order)
+        plan = {}
+        rest_days = 0
+        for day_index, day in enumerate(WEEKDAYS):
+            if day_index in trained:
+                session = next(sessions)
+                minutes = _session_minutes(level, session, factor)
+                plan[day] = {
+                    "type": session,
+                    "description": f"{minutes} min {SESSIONS[session][0]}",
+                    "minutes": minutes,
+                }
+            else:
+                plan[day] = ACTIVE_REST_DAY if keeps_moving and not rest_days else REST_DAY
+                rest_days += 1
+        schedule.append({
+            "week": week + 1,
+            "phase": phase,
+            "minutes": sum(session["minutes"] for session in plan.values()),
+            "days": plan,
+        })
+    return _freeze({"activity": level, "goal": goal, "days_per_week": days, "weeks": schedule})
+
+
+class WorkoutProgramCache:
+    """
+    Bounded LRU of generated programs
+
+    Programs depend only on (activity, goal, days, weeks), so the handful
+    of combinations users actually have are each generated once. Cached
+    programs are read-only views shared by every caller.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            program = self._entries.get(key)
+            if program is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+            return program
+
+    def put(self, key, program):
+        with self._lock:
+            self._entries[key] = program
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        """Entry count and hit/miss counters"""
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+def _normalize_level(activity_level):
+    activity = activity_level.lower() if activity_level else "sedentary"
+    return activity if activity in BASE_MINUTES else "moderate"
+
+
+def generate_program(activity_level, goal="maintain", days=None, weeks=4):
+    """
+    Progressive weekly workout program
+
+    Args:
+        activity_level: Profile activity level (unknown values use moderate)
+        goal: loss, maintain or gain
+        days: Training days a week, 1-7 (default by activity level)
+        weeks: Program length, 1-12 weeks
+
+    Returns:
+        Read-only {activity, goal, days_per_week, weeks}, where each week
+        has its number, phase, total minutes and a Sunday-Saturday map of
+        {type, description, minutes}
+    """
+    level = _normalize_level(activity_level)
+    goal = goal if goal in ROTATIONS else "maintain"
+    days = min(max(int(days or DEFAULT_DAYS[level]), 1), 7)
+    weeks = min(max(int(weeks), 1), MAX_WEEKS)
+
+    key = (level, goal, days, weeks)
+    program = program_cache.get(key)
+    if program is None:
+        program = _build_program(level, goal, days, weeks)
+        program_cache.put(key, program)
+    return program
+
+
 def get_weekly_workout_plan(activity_level):
     """
     Returns a dictionary with keys Sunday-Saturday containing workout descriptions
     based on the user's activity level.
+
+    The plans are shared read-only tables built at import.
     """
-    # Normalize activity level string
-    activity = activity_level.lower() if activity_level else "sedentary"
+    # Fallback to moderate if unknown
+    return WEEKLY_PLANS[_normalize_level(activity_level)]
 
-    # Define plans
-    plans = {
-        "sedentary": {
-            "Sunday": "Rest & Light Stretching",
-            "Monday": "20 min brisk walk",
-            "Tuesday": "Rest",
-            "Wednesday": "20 min brisk walk",
-            "Thursday": "Rest",
-            "Friday": "20 min brisk walk",
-            "Saturday": "30 min light activity (gardening, cleaning, etc.)"
-        },
-        "light": {
-            "Sunday": "Rest & Recovery",
-            "Monday": "30 min Jog / Power Walk",
-            "Tuesday": "20 min Bodyweight Exercises (Squats, Pushups)",
-            "Wednesday": "30 min Jog / Power Walk",
-            "Thursday": "Active Rest (Yoga/Stretching)",
-            "Friday": "30 min Jog / Power Walk",
-            "Saturday": "45 min Hike or Long Walk"
-        },
-        "moderate": {
-            "Sunday": "Rest",
-            "Monday": "45 min Cardio (Run/Cycle)",
-            "Tuesday": "40 min Strength Training (Upper Body)",
-            "Wednesday": "30 min HIIT Cardio",
-            "Thursday": "40 min Strength Training (Lower Body)",
-            "Friday": "45 min Cardio (Run/Cycle)",
-            "Saturday": "60 min Active Hobby (Sports, Hiking, Swimming)"
-        },
-        "active": {
-            "Sunday": "Active Recovery (Yoga/Light Swim)",
-            "Monday": "60 min Cardio",
-            "Tuesday": "60 min Strength Training (Push)",
-            "Wednesday": "60 min Cardio + Core",
-            "Thursday": "60 min Strength Training (Pull)",
-            "Friday": "60 min HIIT",
-            "Saturday": "60 min Strength Training (Legs)"
-        },
-        "very_active": {
-            "Sunday": "Rest",
-            "Monday": "AM: Cardio, PM: Strength (Chest/Tri)",
-            "Tuesday": "AM: Cardio, PM: Strength (Back/Bi)",
-            "Wednesday": "AM: Cardio, PM: Strength (Legs/Shoulders)",
-            "Thursday": "60 min High Intensity Activity",
-            "Friday": "Full Body Strength Circuit",
-            "Saturday": "90+ min Endurance Activity"
-        }
-    }
 
-    # Fallback to moderate if unknown
-    return plans.get(activity, plans["moderate"])
+# Global instance
+program_cache = WorkoutProgramCache()